@@ -1,8 +1,17 @@
-from itertools import islice, groupby
-from typing import Dict, Iterable, List, Tuple
-from django.db.models import QuerySet
-from scraper.models import Meeting, Section
-from scheduler.utils import random_product, CourseFilter, UnavailableTime, BasicFilter
+from collections import deque
+from functools import reduce
+from heapq import heappush, heapreplace
+from itertools import combinations
+from operator import mul
+import random
+from typing import Dict, Iterator, List, Optional, Tuple
+from scraper.models import Section
+from scheduler.scoring import create_scorer, ScheduleScorer
+from scheduler.section_cache import get_sections, SectionRecord
+from scheduler.utils import (
+    random_product, meetings_to_mask, CourseFilter, UnavailableTime, BasicFilter,
+    SchedulePreferences, TimeBudget,
+)
 
 class NoSchedulesError(Exception):
     """ Custom exception class that will be raised if no schedules are possible
@@ -27,15 +36,25 @@ _NO_SCHEDULES_POSSIBLE = (
     'No schedules possible. '
     'Either select more sections or remove some of your busy times.'
 )
+_NO_SCHEDULES_IN_TIME = (
+    'No schedules were found in time. '
+    'Try selecting fewer sections or adding more of your busy times.'
+)
+
+# Number of random candidates to try before falling back to an exhaustive search.
+# Random sampling quickly finds varied schedules when many are possible, but can't tell
+# when no more schedules exist
+_MAX_RANDOM_CANDIDATES = 1_000
 
-def _apply_basic_filters(sections: QuerySet, course: CourseFilter):
-    """ Applies basic filters from a CourseFilter to a section QuerySet """
+def _apply_basic_filters(sections: List[SectionRecord],
+                         course: CourseFilter) -> List[SectionRecord]:
+    """ Applies basic filters from a CourseFilter to a list of sections """
     # Handle honors filter
     if course.honors is not BasicFilter.NO_PREFERENCE:
         if course.honors is BasicFilter.EXCLUDE:
-            sections = sections.filter(honors=False)
+            sections = [section for section in sections if section.honors is False]
         elif course.honors is BasicFilter.ONLY:
-            sections = sections.filter(honors=True)
+            sections = [section for section in sections if section.honors]
         if not sections:
             raise NoSchedulesError(_BASIC_FILTERS_TOO_RESTRICTIVE.format(
                 subject=course.subject,
@@ -47,10 +66,11 @@ def _apply_basic_filters(sections: QuerySet, course: CourseFilter):
         if course.remote is BasicFilter.EXCLUDE:
             # F2F with remote option should be included regardless of web attribute,
             # but F2F with remote option has web=True
-            sections = (sections.filter(remote=False)
-                        | sections.filter(instructional_method=Section.F2F_REMOTE_OPTION))
+            sections = [section for section in sections
+                        if section.remote is False
+                        or section.instructional_method == Section.F2F_REMOTE_OPTION]
         elif course.remote is BasicFilter.ONLY:
-            sections = sections.filter(remote=True)
+            sections = [section for section in sections if section.remote]
         if not sections:
             raise NoSchedulesError(_BASIC_FILTERS_TOO_RESTRICTIVE.format(
                 subject=course.subject,
@@ -60,9 +80,9 @@ def _apply_basic_filters(sections: QuerySet, course: CourseFilter):
     # Handle async filter
     if course.asynchronous is not BasicFilter.NO_PREFERENCE:
         if course.asynchronous is BasicFilter.EXCLUDE:
-            sections = sections.filter(asynchronous=False)
+            sections = [section for section in sections if not section.asynchronous]
         elif course.asynchronous is BasicFilter.ONLY:
-            sections = sections.filter(asynchronous=True)
+            sections = [section for section in sections if section.asynchronous]
         if not sections:
             raise NoSchedulesError(_BASIC_FILTERS_TOO_RESTRICTIVE.format(
                 subject=course.subject,
@@ -71,69 +91,47 @@ def _apply_basic_filters(sections: QuerySet, course: CourseFilter):
 
     return sections
 
-def _get_meetings(course: CourseFilter, term: str,
-                  unavailable_times: List[UnavailableTime]) -> Dict[str, Tuple[Meeting]]:
-    """ Gets all sections and meetings for each course in courses, and organizes them
-        by section_num
+def _get_meetings(course: CourseFilter, sections: Tuple[SectionRecord],
+                  unavailable_times: List[UnavailableTime]) -> Dict[int, SectionRecord]:
+    """ Filters a course's sections to the ones that match the course's filters and
+        the user's availability, and organizes them by section id
 
     Args:
-        course: Tuple of (subject, course_num) to find sections for
-        term: Term to find sections for
-        include_full: Whether or not to include classes with no seats in schedules
+        course: CourseFilter of the course to filter sections for
+        sections: All of the course's sections in the term, as returned by get_sections
         unavailable_times: Times that the user doesn't want to be in any courses
 
     Returns:
-        A dict of sections for the course with the section number as the key
-        and attributes for each meeting in the section as the value
+        A dict of sections for the course with the section id as the key
+        and the section's record, including its meetings, as the value
     """
-    # Create list of section_nums matching desired course
-    sections = Section.objects.filter(course_num=course.course_num,
-                                      subject=course.subject, term_code=term)
-
     # Note: filters should never result in no sections being available if called from
     # the frontend, since they're only selectable if some sections match the constraint
 
     # Handle section num filter
     if course.section_nums:
-        sections = sections.filter(section_num__in=course.section_nums)
+        section_nums = set(str(section_num) for section_num in course.section_nums)
+        sections = [section for section in sections
+                    if section.section_num in section_nums]
 
     sections = _apply_basic_filters(sections, course)
 
-    # Get id for each valid section to filter and order meeting data
-    # Also removes full sections if include_full is False
-    sections = sections.values('id', 'current_enrollment', 'max_enrollment')
+    # Remove full sections if include_full is False
     # If manually selected, don't check if section is full before adding
-    if course.section_nums or course.include_full:
-        section_ids = set(section['id'] for section in sections)
-    else:
-        section_ids = set(section['id'] for section in sections
-                          if section['current_enrollment'] < section['max_enrollment'])
-    if not section_ids:
+    if not (course.section_nums or course.include_full):
+        sections = [section for section in sections
+                    if section.current_enrollment < section.max_enrollment]
+    if not sections:
         raise NoSchedulesError(
             _NO_SECTIONS_WITH_SEATS.format(subject=course.subject,
                                            course_num=course.course_num)
         )
 
-    # Get meetings based on sections of the course and order them by end time
-    meetings = (Meeting.objects.filter(section_id__in=section_ids)
-                # Must be ordered by section id or groupby() doesn't work
-                .order_by('section_id')
-                .only('start_time', 'end_time', 'section_id', 'meeting_days'))
-
-    # Convert meeting_days into a set to check meeting days efficiently
-    for meeting in meetings:
-        meeting.meeting_days = set(i for i, day in enumerate(meeting.meeting_days) if day)
-
-    # Organize meetings by section number
-    meetings = {section_id: tuple(meetings)
-                for section_id, meetings in groupby(meetings, key=lambda m: m.section_id)}
-
-    # Filter sections incompatible with unavailable_times by trying to create a "schedule"
-    # containing the section and unavailable times
-    compatibility = ({"unavailable": unavailable_times}, meetings)
-    for section in tuple(meetings):
-        if not _schedule_valid(compatibility, ("unavailable", section)):
-            del meetings[section]
+    # Filter sections incompatible with unavailable_times, as well as sections
+    # without any meetings
+    unavailable_mask = meetings_to_mask(unavailable_times)
+    meetings = {section.id: section for section in sections
+                if section.meetings and not section.mask & unavailable_mask}
 
     if not meetings:
         raise NoSchedulesError(
@@ -142,61 +140,247 @@ def _get_meetings(course: CourseFilter, term: str,
         )
     return meetings
 
-def _partial_schedule_valid(meetings: Tuple[Dict[str, Iterable[Meeting]]],
-                            schedule: Tuple[str], added_i: int) -> bool:
-    """ Returns whether or not a schedule containing the chosen sections is valid
-        after adding the course at index added_i
+def _get_masks(meetings: Dict[int, SectionRecord]) -> Tuple[int]:
+    """ Gets the bitmask of the minutes of the week each section takes up.
+        See meetings_to_mask
 
     Args:
-        meetings: Dict mapping courses to section numbers to meetings
-        schedule: Sections to check
-        addded_i: index of class added to schedule, used to avoid checking all meetings
-                  against eachother
+        meetings: Dict mapping section ids to their records, as returned by _get_meetings
 
     Returns:
-        Whether the schedule is valid up to index added_i
+        A tuple of the bitmask for each section, in the same order as meetings
     """
-    added_section = meetings[added_i][schedule[added_i]]
-    for i, section in islice(enumerate(schedule), None, added_i):
-        checking_section = meetings[i][section]
-        for first_meeting in added_section:
-            first_start = first_meeting.start_time
-            first_end = first_meeting.end_time
-            # Don't compare meetings if they don't have valid start/end times
-            if first_start is None or first_end is None:
-                continue
-            for second_meeting in checking_section:
-                second_start = second_meeting.start_time
-                second_end = second_meeting.end_time
-                if second_start is None or second_end is None:
-                    continue
-                # Don't compare meetings if they don't share a day
-                if first_meeting.meeting_days.isdisjoint(second_meeting.meeting_days):
-                    continue
-                if first_start <= second_end and first_end >= second_start:
-                    return False
-    return True
+    return tuple(section.mask for section in meetings.values())
+
+def _build_compatibility(masks: Tuple[Tuple[int]]) -> Tuple[Tuple[List[int]]]:
+    """ Precomputes which sections of every pair of courses are compatible, so checking
+        a schedule is a table lookup per pair of sections instead of comparing their
+        meeting times every time.
+
+    Args:
+        masks: tuple containing the bitmask of each section for each course
 
-def _schedule_valid(meetings: Tuple[Dict[str, Tuple[Meeting]]],
-                    schedule: Tuple[str]) -> bool:
+    Returns:
+        compatibility[i][a][j] is a bitset of the sections of course j that are
+        compatible with section a of course i, where bit b corresponds to masks[j][b].
+        compatibility[i][a][i] is unused and always 0
+    """
+    compatibility = tuple(tuple([0] * len(masks) for _ in course_masks)
+                          for course_masks in masks)
+    for i, j in combinations(range(len(masks)), 2):
+        for a, first_mask in enumerate(masks[i]):
+            for b, second_mask in enumerate(masks[j]):
+                if not first_mask & second_mask:
+                    compatibility[i][a][j] |= 1 << b
+                    compatibility[j][b][i] |= 1 << a
+    return compatibility
+
+def _schedule_valid(compatibility: Tuple[Tuple[List[int]]],
+                    schedule: Tuple[int]) -> bool:
     """ Returns whether or not a schedule containing the sections in schedule
         is valid. Sections should be in the same order as courses, and assumed valid
 
     Args:
-        meetings: tuple of dicts mapping section numbers to meetings
-        schedule: list of section numbers to check for compatibility
+        compatibility: Compatibility table as returned by _build_compatibility
+        schedule: indices of the sections to check for compatibility, where schedule[i]
+                  is the index of the section chosen for course i
 
     Returns:
         Whether or not a schedule containing the given sections is valid
     """
-    for i in range(1, len(schedule)):
-        if not _partial_schedule_valid(meetings, schedule, i):
-            return False
+    for j in range(1, len(schedule)):
+        compatible = compatibility[j][schedule[j]]
+        for i in range(j):
+            if not compatible[i] >> schedule[i] & 1:
+                return False
     return True
 
-def create_schedules(courses: List[CourseFilter], term: str,
+def _bit_indices(bits: int) -> List[int]:
+    """ Returns the indices of the set bits in bits, in increasing order """
+    return [i for i in range(bits.bit_length()) if bits >> i & 1]
+
+def _assign_section(compatibility: Tuple[Tuple[List[int]]],
+                    schedule: Tuple[Optional[int]], domains: Tuple[int],
+                    course: int, section: int
+                   ) -> Optional[Tuple[Tuple[Optional[int]], Tuple[int]]]:
+    """ Adds a section to a partial schedule, and removes the sections it's incompatible
+        with from the domains of the courses that haven't been chosen yet
+
+    Args:
+        compatibility: Compatibility table as returned by _build_compatibility
+        schedule: Index of the section chosen for each course, or None if the course
+                  hasn't been chosen yet
+        domains: Bitset of the sections still possible for each course
+        course: Index of the course to choose a section for
+        section: Index of the section to choose
+
+    Returns:
+        The new (schedule, domains), or None if a course has no possible sections left
+    """
+    compatible = compatibility[course][section]
+    new_domains = tuple(
+        1 << section if i == course
+        else domain & compatible[i] if schedule[i] is None
+        else domain
+        for i, domain in enumerate(domains)
+    )
+    if not all(new_domains):
+        return None
+    new_schedule = schedule[:course] + (section,) + schedule[course + 1:]
+    return (new_schedule, new_domains)
+
+def _extend_schedule(compatibility: Tuple[Tuple[List[int]]],
+                     schedule: Tuple[Optional[int]], domains: Tuple[int],
+                     budget: TimeBudget) -> Iterator[Tuple[int]]:
+    """ Yields every valid schedule containing the sections in the partial schedule,
+        until budget expires. The course with the fewest possible sections left is
+        chosen next, and its sections are tried in a random order. See _assign_section
+        for the other arguments
+    """
+    if budget.expired():
+        return
+
+    unassigned = [i for i, section in enumerate(schedule) if section is None]
+    if not unassigned:
+        yield schedule
+        return
+
+    course = min(unassigned, key=lambda i: bin(domains[i]).count('1'))
+    sections = _bit_indices(domains[course])
+    random.shuffle(sections)
+    for section in sections:
+        branch = _assign_section(compatibility, schedule, domains, course, section)
+        if budget.record(branch is not None):
+            yield from _extend_schedule(compatibility, *branch, budget)
+
+def _search_schedules(compatibility: Tuple[Tuple[List[int]]],
+                      budget: TimeBudget) -> Iterator[Tuple[int]]:
+    """ Yields every valid schedule, as section indices, by building them one course at
+        a time and abandoning partial schedules as soon as a remaining course has no
+        compatible sections left. Unlike random sampling, this stops once it has proven
+        that no more schedules exist.
+
+        Schedules are taken from the branches for each section of the course with the
+        most sections in turn, so consecutive schedules don't all share most sections.
+
+    Args:
+        compatibility: Compatibility table as returned by _build_compatibility
+        budget: Time budget to stop searching once it expires
+
+    Yields:
+        Tuples containing the index of the chosen section for each course
+    """
+    schedule = (None,) * len(compatibility)
+    domains = tuple((1 << len(course)) - 1 for course in compatibility)
+    course = max(range(len(compatibility)), key=lambda i: len(compatibility[i]))
+
+    sections = list(range(len(compatibility[course])))
+    random.shuffle(sections)
+    branches = (_assign_section(compatibility, schedule, domains, course, section)
+                for section in sections)
+    branches = deque(_extend_schedule(compatibility, *branch, budget)
+                     for branch in branches if budget.record(branch is not None))
+    while branches:
+        branch = branches.popleft()
+        schedule = next(branch, None)
+        if schedule is not None:
+            yield schedule
+            branches.append(branch)
+
+def _best_schedules(compatibility: Tuple[Tuple[List[int]]], scorer: ScheduleScorer,
+                    num_schedules: int, budget: TimeBudget) -> List[Tuple[int]]:
+    """ Finds the valid schedules with the lowest costs using branch and bound.
+
+        Partial schedules are built like in _search_schedules, but the sections of each
+        course are tried from the lowest lower bound to the highest, and once
+        num_schedules schedules have been found, partial schedules whose lower bound
+        isn't below the worst of them are skipped since they can't beat it.
+
+    Args:
+        compatibility: Compatibility table as returned by _build_compatibility
+        scorer: Scorer to calculate schedule costs and lower bounds with
+        num_schedules: Number of schedules to find
+        budget: Time budget to stop searching once it expires
+
+    Returns:
+        Up to num_schedules schedules, as section indices, from lowest to highest cost.
+        If budget expired, these are the best of the schedules found before then
+    """
+    # Heap of (-cost, schedule) pairs, so best[0] is the worst of the best schedules
+    best = []
+
+    def extend(schedule: Tuple[Optional[int]], domains: Tuple[int]):
+        if budget.expired():
+            return
+
+        unassigned = [i for i, section in enumerate(schedule) if section is None]
+        if not unassigned:
+            entry = (-scorer.cost(schedule), schedule)
+            if len(best) < num_schedules:
+                heappush(best, entry)
+            elif entry > best[0]:
+                heapreplace(best, entry)
+            return
+
+        course = min(unassigned, key=lambda i: bin(domains[i]).count('1'))
+        sections = _bit_indices(domains[course])
+        # Shuffle first so sections with the same bound are tried in a random order
+        random.shuffle(sections)
+        branches = (_assign_section(compatibility, schedule, domains, course, section)
+                    for section in sections)
+        branches = sorted(((scorer.lower_bound(*branch), branch)
+                           for branch in branches if budget.record(branch is not None)),
+                          key=lambda bound_branch: bound_branch[0])
+        for bound, branch in branches:
+            # Branches are sorted by bound, so none of the rest can beat it either
+            if len(best) >= num_schedules and bound >= -best[0][0]:
+                break
+            extend(*branch)
+
+    extend((None,) * len(compatibility),
+           tuple((1 << len(course)) - 1 for course in compatibility))
+    return [schedule for _, schedule in sorted(best, reverse=True)]
+
+def _random_schedules(compatibility: Tuple[Tuple[List[int]]], num_schedules: int,
+                      budget: TimeBudget) -> List[Tuple[int]]:
+    """ Finds up to num_schedules random valid schedules, as section indices. Random
+        candidates are tried first, and if too few of them are valid, the rest are
+        found with _search_schedules
+
+    Args:
+        compatibility: Compatibility table as returned by _build_compatibility
+        num_schedules: Max number of schedules to find
+        budget: Time budget to stop searching once it expires
+    """
+    choices = tuple(range(len(course)) for course in compatibility)
+    num_candidates = reduce(mul, (len(course) for course in compatibility))
+
+    schedules = []
+    # Generate random arrangements of sections and create schedules
+    for schedule in random_product(*choices, limit=_MAX_RANDOM_CANDIDATES):
+        if budget.expired():
+            return schedules
+        if budget.record(_schedule_valid(compatibility, schedule)):
+            schedules.append(schedule)
+            if len(schedules) >= num_schedules:
+                return schedules
+
+    # Valid schedules may be rare, so search the rest exhaustively
+    if num_candidates > _MAX_RANDOM_CANDIDATES:
+        found = set(schedules)
+        for schedule in _search_schedules(compatibility, budget):
+            if schedule not in found:
+                schedules.append(schedule)
+                if len(schedules) >= num_schedules:
+                    break
+
+    return schedules
+
+def create_schedules(courses: List[CourseFilter], term: str, # pylint: disable=too-many-arguments
                      unavailable_times: List[UnavailableTime],
-                     num_schedules: int = 10) -> List[Tuple[int]]:
+                     num_schedules: int = 10,
+                     preferences: SchedulePreferences = None,
+                     budget: TimeBudget = None) -> List[Tuple[int]]:
     """ Generates and returns a schedule containing the courses provided as an argument.
 
     Args:
@@ -206,6 +390,11 @@ def create_schedules(courses: List[CourseFilter], term: str,
         include_full: Whether or not to include classes with no seats in schedules
         num_schedules: Max number of schedules to generate, will always try to make
                        at least 1
+        preferences: If given with any nonzero weights, the num_schedules schedules
+                     that best match them are returned, from best to worst. Otherwise
+                     random valid schedules are returned
+        budget: Time budget for the search. If it expires, the schedules found so far
+                are returned and budget.truncated is set. Defaults to no limit
 
     Returns:
         List of tuples each containing section ids of a valid schedule.
@@ -213,20 +402,33 @@ def create_schedules(courses: List[CourseFilter], term: str,
     """
     if not courses:
         raise NoSchedulesError(_NO_COURSES)
-    # meetings: Tuple of dicts mapping sections to meetings for each course
-    meetings = tuple(_get_meetings(course, term, unavailable_times)
-                     for course in courses)
-    # Get valid section ids for each course
-    valid_choices = tuple(tuple(section_ids) for section_ids in meetings)
+    if budget is None:
+        budget = TimeBudget()
+    # Fetch the sections for every course at once, then filter each course's sections
+    sections = get_sections([(course.subject, course.course_num) for course in courses],
+                            term)
+    # meetings: Tuple of dicts mapping section ids to sections for each course
+    meetings = tuple(_get_meetings(course, course_sections, unavailable_times)
+                     for course, course_sections in zip(courses, sections))
+    # Get valid section ids for each course. Schedules are built from the index of
+    # each course's section in here, and converted back to section ids at the end
+    section_ids = tuple(tuple(course_meetings) for course_meetings in meetings)
+    masks = tuple(_get_masks(course_meetings) for course_meetings in meetings)
+    compatibility = _build_compatibility(masks)
 
-    schedules = []
-    # Generate random arrangements of sections and create schedules
-    for schedule in random_product(*valid_choices):
-        if _schedule_valid(meetings, schedule):
-            schedules.append(schedule)
-            if len(schedules) >= num_schedules:
-                break
+    if preferences is not None and any(preferences):
+        scorer = create_scorer(
+            preferences, [(course.subject, course.course_num) for course in courses],
+            [tuple(course_meetings.values()) for course_meetings in meetings]
+        )
+        schedules = _best_schedules(compatibility, scorer, num_schedules, budget)
+    else:
+        schedules = _random_schedules(compatibility, num_schedules, budget)
+
+    schedules = [tuple(ids[section] for ids, section in zip(section_ids, schedule))
+                 for schedule in schedules]
 
     if not schedules:
-        raise NoSchedulesError(_NO_SCHEDULES_POSSIBLE)
+        raise NoSchedulesError(_NO_SCHEDULES_IN_TIME if budget.truncated
+                               else _NO_SCHEDULES_POSSIBLE)
     return schedules
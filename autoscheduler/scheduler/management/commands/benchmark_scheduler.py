@@ -0,0 +1,178 @@
+import json
+import math
+import random
+from time import perf_counter
+from typing import Dict, List
+from django.core.management import base
+from scheduler.create_schedules import create_schedules, NoSchedulesError
+from scheduler.management.commands.utils.benchmark_corpus import (
+    BenchmarkRequest, CORPUS, COURSES,
+)
+from scheduler.management.commands.utils.synthetic_term import (
+    TermInUseError, TermOptions, generate_term, save_term, delete_term,
+)
+from scheduler.utils import TimeBudget
+
+# Term code the synthetic term is saved as. Terms with real data are refused
+_DEFAULT_TERM = 199931
+
+def percentile(values: List[float], fraction: float) -> float:
+    """ Returns the nearest-rank percentile of values, where fraction is from 0 to 1 """
+    values = sorted(values)
+    rank = max(1, math.ceil(fraction * len(values)))
+    return values[rank - 1]
+
+def run_request(request: BenchmarkRequest, term: int, repeat: int,
+                num_schedules: int) -> Dict[str, float]:
+    """ Times create_schedules for a request, after running it once to warm the
+        section cache up
+
+    Args:
+        request: The request to run
+        term: Term code of the synthetic term
+        repeat: Number of times to run the request
+        num_schedules: Number of schedules to generate, like ScheduleView's
+
+    Returns:
+        A dict containing the p50 & p95 times in milliseconds, the mean number of
+        candidates checked, the fraction of candidates that were rejected, and the mean
+        number of schedules found
+    """
+    times = []
+    candidates = rejected = schedules_found = 0
+    for i in range(repeat + 1):
+        # Seed each run so candidate counts are the same every time it's benchmarked
+        random.seed(i)
+        budget = TimeBudget()
+        start = perf_counter()
+        try:
+            schedules = create_schedules(request.courses, str(term),
+                                         request.unavailable_times, num_schedules,
+                                         request.preferences, budget)
+        except NoSchedulesError:
+            schedules = []
+        elapsed = perf_counter() - start
+
+        if i == 0: # Warm up run
+            continue
+        times.append(elapsed * 1000)
+        candidates += budget.candidates
+        rejected += budget.rejected
+        schedules_found += len(schedules)
+
+    return {
+        'p50_ms': percentile(times, 0.5),
+        'p95_ms': percentile(times, 0.95),
+        'candidates': candidates / repeat,
+        'rejection_rate': rejected / candidates if candidates else 0,
+        'schedules': schedules_found / repeat,
+    }
+
+def _change(old: float, new: float) -> str:
+    """ Formats the relative change from old to new """
+    if not old:
+        return 'n/a'
+    return f'{(new - old) / old:+.1%}'
+
+def compare_results(baseline: Dict, results: Dict) -> List[str]:
+    """ Compares benchmark results with a baseline from another revision
+
+    Args:
+        baseline: Results loaded from a previous --output file
+        results: Results of this run
+
+    Returns:
+        A line for each request in both, showing how its times and candidates changed
+    """
+    lines = []
+    if baseline['options'] != results['options']:
+        lines.append('Warning: the baseline was run with different options '
+                     f'({baseline["options"]}), so results may not be comparable')
+
+    for name, new in results['requests'].items():
+        old = baseline['requests'].get(name)
+        if old is None:
+            continue
+        lines.append(
+            f'{name:<26} p50 {old["p50_ms"]:8.2f} -> {new["p50_ms"]:8.2f} ms '
+            f'({_change(old["p50_ms"], new["p50_ms"])})  '
+            f'p95 {old["p95_ms"]:8.2f} -> {new["p95_ms"]:8.2f} ms '
+            f'({_change(old["p95_ms"], new["p95_ms"])})  '
+            f'candidates ({_change(old["candidates"], new["candidates"])})'
+        )
+    return lines
+
+class Command(base.BaseCommand):
+    """ Benchmarks create_schedules on a fixed corpus of requests against a synthetic
+        term, and optionally compares the results with another revision's.
+
+        To compare two revisions, run this with --output on one, then with --compare on
+        the other.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--term', type=int, default=_DEFAULT_TERM,
+                            help=('Term code to generate the synthetic term as. Must '
+                                  "not have any data that wasn't generated"))
+        parser.add_argument('--sections', type=int, default=20,
+                            help='Number of sections each course has')
+        parser.add_argument('--meetings', type=int, default=2,
+                            help='Number of meetings each section has')
+        parser.add_argument('--fill-rate', type=float, default=0.3,
+                            help='Fraction of sections without any seats left')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed used to generate the synthetic term')
+        parser.add_argument('--repeat', '-r', type=int, default=20,
+                            help='Number of times to run each request')
+        parser.add_argument('--num-schedules', type=int, default=5,
+                            help='Number of schedules each request generates')
+        parser.add_argument('--output', '-o',
+                            help='File to save the results to as JSON')
+        parser.add_argument('--compare', '-c',
+                            help='Results file from another revision to compare with')
+        parser.add_argument('--keep', action='store_true',
+                            help="Don't delete the synthetic term afterwards")
+
+    def handle(self, *args, **options):
+        term = options['term']
+        term_options = TermOptions(sections_per_course=options['sections'],
+                                   meetings_per_section=options['meetings'],
+                                   fill_rate=options['fill_rate'], seed=options['seed'])
+
+        sections, meetings = generate_term(term, COURSES, term_options)
+        try:
+            save_term(term, sections, meetings)
+        except TermInUseError as err:
+            raise base.CommandError(str(err)) from err
+        print(f'Generated {len(sections)} sections and {len(meetings)} meetings '
+              f'for {len(COURSES)} courses')
+
+        results = {
+            'options': dict(term_options._asdict(), repeat=options['repeat'],
+                            num_schedules=options['num_schedules']),
+            'requests': {},
+        }
+        try:
+            for request in CORPUS:
+                result = run_request(request, term, options['repeat'],
+                                     options['num_schedules'])
+                results['requests'][request.name] = result
+                print(f'{request.name:<26} p50 {result["p50_ms"]:8.2f} ms  '
+                      f'p95 {result["p95_ms"]:8.2f} ms  '
+                      f'candidates {result["candidates"]:10.1f}  '
+                      f'rejected {result["rejection_rate"]:6.1%}  '
+                      f'schedules {result["schedules"]:.1f}')
+        finally:
+            if not options['keep']:
+                delete_term(term)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            print(f'Saved results to {options["output"]}')
+
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                baseline = json.load(baseline)
+            print(f'\nCompared with {options["compare"]}:')
+            print('\n'.join(compare_results(baseline, results)))
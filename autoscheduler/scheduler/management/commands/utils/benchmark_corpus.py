@@ -0,0 +1,57 @@
+""" Fixed set of realistic /scheduler/generate requests used by benchmark_scheduler.
+
+    Each request is run against a synthetic term (see synthetic_term), which contains
+    every course in COURSES. Changing these changes what benchmark results mean, so
+    results from before and after a change can't be compared.
+"""
+
+from datetime import time
+from typing import List, NamedTuple, Optional
+from scheduler.utils import (
+    BasicFilter, CourseFilter, SchedulePreferences, UnavailableTime,
+)
+
+class BenchmarkRequest(NamedTuple):
+    """ The arguments of a single call to create_schedules """
+    name: str
+    courses: List[CourseFilter]
+    unavailable_times: List[UnavailableTime]
+    preferences: Optional[SchedulePreferences] = None
+
+def _busy(start: int, end: int, days=range(5)) -> List[UnavailableTime]:
+    """ Creates busy times from start:00 to end:00 on each of the given days """
+    return [UnavailableTime(time(start), time(end), day) for day in days]
+
+_FRESHMAN = [CourseFilter('ENGR', '102'), CourseFilter('MATH', '151'),
+             CourseFilter('CHEM', '107'), CourseFilter('CHEM', '117'),
+             CourseFilter('ENGL', '104')]
+_SOPHOMORE = [CourseFilter('CSCE', '221'), CourseFilter('CSCE', '222'),
+              CourseFilter('MATH', '304'), CourseFilter('STAT', '211'),
+              CourseFilter('COMM', '203')]
+_HEAVY = _SOPHOMORE + [CourseFilter('PHYS', '207'), CourseFilter('POLS', '206')]
+
+CORPUS = [
+    BenchmarkRequest('freshman', _FRESHMAN, []),
+    BenchmarkRequest('sophomore', _SOPHOMORE, []),
+    BenchmarkRequest('sophomore_mornings_busy', _SOPHOMORE, _busy(8, 10)),
+    BenchmarkRequest('sophomore_part_time_job', _SOPHOMORE,
+                     _busy(13, 17, days=(0, 2, 4)) + _busy(8, 12, days=(1, 3))),
+    BenchmarkRequest('heavy_load', _HEAVY, []),
+    BenchmarkRequest('heavy_load_include_full',
+                     [course._replace(include_full=True) for course in _HEAVY], []),
+    BenchmarkRequest('honors_only',
+                     [course._replace(honors=BasicFilter.ONLY, include_full=True)
+                      for course in _FRESHMAN[:3]], []),
+    BenchmarkRequest('selected_sections',
+                     [course._replace(section_nums=['501', '502', '503', '504'])
+                      for course in _HEAVY], []),
+    BenchmarkRequest('mostly_busy', _FRESHMAN, _busy(8, 14) + _busy(16, 22)),
+    BenchmarkRequest('ranked', _SOPHOMORE, [],
+                     SchedulePreferences(gaps=1, early_start=1, days=2)),
+    BenchmarkRequest('ranked_heavy_load', _HEAVY, _busy(8, 9),
+                     SchedulePreferences(gaps=2, days=1)),
+]
+
+# Every course used by the corpus
+COURSES = sorted(set((course.subject, course.course_num)
+                     for request in CORPUS for course in request.courses))
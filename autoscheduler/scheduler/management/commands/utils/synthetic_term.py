@@ -0,0 +1,153 @@
+""" Generates synthetic terms of sections and meetings for benchmarking the scheduler.
+
+    Sections are laid out like a real term: each section has a lecture on MWF or TR in
+    one of the usual time slots, and any other meetings are single-day labs. Terms are
+    generated from a seed, so the same arguments always give the same term.
+"""
+
+from datetime import time
+import random
+from typing import List, NamedTuple, Sequence, Tuple
+from django.db import transaction
+from django.utils import timezone
+from scraper.models import Course, Meeting, Section, Term
+
+# Start times of the usual time slots, as (hour, minute). MWF lectures are 50 minutes
+# long, TR lectures are 75 minutes long, and labs are 110 minutes long
+_MWF_STARTS = [(hour, 0) for hour in range(8, 18)]
+_TR_STARTS = [(8, 0), (9, 35), (11, 10), (12, 45), (14, 20), (15, 55), (17, 30)]
+_LAB_STARTS = [(hour, 0) for hour in range(8, 18)]
+
+_MWF = (0, 2, 4)
+_TR = (1, 3)
+
+# Fraction of sections that are honors sections
+_HONORS_RATE = 0.1
+
+# Generated section ids are the term code followed by a number up to this
+_IDS_PER_TERM = 1_000_000
+
+class TermInUseError(Exception):
+    """ Raised when a term has data that wasn't generated by generate_term, so it can't
+        be replaced or deleted
+    """
+
+class TermOptions(NamedTuple):
+    """ Options for generate_term
+
+    Fields:
+        sections_per_course: Number of sections each course has
+        meetings_per_section: Number of meetings each section has, at least 1
+        fill_rate: Fraction of sections that have no seats left
+        seed: Seed for the random number generator
+    """
+    sections_per_course: int = 20
+    meetings_per_section: int = 2
+    fill_rate: float = 0.3
+    seed: int = 0
+
+def _add_minutes(hour: int, minute: int, minutes: int) -> time:
+    """ Returns the time a given number of minutes after hour:minute """
+    total = hour * 60 + minute + minutes
+    return time(total // 60, total % 60)
+
+def _meeting_days(days: Sequence[int]) -> List[bool]:
+    """ Converts day numbers to a Meeting's meeting_days """
+    return [day in days for day in range(7)]
+
+def _generate_meetings(rng: random.Random, section: Section,
+                       num_meetings: int) -> List[Meeting]:
+    """ Generates a lecture for the section, followed by num_meetings - 1 labs """
+    if rng.random() < 0.5:
+        days, starts, length = _MWF, _MWF_STARTS, 50
+    else:
+        days, starts, length = _TR, _TR_STARTS, 75
+    lectures = [(days, rng.choice(starts), length, 'LEC')]
+    labs = [((rng.randrange(5),), rng.choice(_LAB_STARTS), 110, 'LAB')
+            for _ in range(num_meetings - 1)]
+
+    return [Meeting(id=section.id * 10 + count, section=section,
+                    meeting_days=_meeting_days(days), start_time=time(*start),
+                    end_time=_add_minutes(*start, length), meeting_type=meeting_type)
+            for count, (days, start, length, meeting_type) in enumerate(lectures + labs)]
+
+def generate_term(term: int, courses: Sequence[Tuple[str, str]],
+                  options: TermOptions) -> Tuple[List[Section], List[Meeting]]:
+    """ Generates unsaved sections and meetings for the given courses
+
+    Args:
+        term: Term code to generate sections for
+        courses: (subject, course_num) pairs of the courses to generate
+        options: How to generate the term
+
+    Returns:
+        A tuple of the generated sections and meetings
+    """
+    rng = random.Random(options.seed)
+    sections = []
+    meetings = []
+    # Ids are prefixed with the term so they can't collide with scraped sections, and
+    # so check_synthetic can tell generated sections apart from them
+    next_id = term * _IDS_PER_TERM
+
+    for subject, course_num in courses:
+        # Honors sections are numbered 201, 202, ..., and regular ones 501, 502, ...
+        section_nums = {True: 201, False: 501}
+        for _ in range(options.sections_per_course):
+            honors = rng.random() < _HONORS_RATE
+            full = rng.random() < options.fill_rate
+            section_num = section_nums[honors]
+            section_nums[honors] += 1
+            next_id += 1
+            section = Section(id=next_id, crn=next_id % 100_000, subject=subject,
+                              course_num=course_num, section_num=str(section_num),
+                              term_code=term, min_credits=3, honors=honors, remote=False,
+                              asynchronous=False, max_enrollment=30,
+                              current_enrollment=30 if full else rng.randrange(30),
+                              instructional_method=Section.F2F)
+            sections.append(section)
+            meetings += _generate_meetings(rng, section, options.meetings_per_section)
+
+    return (sections, meetings)
+
+def save_term(term: int, sections: List[Section], meetings: List[Meeting]):
+    """ Replaces the sections of the given term with generated ones, and marks the term
+        as updated so cached data for it is rebuilt
+
+    Raises:
+        TermInUseError: If the term has data that wasn't generated (see check_synthetic)
+    """
+    with transaction.atomic():
+        delete_term(term)
+        Section.objects.bulk_create(sections)
+        Meeting.objects.bulk_create(meetings)
+        Term.objects.update_or_create(code=term,
+                                      defaults={'last_updated': timezone.now()})
+
+def check_synthetic(term: int):
+    """ Checks that the term's data (if any) was all generated by generate_term, so
+        it's safe to replace or delete
+
+    Raises:
+        TermInUseError: If the term has sections that weren't generated, any courses,
+                        or a Term entry without any generated sections
+    """
+    sections = Section.objects.filter(term_code=term)
+    first_id = term * _IDS_PER_TERM
+    generated = sections.filter(id__gt=first_id, id__lt=first_id + _IDS_PER_TERM)
+
+    if (sections.exclude(pk__in=generated).exists()
+            or Course.objects.filter(term=str(term)).exists()
+            or (Term.objects.filter(code=term).exists() and not generated.exists())):
+        raise TermInUseError(f'Term {term} has data that was not generated for '
+                             'benchmarking, so it will not be replaced. Use another term')
+
+def delete_term(term: int):
+    """ Deletes all sections (and their meetings) and the Term entry of a term
+
+    Raises:
+        TermInUseError: If the term has data that wasn't generated (see check_synthetic)
+    """
+    check_synthetic(term)
+    Section.objects.filter(term_code=term).delete()
+    Term.objects.filter(code=term).delete()
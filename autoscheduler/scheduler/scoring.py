@@ -0,0 +1,196 @@
+""" Scores schedules by how well they match a user's SchedulePreferences.
+
+    Scores are costs, so lower is better. Every part of a cost except for gaps can only
+    grow as sections are added to a schedule. Gaps can shrink, but only by filling them
+    with sections of courses that haven't been chosen yet, so idle minutes between a
+    day's meetings that none of those sections could fill are there to stay. The cost
+    of a partial schedule counting only those gaps is therefore a lower bound on the
+    cost of any schedule containing it. create_schedules uses this to skip partial
+    schedules that can't beat the best ones it's found so far.
+"""
+
+from functools import reduce
+from operator import or_
+from typing import Dict, Optional, Sequence, Tuple
+from django.db.models import Q
+from scraper.models import GradeSummary
+from scheduler.section_cache import SectionRecord
+from scheduler.utils import MINUTES_PER_DAY, SchedulePreferences
+
+# Minute of the day that early_start counts each day's first class from
+_EARLY_START_CUTOFF = 12 * 60
+
+_DAY_MASK = (1 << MINUTES_PER_DAY) - 1
+
+# The best GPA possible, which a section's GPA cost is measured from
+_MAX_GPA = 4.0
+
+def get_instructor_gpas(courses: Sequence[Tuple[str, str]]
+                       ) -> Dict[Tuple[str, str, str, bool], float]:
+    """ Gets the average GPA of every instructor who's taught the given courses from
+        their GradeSummary, in a single query. This is the same GPA as
+        Grades.objects.instructor_performance
+
+    Args:
+        courses: (subject, course_num) pairs of the courses to get GPAs for
+
+    Returns:
+        A dict mapping (subject, course_num, instructor id, honors) to the average GPA
+    """
+    courses_query = reduce(or_, (Q(subject=subject, course_num=str(course_num))
+                                 for subject, course_num in courses))
+    gpas = (GradeSummary.objects.filter(courses_query)
+            .values_list('subject', 'course_num', 'instructor_id', 'honors', 'gpa'))
+    return {tuple(key): gpa for *key, gpa in gpas}
+
+def get_gpa_costs(course: Tuple[str, str], sections: Sequence[SectionRecord],
+                  gpas: Dict[Tuple[str, str, str, bool], float]) -> Tuple[float]:
+    """ Gets how far below a 4.0 each section's instructor's average GPA is.
+
+        Sections without any grades cost the same as the course's average, since every
+        schedule contains exactly one section of each course and only differences
+        between sections affect rankings.
+
+    Args:
+        course: (subject, course_num) of the course the sections are for
+        sections: The course's sections
+        gpas: Instructors' GPAs, as returned by get_instructor_gpas
+
+    Returns:
+        A tuple of each section's cost, in the same order as sections
+    """
+    subject, course_num = course
+    costs = [_MAX_GPA - gpas[key] if key in gpas else None
+             for key in ((subject, str(course_num), section.instructor_id, section.honors)
+                         for section in sections)]
+    known = [cost for cost in costs if cost is not None]
+    default = sum(known) / len(known) if known else 0
+    return tuple(default if cost is None else cost for cost in costs)
+
+def _popcount(mask: int) -> int:
+    """ Counts the set bits of mask """
+    return bin(mask).count('1')
+
+def _day_costs(mask: int) -> Tuple[int, int, int]:
+    """ Measures the days of the week in a schedule's bitmask. See meetings_to_mask
+
+    Returns:
+        A tuple of the number of days with any meetings, the total minutes that each
+        day's first meeting starts before _EARLY_START_CUTOFF, and a bitmask of the
+        minutes between meetings on the same day, in the same format as mask
+    """
+    days = early_minutes = idle = 0
+    offset = 0
+    while mask:
+        day = mask & _DAY_MASK
+        mask >>= MINUTES_PER_DAY
+        if day:
+            first = (day & -day).bit_length() - 1
+            last = day.bit_length() - 1
+            days += 1
+            early_minutes += max(0, _EARLY_START_CUTOFF - first)
+            span = (1 << (last + 1)) - (1 << first)
+            idle |= (span & ~day) << offset
+        offset += MINUTES_PER_DAY
+    return (days, early_minutes, idle)
+
+class ScheduleScorer:
+    """ Calculates the costs of schedules made up of section indices, as used by
+        create_schedules
+
+    Args:
+        preferences: The weights of each cost
+        masks: tuple containing the bitmask of each section for each course
+        gpa_costs: tuple containing the GPA cost of each section for each course, as
+                   returned by get_gpa_costs
+    """
+
+    def __init__(self, preferences: SchedulePreferences, masks: Tuple[Tuple[int]],
+                 gpa_costs: Tuple[Tuple[float]]):
+        self.preferences = preferences
+        self.masks = masks
+        self.gpa_costs = gpa_costs
+        # The lowest GPA cost any section of each course could add
+        self._min_gpa_costs = tuple(min(costs) for costs in gpa_costs)
+        # Maps (course, domain) to the minutes any section in the domain takes up
+        self._domain_masks = {}
+
+    def _cost_without_gaps(self, schedule: Tuple[Optional[int]]) -> Tuple[float, int]:
+        """ Calculates the cost of a (possibly partial) schedule, except for its gaps.
+            Courses that haven't been chosen yet are counted as their cheapest possible
+            section's GPA cost
+
+        Returns:
+            A tuple of the cost and the bitmask of the schedule's gaps (see _day_costs)
+        """
+        mask = reduce(or_, (self.masks[i][section] for i, section in enumerate(schedule)
+                            if section is not None), 0)
+        days, early_minutes, idle = _day_costs(mask)
+
+        gpa_cost = sum(self._min_gpa_costs[i] if section is None
+                       else self.gpa_costs[i][section]
+                       for i, section in enumerate(schedule))
+
+        cost = (self.preferences.days * days
+                + self.preferences.early_start * early_minutes / 60
+                + self.preferences.gpa * gpa_cost)
+        return (cost, idle)
+
+    def _domain_mask(self, course: int, domain: int) -> int:
+        """ Gets the bitmask of the minutes taken up by any of the course's sections
+            whose bits are set in domain
+        """
+        key = (course, domain)
+        mask = self._domain_masks.get(key)
+        if mask is None:
+            mask = reduce(or_, (section_mask for i, section_mask
+                                in enumerate(self.masks[course]) if domain >> i & 1), 0)
+            self._domain_masks[key] = mask
+        return mask
+
+    def cost(self, schedule: Tuple[int]) -> float:
+        """ Calculates the cost of a complete schedule """
+        cost, idle = self._cost_without_gaps(schedule)
+        return cost + self.preferences.gaps * _popcount(idle) / 60
+
+    def lower_bound(self, schedule: Tuple[Optional[int]],
+                    domains: Optional[Tuple[int]] = None) -> float:
+        """ Calculates the lowest cost that any schedule containing the sections in a
+            partial schedule could have. Courses that haven't been chosen yet are None
+
+        Args:
+            schedule: The partial schedule
+            domains: Bitsets of the sections that can still be chosen for each course,
+                     as used by create_schedules. Gaps are only counted if this is
+                     given, since otherwise any section could fill them
+        """
+        cost, idle = self._cost_without_gaps(schedule)
+        if not self.preferences.gaps or domains is None or not idle:
+            return cost
+
+        # Gaps can only be filled by the sections left in the unchosen courses' domains
+        fillable = reduce(or_, (self._domain_mask(i, domains[i])
+                                for i, section in enumerate(schedule) if section is None),
+                          0)
+        return cost + self.preferences.gaps * _popcount(idle & ~fillable) / 60
+
+def create_scorer(preferences: SchedulePreferences, courses: Sequence[Tuple[str, str]],
+                  sections: Sequence[Sequence[SectionRecord]]) -> ScheduleScorer:
+    """ Creates a ScheduleScorer for schedules of the given sections. Instructors' GPAs
+        are only queried for if preferences.gpa is set
+
+    Args:
+        preferences: The weights of each cost
+        courses: (subject, course_num) pairs of each course
+        sections: The sections that can be chosen for each course, in the same order
+                  that schedules refer to them by
+    """
+    masks = tuple(tuple(section.mask for section in course_sections)
+                  for course_sections in sections)
+    if preferences.gpa:
+        gpas = get_instructor_gpas(courses)
+        gpa_costs = tuple(get_gpa_costs(course, course_sections, gpas)
+                          for course, course_sections in zip(courses, sections))
+    else:
+        gpa_costs = tuple((0,) * len(course_sections) for course_sections in sections)
+    return ScheduleScorer(preferences, masks, gpa_costs)
@@ -0,0 +1,122 @@
+""" In-process cache of the section and meeting data needed to generate schedules.
+
+    Every call to /scheduler/generate needs the sections and meetings of each course
+    it's given, which only change when scrape_courses runs. Rather than querying for
+    them each time, they're loaded into compact records the first time each course is
+    used, and kept until the course's term is rescraped or its enrollment is refreshed
+    (since the records include enrollment). Courses that aren't cached yet are loaded
+    together, so a request takes at most a few queries. Courses without any sections
+    aren't cached, so requests for made-up courses can't grow the cache.
+"""
+
+from collections import defaultdict
+from datetime import time
+from functools import reduce
+from itertools import groupby
+from operator import or_
+from typing import Dict, FrozenSet, Iterable, NamedTuple, Sequence, Tuple
+from django.db.models import Q
+from scraper.models import Meeting, Section
+from scraper.term_cache import TermCache
+from scheduler.utils import meetings_to_mask
+
+class MeetingRecord(NamedTuple):
+    """ The fields of a Meeting needed for scheduling. meeting_days is the set of day
+        numbers the meeting is on, where 0 is Monday
+    """
+    id: int
+    start_time: time
+    end_time: time
+    meeting_days: FrozenSet[int]
+
+class SectionRecord(NamedTuple):
+    """ The fields of a Section needed for scheduling, along with its meetings and a
+        bitmask of the minutes of the week they take up (see meetings_to_mask)
+    """
+    id: int
+    section_num: str
+    instructor_id: str
+    honors: bool
+    remote: bool
+    asynchronous: bool
+    instructional_method: str
+    current_enrollment: int
+    max_enrollment: int
+    meetings: Tuple[MeetingRecord]
+    mask: int
+
+# Maps each term to a dict mapping (subject, course_num) to the course's sections
+_SECTIONS_CACHE = TermCache(lambda term: {}, include_enrollment=True)
+
+def _load_sections(courses: Iterable[Tuple[str, str]],
+                   term: str) -> Dict[Tuple[str, str], Tuple[SectionRecord]]:
+    """ Queries the database for the sections and meetings of all of the given courses
+        at once and converts them to records
+
+    Args:
+        courses: (subject, course_num) pairs of the courses to load
+        term: Term code to load sections for
+
+    Returns:
+        A dict mapping each (subject, course_num) pair to the course's sections,
+        ordered by id. Courses without any sections are left out
+    """
+    courses_query = reduce(or_, (Q(subject=subject, course_num=course_num)
+                                 for subject, course_num in courses))
+    sections = list(Section.objects.filter(courses_query, term_code=term)
+                    .order_by('id')
+                    .values_list('subject', 'course_num', 'id', 'section_num',
+                                 'instructor_id', 'honors', 'remote', 'asynchronous',
+                                 'instructional_method', 'current_enrollment',
+                                 'max_enrollment'))
+    section_ids = [section[2] for section in sections]
+    meetings = (Meeting.objects.filter(section_id__in=section_ids)
+                # Must be ordered by section id or groupby() doesn't work
+                .order_by('section_id')
+                .values_list('section_id', 'id', 'start_time', 'end_time',
+                             'meeting_days'))
+
+    meetings = {
+        section_id: tuple(MeetingRecord(meeting_id, start_time, end_time,
+                                        frozenset(i for i, day in enumerate(days) if day))
+                          for _, meeting_id, start_time, end_time, days in group)
+        for section_id, group in groupby(meetings, key=lambda meeting: meeting[0])
+    }
+
+    records = defaultdict(list)
+    for subject, course_num, *section in sections:
+        section_meetings = meetings.get(section[0], ())
+        records[(subject, course_num)].append(
+            SectionRecord(*section, section_meetings, meetings_to_mask(section_meetings))
+        )
+    return {course: tuple(sections) for course, sections in records.items()}
+
+def get_sections(courses: Sequence[Tuple[str, str]],
+                 term: str) -> Tuple[Tuple[SectionRecord]]:
+    """ Gets the sections of each of the given courses. Courses that aren't already in
+        the cache are loaded together, so this takes at most one query for the term
+        and two for the sections & meetings.
+
+    Args:
+        courses: (subject, course_num) pairs of the courses to get sections for
+        term: Term code to get sections for
+
+    Returns:
+        A tuple containing a tuple of SectionRecords for each course, in the same order
+        as courses. Sections are ordered by id
+    """
+    courses = [(subject, str(course_num)) for subject, course_num in courses]
+    # Term hasn't been scraped if this is None, in which case don't cache it
+    term_sections = _SECTIONS_CACHE.get(term)
+    if term_sections is None:
+        term_sections = {}
+
+    missing = set(course for course in courses if course not in term_sections)
+    if missing:
+        term_sections.update(_load_sections(missing, term))
+
+    return tuple(term_sections.get(course, ()) for course in courses)
+
+def clear_cache():
+    """ Removes all cached sections """
+    _SECTIONS_CACHE.clear()
@@ -1,9 +1,12 @@
+import json
 from unittest.mock import patch
 from datetime import time
 from rest_framework.test import APITestCase, APIClient
 from scheduler.views import (_parse_course_filter, _parse_unavailable_time,
-                             _serialize_schedules)
-from scheduler.utils import UnavailableTime, CourseFilter, BasicFilter
+                             _parse_preferences, _serialize_schedules)
+from scheduler.utils import (
+    UnavailableTime, CourseFilter, BasicFilter, SchedulePreferences,
+)
 from scraper.models import Section, Instructor
 from scraper.serializers import SectionSerializer
 
@@ -69,6 +72,69 @@ class SchedulingAPITests(APITestCase):
         # Assert
         self.assertEqual(result, expected)
 
+    def test_parse_preferences_defaults_missing_weights(self):
+        """ Tests that _parse_preferences converts weights and ignores missing ones """
+
+        # Arrange
+        preferences = {
+            "earlyStart": 2,
+            "gpa": "1.5",
+        }
+
+        expected = SchedulePreferences(gaps=0, early_start=2, days=0, gpa=1.5)
+
+        # Act
+        result = _parse_preferences(preferences)
+
+        # Assert
+        self.assertEqual(result, expected)
+
+    def test_parse_preferences_handles_null_preferences(self):
+        """ Tests that _parse_preferences treats null preferences as no preferences """
+
+        # Arrange
+        expected = SchedulePreferences()
+
+        # Act
+        result = _parse_preferences(None)
+
+        # Assert
+        self.assertEqual(result, expected)
+
+    def test_parse_preferences_rejects_invalid_weights(self):
+        """ Tests that _parse_preferences raises a ValueError for weights that are
+            negative, not finite, or not numbers
+        """
+
+        # Arrange
+        weights = [-1, "-0.5", "nan", "inf", "fast", None, [1]]
+
+        for weight in weights:
+            with self.subTest(weight=weight):
+                # Act + Assert
+                with self.assertRaises(ValueError):
+                    _parse_preferences({"earlyStart": weight})
+
+    def test_route_scheduling_generate_rejects_invalid_preferences(self):
+        """ Tests that /scheduling/generate responds with a 400 for negative weights """
+
+        # Arrange
+        request_body = {
+            "term": "201931",
+            "courses": [
+                {"subject": "CSCE", "courseNum": 121, "sections": [],
+                 "honors": "exclude", "remote": "exclude", "asynchronous": "exclude"},
+            ],
+            "availabilities": [],
+            "preferences": {"earlyStart": -1, "days": 1},
+        }
+
+        # Act
+        result = self.client.post('/scheduler/generate', request_body, format='json')
+
+        # Assert
+        self.assertEqual(result.status_code, 400)
+
     def test_serialize_schedules_is_correct(self):
         """ Tests that _serialize_schedule works on a typical input """
 
@@ -80,7 +146,7 @@ class SchedulingAPITests(APITestCase):
         ]
 
         # Act
-        result = _serialize_schedules(schedule)
+        result = [json.loads(schedule) for schedule in _serialize_schedules(schedule)]
 
         # Assert
         self.assertEqual(result, expected)
@@ -96,7 +162,7 @@ class SchedulingAPITests(APITestCase):
         ]
 
         # Act
-        result = _serialize_schedules(schedule)
+        result = [json.loads(schedule) for schedule in _serialize_schedules(schedule)]
 
         # Assert
         self.assertEqual(result, expected)
@@ -112,7 +178,7 @@ class SchedulingAPITests(APITestCase):
         expected = []
 
         # Act
-        result = _serialize_schedules(schedule)
+        result = [json.loads(schedule) for schedule in _serialize_schedules(schedule)]
 
         # Assert
         self.assertEqual(result, expected)
@@ -153,6 +219,7 @@ class SchedulingAPITests(APITestCase):
         expected = {
             'schedules': [[SectionSerializer(section).data for section in self.sections]],
             'message': '',
+            'truncated': False,
         }
 
         # Act
@@ -161,3 +228,40 @@ class SchedulingAPITests(APITestCase):
 
         # Assert
         self.assertEqual(result, expected)
+
+    @patch('scheduler.views.create_schedules')
+    def test_route_scheduling_generate_gives_normalized_schedules(
+            self, create_schedules_mock):
+        """ Tests that /scheduling/generate?normalized=true gives each section once,
+            and each schedule as a list of section ids
+        """
+
+        # Arrange
+        create_schedules_mock.return_value = [(1, 2), (1,)]
+
+        request_body = {
+            "term": "201931",
+            "courses": [
+                {"subject": "CSCE", "courseNum": 221, "sections": [],
+                 "honors": "exclude", "remote": "exclude", "asynchronous": "exclude"},
+                {"subject": "CSCE", "courseNum": 121, "sections": [],
+                 "honors": "exclude", "remote": "exclude", "asynchronous": "exclude"},
+            ],
+            "availabilities": [],
+        }
+
+        expected = {
+            'sections': {str(section.id): SectionSerializer(section).data
+                         for section in self.sections},
+            'schedules': [[1, 2], [1]],
+            'message': '',
+            'truncated': False,
+        }
+
+        # Act
+        result = self.client.post('/scheduler/generate?normalized=true', request_body,
+                                  format='json')
+        result = result.json()
+
+        # Assert
+        self.assertEqual(result, expected)
@@ -0,0 +1,146 @@
+import json
+import os
+import tempfile
+import unittest
+from django.core.management import call_command, CommandError
+import django.test
+from django.utils import timezone
+
+from scheduler.management.commands.benchmark_scheduler import (
+    percentile, compare_results,
+)
+from scheduler.management.commands.utils.benchmark_corpus import CORPUS
+from scheduler.management.commands.utils.synthetic_term import (
+    TermInUseError, TermOptions, generate_term, save_term,
+)
+from scraper.models import Section, Term
+
+class SyntheticTermTests(unittest.TestCase):
+    """ Tests for the synthetic term generator """
+
+    def test_generate_term_is_reproducible(self):
+        """ Tests that generate_term generates the same term from the same seed """
+        # Arrange
+        courses = [('CSCE', '121'), ('MATH', '151')]
+        options = TermOptions(sections_per_course=5, meetings_per_section=3, seed=4)
+
+        # Act
+        first = generate_term(201931, courses, options)
+        second = generate_term(201931, courses, options)
+
+        # Assert
+        self.assertEqual([(section.id, section.section_num, section.current_enrollment)
+                          for section in first[0]],
+                         [(section.id, section.section_num, section.current_enrollment)
+                          for section in second[0]])
+        self.assertEqual([(meeting.id, meeting.start_time, meeting.meeting_days)
+                          for meeting in first[1]],
+                         [(meeting.id, meeting.start_time, meeting.meeting_days)
+                          for meeting in second[1]])
+
+    def test_generate_term_uses_options(self):
+        """ Tests that generate_term makes the given number of sections and meetings,
+            and fills every section when fill_rate is 1
+        """
+        # Arrange
+        courses = [('CSCE', '121'), ('MATH', '151')]
+        options = TermOptions(sections_per_course=4, meetings_per_section=2,
+                              fill_rate=1)
+
+        # Act
+        sections, meetings = generate_term(201931, courses, options)
+
+        # Assert
+        self.assertEqual(len(sections), 8)
+        self.assertEqual(len(meetings), 16)
+        self.assertTrue(all(section.current_enrollment == section.max_enrollment
+                            for section in sections))
+        self.assertEqual(len(set(section.id for section in sections)), 8)
+
+class BenchmarkTests(django.test.TestCase):
+    """ Tests for the benchmark_scheduler command """
+
+    def test_percentile_uses_nearest_rank(self):
+        """ Tests that percentile picks the nearest ranked value """
+        # Arrange
+        values = [5, 1, 4, 2, 3]
+
+        # Act
+        result = (percentile(values, 0.5), percentile(values, 0.95),
+                  percentile(values, 0))
+
+        # Assert
+        self.assertEqual(result, (3, 5, 1))
+
+    def test_compare_results_warns_about_different_options(self):
+        """ Tests that compare_results shows each request's change, and warns when the
+            results were made with different options
+        """
+        # Arrange
+        request = {'p50_ms': 2, 'p95_ms': 4, 'candidates': 10}
+        baseline = {'options': {'repeat': 1}, 'requests': {'a': request}}
+        results = {'options': {'repeat': 2},
+                   'requests': {'a': dict(request, p50_ms=1), 'b': request}}
+
+        # Act
+        lines = compare_results(baseline, results)
+
+        # Assert
+        self.assertEqual(len(lines), 2)
+        self.assertIn('different options', lines[0])
+        self.assertIn('(-50.0%)', lines[1])
+
+    def test_benchmark_scheduler_saves_results(self):
+        """ Tests that benchmark_scheduler runs every request in the corpus, saves the
+            results, and deletes the synthetic term afterwards
+        """
+        # Arrange
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+
+            # Act
+            call_command('benchmark_scheduler', term=199931, sections=3, repeat=1,
+                         output=output)
+            with open(output, encoding='utf-8') as results:
+                results = json.load(results)
+
+        # Assert
+        self.assertEqual(set(results['requests']),
+                         set(request.name for request in CORPUS))
+        self.assertFalse(Section.objects.filter(term_code=199931).exists())
+        self.assertFalse(Term.objects.filter(code=199931).exists())
+
+    def test_save_term_replaces_generated_term(self):
+        """ Tests that save_term replaces a term that was generated before """
+        # Arrange
+        save_term(199931, *generate_term(199931, [('CSCE', '121')], TermOptions()))
+        sections, meetings = generate_term(199931, [('CSCE', '121')],
+                                           TermOptions(sections_per_course=3))
+
+        # Act
+        save_term(199931, sections, meetings)
+
+        # Assert
+        self.assertEqual(Section.objects.filter(term_code=199931).count(), 3)
+
+    def test_benchmark_scheduler_refuses_terms_with_real_data(self):
+        """ Tests that benchmark_scheduler doesn't replace or delete a term with
+            sections or a Term entry that it didn't generate
+        """
+        # Arrange
+        Section(id=1, crn=1, subject='CSCE', course_num='121', section_num='501',
+                term_code=199931, min_credits=3, honors=False, remote=False,
+                max_enrollment=50, asynchronous=False, current_enrollment=40).save()
+        Term(code=199921, last_updated=timezone.now()).save()
+
+        for term in (199931, 199921):
+            with self.subTest(term=term):
+                # Act + Assert
+                with self.assertRaises(CommandError):
+                    call_command('benchmark_scheduler', term=term, sections=3,
+                                 repeat=1)
+                with self.assertRaises(TermInUseError):
+                    save_term(term, [], [])
+
+        self.assertEqual(list(Section.objects.values_list('id', flat=True)), [1])
+        self.assertTrue(Term.objects.filter(code=199921).exists())
@@ -1,16 +1,33 @@
 """ Tests all of the models functions """
 
 from datetime import time
+from itertools import product
+from unittest.mock import patch
 import django.test
 
 from scheduler.create_schedules import (
-    _get_meetings, _schedule_valid, create_schedules, NoSchedulesError, _NO_COURSES,
+    _get_meetings, _schedule_valid, _build_compatibility, _search_schedules,
+    _best_schedules, create_schedules,
+    NoSchedulesError, _NO_COURSES, _NO_SCHEDULES_IN_TIME,
     _NO_SECTIONS_WITH_SEATS, _NO_SECTIONS_MATCH_AVAILABILITIES, _NO_SCHEDULES_POSSIBLE,
     _BASIC_FILTERS_TOO_RESTRICTIVE,
 )
-from scheduler.utils import CourseFilter, UnavailableTime, BasicFilter
+from scheduler.management.commands.utils.benchmark_corpus import CORPUS
+from scheduler.management.commands.utils.synthetic_term import (
+    TermOptions, generate_term, save_term,
+)
+from scheduler.scoring import ScheduleScorer
+from scheduler.section_cache import get_sections
+from scheduler.utils import (
+    CourseFilter, UnavailableTime, BasicFilter, SchedulePreferences, TimeBudget,
+    meetings_to_mask,
+)
 from scraper.models import Instructor, Meeting, Section
 
+def _get_sections(course: CourseFilter, term: str):
+    """ Gets all of the course's sections to pass to _get_meetings """
+    return get_sections([(course.subject, course.course_num)], term)[0]
+
 class SchedulingTests(django.test.TestCase): #pylint: disable=too-many-public-methods
     """ Tests for generate_schedules and its helper functions """
     @classmethod
@@ -68,15 +85,17 @@ class SchedulingTests(django.test.TestCase): #pylint: disable=too-many-public-me
             meetings_for_sections: dict mapping section_num to the meetings it
                                    should contain
         """
-        # Since I modify model data, I can't compare them directly so make sure
-        # each valid section id is in meetings, all sections in meetings are valid, and
-        # there are the correct number of them
-        for section, section_meetings in meetings.items():
+        # _get_meetings returns records rather than models, so compare them by id. Make
+        # sure each valid section id is in meetings, all sections in meetings are valid,
+        # and there are the correct number of them
+        for section, section_record in meetings.items():
             self.assertIn(section, valid_sections)
 
-            # Make sure the correct number of meetings are in each section
-            actual_section_meetings = meetings_for_sections[section]
-            self.assertEqual(set(section_meetings), set(actual_section_meetings),
+            # Make sure the correct meetings are in each section
+            section_meetings = set(meeting.id for meeting in section_record.meetings)
+            actual_section_meetings = set(meeting.id for meeting
+                                          in meetings_for_sections[section])
+            self.assertEqual(section_meetings, actual_section_meetings,
                              msg=f"Section {section}: found meetings {section_meetings}"
                                  f", expected {actual_section_meetings}")
 
@@ -114,7 +133,7 @@ class SchedulingTests(django.test.TestCase): #pylint: disable=too-many-public-me
         valid_sections = set((1, 2))
         meetings_for_sections = {1: meetings[0:2], 2: meetings[2:4]}
         # Act
-        meetings = _get_meetings(course, term, unavailable_times)
+        meetings = _get_meetings(course, _get_sections(course, term), unavailable_times)
 
         # Assert
         self.assert_meetings_match_expected(meetings, valid_sections,
@@ -145,7 +164,7 @@ class SchedulingTests(django.test.TestCase): #pylint: disable=too-many-public-me
         valid_sections = set((1,))
         meetings_for_sections = {1: meetings[0:2]}
         # Act
-        meetings = _get_meetings(course, term, unavailable_times)
+        meetings = _get_meetings(course, _get_sections(course, term), unavailable_times)
 
         # Assert
         self.assert_meetings_match_expected(meetings, valid_sections,
@@ -176,7 +195,7 @@ class SchedulingTests(django.test.TestCase): #pylint: disable=too-many-public-me
         valid_sections = set((1,))
         meetings_for_sections = {1: meetings[0:2]}
         # Act
-        meetings = _get_meetings(course, term, unavailable_times)
+        meetings = _get_meetings(course, _get_sections(course, term), unavailable_times)
 
         # Assert
         self.assert_meetings_match_expected(meetings, valid_sections,
@@ -208,7 +227,7 @@ class SchedulingTests(django.test.TestCase): #pylint: disable=too-many-public-me
         meetings_for_sections = {6: meetings[2:]}
 
         # Act
-        meetings = _get_meetings(course, term, unavailable_times)
+        meetings = _get_meetings(course, _get_sections(course, term), unavailable_times)
 
         # Assert
         self.assert_meetings_match_expected(meetings, valid_sections,
@@ -243,7 +262,7 @@ class SchedulingTests(django.test.TestCase): #pylint: disable=too-many-public-me
         meetings_for_sections = {5: meetings[0:2]}
 
         # Act
-        meetings = _get_meetings(course, term, unavailable_times)
+        meetings = _get_meetings(course, _get_sections(course, term), unavailable_times)
 
         # Assert
         self.assert_meetings_match_expected(meetings, valid_sections,
@@ -275,7 +294,7 @@ class SchedulingTests(django.test.TestCase): #pylint: disable=too-many-public-me
         meetings_for_sections = {5: meetings[2:]}
 
         # Act
-        meetings = _get_meetings(course, term, unavailable_times)
+        meetings = _get_meetings(course, _get_sections(course, term), unavailable_times)
 
         # Assert
         self.assert_meetings_match_expected(meetings, valid_sections,
@@ -313,7 +332,7 @@ class SchedulingTests(django.test.TestCase): #pylint: disable=too-many-public-me
         meetings_for_sections = {4: meetings[0:2], 5: meetings[2:4]}
 
         # Act
-        meetings = _get_meetings(course, term, unavailable_times)
+        meetings = _get_meetings(course, _get_sections(course, term), unavailable_times)
 
         # Assert
         self.assert_meetings_match_expected(meetings, valid_sections,
@@ -345,7 +364,7 @@ class SchedulingTests(django.test.TestCase): #pylint: disable=too-many-public-me
         meetings_for_sections = {4: meetings[0:2]}
 
         # Act
-        meetings = _get_meetings(course, term, unavailable_times)
+        meetings = _get_meetings(course, _get_sections(course, term), unavailable_times)
 
         # Assert
         self.assert_meetings_match_expected(meetings, valid_sections,
@@ -378,7 +397,8 @@ class SchedulingTests(django.test.TestCase): #pylint: disable=too-many-public-me
         meetings_for_sections = {7: meetings[2:]}
 
         # Act
-        result_meetings = _get_meetings(course, term, unavailable_times)
+        result_meetings = _get_meetings(course, _get_sections(course, term),
+                                        unavailable_times)
 
         # Assert
         self.assert_meetings_match_expected(result_meetings, valid_sections,
@@ -411,7 +431,8 @@ class SchedulingTests(django.test.TestCase): #pylint: disable=too-many-public-me
         meetings_for_sections = {4: meetings[:2]}
 
         # Act
-        result_meetings = _get_meetings(course, term, unavailable_times)
+        result_meetings = _get_meetings(course, _get_sections(course, term),
+                                        unavailable_times)
 
         # Assert
         self.assert_meetings_match_expected(result_meetings, valid_sections,
@@ -438,11 +459,12 @@ class SchedulingTests(django.test.TestCase): #pylint: disable=too-many-public-me
         for meeting in meetings:
             meeting.meeting_days = set(i for i, day in enumerate(meeting.meeting_days)
                                        if day)
-        meetings = ({"502": meetings[0:2]}, {"502": meetings[2:]})
-        schedule = ("502", "502")
+        compatibility = _build_compatibility(((meetings_to_mask(meetings[0:2]),),
+                                              (meetings_to_mask(meetings[2:]),)))
+        schedule = (0, 0)
 
         # Act
-        valid = _schedule_valid(meetings, schedule)
+        valid = _schedule_valid(compatibility, schedule)
 
         # Assert
         self.assertTrue(valid)
@@ -468,15 +490,243 @@ class SchedulingTests(django.test.TestCase): #pylint: disable=too-many-public-me
         for meeting in meetings:
             meeting.meeting_days = set(i for i, day in enumerate(meeting.meeting_days)
                                        if day)
-        meetings = ({"501": meetings[0:2]}, {"501": meetings[2:]})
-        schedule = ("501", "501")
+        compatibility = _build_compatibility(((meetings_to_mask(meetings[0:2]),),
+                                              (meetings_to_mask(meetings[2:]),)))
+        schedule = (0, 0)
 
         # Act
-        valid = _schedule_valid(meetings, schedule)
+        valid = _schedule_valid(compatibility, schedule)
 
         # Assert
         self.assertFalse(valid)
 
+    def test__build_compatibility_is_symmetric(self):
+        """ Tests that _build_compatibility marks the same pairs of sections compatible
+            from both courses' point of view
+        """
+        # Arrange
+        first_course = (
+            meetings_to_mask([UnavailableTime(time(9), time(9, 50), 0)]),
+            meetings_to_mask([UnavailableTime(time(11), time(11, 50), 0)]),
+        )
+        second_course = (
+            meetings_to_mask([UnavailableTime(time(9, 30), time(10, 20), 0)]),
+            meetings_to_mask([UnavailableTime(time(9), time(9, 50), 1)]),
+            meetings_to_mask([UnavailableTime(time(11, 30), time(12, 20), 0)]),
+        )
+
+        # Act
+        compatibility = _build_compatibility((first_course, second_course))
+
+        # Assert
+        self.assertEqual([section[1] for section in compatibility[0]], [0b110, 0b011])
+        self.assertEqual([section[0] for section in compatibility[1]], [0b10, 0b11, 0b01])
+
+    def test__search_schedules_finds_all_valid_schedules(self):
+        """ Tests that _search_schedules yields every valid schedule exactly once """
+        # Arrange
+        # Each course has a section at every hour from 8 to 11 on one of the given days,
+        # so many but not all combinations are valid
+        masks = tuple(
+            tuple(meetings_to_mask([UnavailableTime(time(hour), time(hour, 50), day)])
+                  for hour in range(8, 12) for day in days)
+            for days in ((0,), (0, 1), (1,), (0,))
+        )
+        compatibility = _build_compatibility(masks)
+        expected = set(schedule for schedule in product(*(range(len(m)) for m in masks))
+                       if _schedule_valid(compatibility, schedule))
+
+        # Act
+        schedules = list(_search_schedules(compatibility, TimeBudget()))
+
+        # Assert
+        self.assertEqual(len(schedules), len(set(schedules)))
+        self.assertEqual(set(schedules), expected)
+
+    def test__search_schedules_handles_no_valid_schedules(self):
+        """ Tests that _search_schedules stops without yielding anything if all of the
+            sections of two courses conflict
+        """
+        # Arrange
+        all_day = meetings_to_mask([UnavailableTime(time(0), time(23, 59), 0)])
+        compatibility = _build_compatibility(((all_day, all_day), (all_day,)))
+
+        # Act
+        schedules = list(_search_schedules(compatibility, TimeBudget()))
+
+        # Assert
+        self.assertEqual(schedules, [])
+
+    def test__best_schedules_finds_lowest_cost_schedules(self):
+        """ Tests that _best_schedules returns the valid schedules with the lowest costs,
+            from lowest to highest
+        """
+        # Arrange
+        masks = tuple(
+            tuple(meetings_to_mask([UnavailableTime(time(hour), time(hour, 50), day)])
+                  for hour in range(8, 12) for day in days)
+            for days in ((0,), (0, 1), (1,), (0,))
+        )
+        gpa_costs = tuple(tuple((i + a) % 3 / 2 for a in range(len(course_masks)))
+                          for i, course_masks in enumerate(masks))
+        preferences = SchedulePreferences(gaps=1, early_start=0.5, days=2, gpa=1)
+        scorer = ScheduleScorer(preferences, masks, gpa_costs)
+        compatibility = _build_compatibility(masks)
+        valid = [schedule for schedule in product(*(range(len(m)) for m in masks))
+                 if _schedule_valid(compatibility, schedule)]
+        expected_costs = sorted(scorer.cost(schedule) for schedule in valid)[:5]
+
+        # Act
+        schedules = _best_schedules(compatibility, scorer, 5, TimeBudget())
+
+        # Assert
+        self.assertTrue(all(_schedule_valid(compatibility, schedule)
+                            for schedule in schedules))
+        self.assertEqual([scorer.cost(schedule) for schedule in schedules],
+                         expected_costs)
+
+    def test__best_schedules_returns_best_found_when_budget_expires(self):
+        """ Tests that _best_schedules stops searching once its budget expires, and
+            returns the schedules it found before then
+        """
+        # Arrange
+        masks = tuple(
+            tuple(meetings_to_mask([UnavailableTime(time(hour), time(hour, 50), 0)])
+                  for hour in range(8, 12))
+            for _ in range(3)
+        )
+        scorer = ScheduleScorer(SchedulePreferences(early_start=1), masks,
+                                tuple((0,) * len(course_masks) for course_masks in masks))
+        compatibility = _build_compatibility(masks)
+        budget = TimeBudget()
+        # Expire the budget once two schedules have been scored
+        scored = []
+        cost = scorer.cost
+        def cost_then_expire(schedule):
+            scored.append(schedule)
+            budget.truncated = len(scored) >= 2
+            return cost(schedule)
+        scorer.cost = cost_then_expire
+
+        # Act
+        schedules = _best_schedules(compatibility, scorer, 5, budget)
+
+        # Assert
+        self.assertTrue(budget.truncated)
+        self.assertEqual(set(schedules), set(scored))
+        self.assertEqual(len(schedules), 2)
+
+    def test_create_schedules_throws_when_budget_expires_first(self):
+        """ Tests that create_schedules says the search ran out of time instead of that
+            no schedules are possible when its budget expires before finding any
+        """
+        # Arrange
+        courses = (CourseFilter("CSCE", "310", include_full=True),)
+        Meeting(id=10, meeting_days=[True] * 7, start_time=time(11, 30),
+                end_time=time(12, 20), meeting_type='LEC',
+                section=self.sections[0]).save()
+        budget = TimeBudget(0)
+
+        # Act + Assert
+        with self.assertRaisesMessage(NoSchedulesError, _NO_SCHEDULES_IN_TIME):
+            create_schedules(courses, "201931", [], budget=budget)
+        self.assertTrue(budget.truncated)
+
+    def test_create_schedules_ranks_schedules_by_preferences(self):
+        """ Tests that create_schedules returns the best schedules in order when given
+            preferences
+        """
+        # Arrange
+        courses = (
+            CourseFilter("CSCE", "310", include_full=True),
+            CourseFilter("CSCE", "121",
+                         honors=BasicFilter.NO_PREFERENCE,
+                         remote=BasicFilter.NO_PREFERENCE, include_full=True)
+        )
+        term = "201931"
+        meetings = [
+            # Meetings for CSCE 310-501
+            Meeting(id=10, meeting_days=[True] * 7, start_time=time(8),
+                    end_time=time(8, 50), meeting_type='LEC', section=self.sections[0]),
+            # Meetings for CSCE 310-502
+            Meeting(id=20, meeting_days=[True] * 7, start_time=time(13),
+                    end_time=time(13, 50), meeting_type='LEC', section=self.sections[1]),
+            # Meetings for CSCE 121-501
+            Meeting(id=40, meeting_days=[True] * 7, start_time=time(9),
+                    end_time=time(9, 50), meeting_type='LEC', section=self.sections[3]),
+            # Meetings for CSCE 121-502
+            Meeting(id=50, meeting_days=[True] * 7, start_time=time(14),
+                    end_time=time(14, 50), meeting_type='LEC', section=self.sections[4]),
+        ]
+        Meeting.objects.bulk_create(meetings)
+        preferences = SchedulePreferences(early_start=1)
+
+        # Act
+        schedules = create_schedules(courses, term, [], num_schedules=2,
+                                     preferences=preferences)
+
+        # Assert
+        self.assertEqual(schedules, [(2, 5), (2, 4)])
+
+    def test_create_schedules_ranks_by_gaps_within_budget(self):
+        """ Tests that ranking by gaps finishes searching a realistic term before its
+            budget expires, rather than having to try every schedule
+        """
+        # Arrange
+        request = next(request for request in CORPUS if request.name == 'heavy_load')
+        courses = sorted(set((course.subject, course.course_num)
+                             for course in request.courses))
+        # Every section has seats, like at the start of registration
+        save_term(199931, *generate_term(199931, courses, TermOptions(fill_rate=0)))
+        budget = TimeBudget(2)
+
+        # Act
+        schedules = create_schedules(request.courses, "199931", [], num_schedules=5,
+                                     preferences=SchedulePreferences(gaps=1),
+                                     budget=budget)
+
+        # Assert
+        self.assertFalse(budget.truncated)
+        self.assertEqual(len(schedules), 5)
+
+    @patch('scheduler.create_schedules._MAX_RANDOM_CANDIDATES', 1)
+    def test_create_schedules_searches_when_sampling_finds_too_few(self):
+        """ Tests that create_schedules still finds all valid schedules when random
+            sampling runs out of candidates before finding them
+        """
+        # Arrange
+        courses = (
+            CourseFilter("CSCE", "310", include_full=True),
+            CourseFilter("CSCE", "121",
+                         honors=BasicFilter.NO_PREFERENCE,
+                         remote=BasicFilter.NO_PREFERENCE, include_full=True)
+        )
+        term = "201931"
+        unavailable_times = []
+        meetings = [
+            # Meetings for CSCE 310-501
+            Meeting(id=10, meeting_days=[True] * 7, start_time=time(11, 30),
+                    end_time=time(12, 20), meeting_type='LEC', section=self.sections[0]),
+            # Meetings for CSCE 310-502
+            Meeting(id=20, meeting_days=[True] * 7, start_time=time(8),
+                    end_time=time(8, 50), meeting_type='LAB', section=self.sections[1]),
+            # Meetings for CSCE 121-501
+            Meeting(id=40, meeting_days=[True] * 7, start_time=time(11, 30),
+                    end_time=time(12, 20), meeting_type='LEC', section=self.sections[3]),
+            # Meetings for CSCE 121-502
+            Meeting(id=50, meeting_days=[True] * 7, start_time=time(8),
+                    end_time=time(8, 50), meeting_type='LEC', section=self.sections[4]),
+        ]
+        Meeting.objects.bulk_create(meetings)
+        expected_schedules = set(((1, 5), (2, 4)))
+
+        # Act
+        schedules = create_schedules(courses, term, unavailable_times, num_schedules=10)
+
+        # Assert
+        self.assertEqual(len(schedules), len(expected_schedules))
+        self.assertEqual(set(schedules), expected_schedules)
+
     def test_create_schedules_creates_all_valid_schedules(self):
         """ Tests that create_schedules makes all valid schedules and doesn't
             return any invalid ones
@@ -524,6 +774,33 @@ class SchedulingTests(django.test.TestCase): #pylint: disable=too-many-public-me
         self.assertEqual(schedules, expected_schedules)
 
 
+    def test_create_schedules_fetches_all_courses_together(self):
+        """ Tests that create_schedules fetches the sections of all of its courses in a
+            constant number of queries
+        """
+        # Arrange
+        courses = (
+            CourseFilter("CSCE", "310", include_full=True),
+            CourseFilter("CSCE", "121", include_full=True),
+            CourseFilter("CSCE", "221", include_full=True),
+        )
+        term = "201931"
+        meetings = [
+            Meeting(id=10, meeting_days=[True] * 7, start_time=time(8),
+                    end_time=time(8, 50), meeting_type='LEC', section=self.sections[0]),
+            Meeting(id=40, meeting_days=[True] * 7, start_time=time(9),
+                    end_time=time(9, 50), meeting_type='LEC', section=self.sections[3]),
+            Meeting(id=80, meeting_days=[True] * 7, start_time=time(10),
+                    end_time=time(10, 50), meeting_type='LEC', section=self.sections[7]),
+        ]
+        Meeting.objects.bulk_create(meetings)
+
+        # Act + Assert
+        # One query each for the term, sections, and meetings
+        with self.assertNumQueries(3):
+            schedules = create_schedules(courses, term, [])
+        self.assertEqual(schedules, [(1, 4, 8)])
+
     def test_create_schedules_uses_unavailable_times(self):
         """ Tests that create_schedule filters out the provided unavailable_times. """
         # There are 4 possible schedules to generate, 1 is valid given the
@@ -686,7 +963,7 @@ class SchedulingTests(django.test.TestCase): #pylint: disable=too-many-public-me
         meetings_for_sections = {5: meetings[0:]}
 
         # Act
-        meetings = _get_meetings(course, term, unavailable_times)
+        meetings = _get_meetings(course, _get_sections(course, term), unavailable_times)
 
         # Assert
         self.assert_meetings_match_expected(meetings, valid_sections,
@@ -0,0 +1,142 @@
+from datetime import time
+import unittest
+from unittest.mock import Mock
+import django.test
+
+from scheduler.scoring import (
+    _day_costs, _popcount, get_instructor_gpas, get_gpa_costs, ScheduleScorer,
+)
+from scheduler.section_cache import MeetingRecord
+from scheduler.utils import SchedulePreferences, meetings_to_mask
+from scraper.models import Grades, GradeSummary, Instructor, Section
+
+def _mask(*meetings) -> int:
+    """ Creates a bitmask of meetings given as (start, end, days) tuples """
+    return meetings_to_mask(MeetingRecord(0, start, end, frozenset(days))
+                            for start, end, days in meetings)
+
+class ScoringTests(unittest.TestCase):
+    """ Tests for the cost calculations in scheduler.scoring """
+
+    def test__day_costs_measures_each_day(self):
+        """ Tests that _day_costs counts days, early minutes, and gaps on each day """
+        # Arrange
+        mask = _mask(
+            (time(8), time(8, 50), (0, 2)), # 4 hours before noon each day
+            (time(10), time(10, 50), (0,)), # 69 minute gap on Monday
+            (time(13), time(13, 50), (4,)), # Not early
+        )
+
+        # Act
+        days, early_minutes, idle = _day_costs(mask)
+
+        # Assert
+        self.assertEqual((days, early_minutes), (3, 2 * 4 * 60))
+        self.assertEqual(_popcount(idle), 69)
+        self.assertFalse(idle & mask)
+
+    def test_get_gpa_costs_uses_course_average_for_unknown_instructors(self):
+        """ Tests that get_gpa_costs measures GPAs from a 4.0, and that sections
+            without any grades cost the average of the ones with them
+        """
+        # Arrange
+        sections = [Mock(instructor_id=instructor, honors=False)
+                    for instructor in ('A', 'B', 'C')]
+        gpas = {('CSCE', '121', 'A', False): 3.5, ('CSCE', '121', 'B', False): 2.5}
+
+        # Act
+        result = get_gpa_costs(('CSCE', 121), sections, gpas)
+
+        # Assert
+        self.assertEqual(result, (0.5, 1.5, 1.0))
+
+    def test_schedule_scorer_lower_bound_doesnt_exceed_cost(self):
+        """ Tests that the lower bound of a partial schedule is at most the cost of a
+            schedule containing it, even when the rest of the schedule removes gaps
+        """
+        # Arrange
+        masks = (
+            (_mask((time(8), time(8, 50), (0,))),),
+            (_mask((time(11), time(11, 50), (0,))),),
+            (_mask((time(9), time(10, 50), (0,))), _mask((time(15), time(15, 50), (1,)))),
+        )
+        gpa_costs = ((0.5,), (1.0,), (2.0, 0.25))
+        scorer = ScheduleScorer(SchedulePreferences(gaps=1, early_start=1, days=1, gpa=1),
+                                masks, gpa_costs)
+
+        # Act
+        bounds = [scorer.lower_bound((0, 0, None)),
+                  scorer.lower_bound((0, 0, None), (0b1, 0b1, 0b11))]
+        costs = [scorer.cost((0, 0, 0)), scorer.cost((0, 0, 1))]
+
+        # Assert
+        self.assertTrue(all(bound <= cost for bound in bounds for cost in costs))
+
+    def test_schedule_scorer_lower_bound_counts_gaps_that_cant_be_filled(self):
+        """ Tests that lower_bound counts the minutes of a partial schedule's gaps that
+            no section left in the unchosen courses' domains could fill
+        """
+        # Arrange
+        masks = (
+            (_mask((time(8), time(8, 50), (0,))),),
+            (_mask((time(11), time(11, 50), (0,))),),
+            (_mask((time(9), time(10, 50), (0,))), _mask((time(15), time(15, 50), (1,)))),
+        )
+        gpa_costs = ((0,), (0,), (0, 0))
+        scorer = ScheduleScorer(SchedulePreferences(gaps=1), masks, gpa_costs)
+
+        # Act
+        # The gap from 8:50 to 11:00 is 129 minutes, and 111 of them are in section 0
+        both = scorer.lower_bound((0, 0, None), (0b1, 0b1, 0b11))
+        only_tuesday = scorer.lower_bound((0, 0, None), (0b1, 0b1, 0b10))
+
+        # Assert
+        self.assertAlmostEqual(both, 18 / 60)
+        self.assertAlmostEqual(both, scorer.cost((0, 0, 0)))
+        self.assertAlmostEqual(only_tuesday, 129 / 60)
+
+class InstructorGpaTests(django.test.TestCase):
+    """ Tests for get_instructor_gpas """
+
+    def test_get_instructor_gpas_averages_each_instructor(self):
+        """ Tests that get_instructor_gpas averages the GPAs of each instructor's
+            honors and non-honors sections separately, across all terms
+        """
+        # Arrange
+        instructors = [Instructor(id="First"), Instructor(id="Second")]
+        Instructor.objects.bulk_create(instructors)
+        sections = [
+            Section(id=1, subject='CSCE', course_num='121', instructor=instructors[0],
+                    term_code=201931, section_num='501', min_credits=3, honors=False,
+                    asynchronous=False, current_enrollment=0, max_enrollment=10),
+            Section(id=2, subject='CSCE', course_num='121', instructor=instructors[0],
+                    term_code=201831, section_num='501', min_credits=3, honors=False,
+                    asynchronous=False, current_enrollment=0, max_enrollment=10),
+            Section(id=3, subject='CSCE', course_num='121', instructor=instructors[0],
+                    term_code=201931, section_num='201', min_credits=3, honors=True,
+                    asynchronous=False, current_enrollment=0, max_enrollment=10),
+            Section(id=4, subject='CSCE', course_num='121', instructor=instructors[1],
+                    term_code=201931, section_num='502', min_credits=3, honors=False,
+                    asynchronous=False, current_enrollment=0, max_enrollment=10),
+            Section(id=5, subject='CSCE', course_num='221', instructor=instructors[1],
+                    term_code=201931, section_num='501', min_credits=3, honors=False,
+                    asynchronous=False, current_enrollment=0, max_enrollment=10),
+        ]
+        Section.objects.bulk_create(sections)
+        Grades.objects.bulk_create(
+            Grades(section=section, gpa=gpa, A=0, B=0, C=0, D=0, F=0, I=0, S=0, U=0, Q=0,
+                   X=0)
+            for section, gpa in zip(sections, (4.0, 3.0, 2.0, 2.5, 1.0))
+        )
+        GradeSummary.objects.refresh()
+        expected = {
+            ('CSCE', '121', 'First', False): 3.5,
+            ('CSCE', '121', 'First', True): 2.0,
+            ('CSCE', '121', 'Second', False): 2.5,
+        }
+
+        # Act
+        result = get_instructor_gpas([('CSCE', '121')])
+
+        # Assert
+        self.assertEqual(result, expected)
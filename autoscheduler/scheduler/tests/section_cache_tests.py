@@ -0,0 +1,136 @@
+from datetime import time, timedelta
+import django.test
+from django.utils import timezone
+
+from scheduler.section_cache import get_sections, clear_cache, _SECTIONS_CACHE
+from scheduler.utils import meetings_to_mask
+from scraper.models import Meeting, Section, Term
+
+def _create_section(section_id: int, section_num: str) -> Section:
+    """ Creates and saves a CSCE 121 section for 201931 with the given id and number """
+    section = Section(id=section_id, crn=section_id, subject='CSCE', course_num='121',
+                      section_num=section_num, term_code=201931, min_credits=3,
+                      honors=False, remote=False, max_enrollment=50, asynchronous=False,
+                      current_enrollment=40)
+    section.save()
+    return section
+
+class SectionCacheTests(django.test.TestCase):
+    """ Tests for the scheduler's section cache """
+
+    def setUp(self):
+        clear_cache()
+
+    def test_get_sections_converts_sections(self):
+        """ Tests that get_sections converts sections and their meetings into
+            records, and computes the bitmask of each section's meetings
+        """
+        # Arrange
+        section = _create_section(1, '501')
+        Meeting(id=10, meeting_days=[True, False, True, False, True, False, False],
+                start_time=time(9), end_time=time(9, 50), meeting_type='LEC',
+                section=section).save()
+        Meeting(id=11, meeting_days=[False, True] + [False] * 5, start_time=time(11),
+                end_time=time(12, 15), meeting_type='LAB', section=section).save()
+
+        # Act
+        (record,), = get_sections([('CSCE', '121')], '201931')
+
+        # Assert
+        self.assertEqual(record.id, 1)
+        self.assertEqual(record.section_num, '501')
+        self.assertEqual(set((meeting.id, meeting.meeting_days)
+                             for meeting in record.meetings),
+                         set(((10, frozenset((0, 2, 4))), (11, frozenset((1,))))))
+        self.assertEqual(record.mask, meetings_to_mask(record.meetings))
+
+    def test_get_sections_caches_until_term_is_updated(self):
+        """ Tests that get_sections doesn't query for sections again until the
+            term's last_updated changes
+        """
+        # Arrange
+        term = Term(code=201931, last_updated=timezone.now())
+        term.save()
+        _create_section(1, '501')
+        get_sections([('CSCE', '121')], '201931')
+        _create_section(2, '502')
+
+        # Act
+        cached = get_sections([('CSCE', '121')], '201931')[0]
+        term.last_updated += timedelta(hours=1)
+        term.save()
+        updated = get_sections([('CSCE', '121')], '201931')[0]
+
+        # Assert
+        self.assertEqual([section.id for section in cached], [1])
+        self.assertEqual([section.id for section in updated], [1, 2])
+
+    def test_get_sections_reloads_refreshed_enrollment(self):
+        """ Tests that get_sections loads sections again once the term's enrollment
+            has been refreshed
+        """
+        # Arrange
+        term = Term(code=201931, last_updated=timezone.now())
+        term.save()
+        _create_section(1, '501')
+        get_sections([('CSCE', '121')], '201931')
+        Section.objects.filter(id=1).update(current_enrollment=50)
+
+        # Act
+        cached = get_sections([('CSCE', '121')], '201931')[0]
+        term.enrollment_updated = term.last_updated + timedelta(minutes=5)
+        term.save()
+        updated = get_sections([('CSCE', '121')], '201931')[0]
+
+        # Assert
+        self.assertEqual(cached[0].current_enrollment, 40)
+        self.assertEqual(updated[0].current_enrollment, 50)
+
+    def test_get_sections_loads_each_course(self):
+        """ Tests that get_sections returns the sections of each course in order, and
+            handles courses without any sections
+        """
+        # Arrange
+        _create_section(1, '501')
+        Section(id=2, crn=2, subject='MATH', course_num='151', section_num='501',
+                term_code=201931, min_credits=4, honors=False, remote=False,
+                max_enrollment=50, asynchronous=False, current_enrollment=40).save()
+        courses = [('MATH', '151'), ('CSCE', '999'), ('CSCE', 121)]
+
+        # Act
+        sections = get_sections(courses, '201931')
+
+        # Assert
+        self.assertEqual([[section.id for section in course] for course in sections],
+                         [[2], [], [1]])
+
+    def test_get_sections_doesnt_cache_courses_without_sections(self):
+        """ Tests that get_sections doesn't cache courses that don't have any
+            sections, so requests for nonexistent courses can't grow the cache
+        """
+        # Arrange
+        Term(code=201931, last_updated=timezone.now()).save()
+        _create_section(1, '501')
+
+        # Act
+        sections = get_sections([('CSCE', '121'), ('CSCE', '999')], '201931')
+
+        # Assert
+        self.assertEqual([[section.id for section in course] for course in sections],
+                         [[1], []])
+        self.assertEqual(list(_SECTIONS_CACHE.get('201931')), [('CSCE', '121')])
+
+    def test_get_sections_doesnt_cache_unscraped_terms(self):
+        """ Tests that get_sections always queries for sections of terms without
+            a Term entry
+        """
+        # Arrange
+        _create_section(1, '501')
+        get_sections([('CSCE', '121')], '201931')
+        _create_section(2, '502')
+
+        # Act
+        sections = get_sections([('CSCE', '121')], '201931')[0]
+
+        # Assert
+        self.assertEqual([section.id for section in sections], [1, 2])
@@ -1,7 +1,11 @@
+from datetime import time
 from itertools import product
 import unittest
+from unittest.mock import patch
 
-from scheduler.utils import random_product
+from scheduler.utils import (
+    random_product, _random_permutation, meetings_to_mask, UnavailableTime, TimeBudget,
+)
 
 class RandomProductTests(unittest.TestCase):
     """ Tests for the random_product helper function """
@@ -65,3 +69,121 @@ class RandomProductTests(unittest.TestCase):
 
         # Assert
         self.assertFalse(random_product_set)
+
+    def test_random_product_handles_huge_number_of_products(self):
+        """ Tests that random_product works when there are more possible products than
+            fit in a machine-sized integer
+        """
+        # Arrange
+        arrs = [list(range(10)) for _ in range(30)]
+        num_products = 100
+
+        # Act
+        random_product_set = set(random_product(*arrs, limit=num_products))
+
+        # Assert
+        self.assertEqual(len(random_product_set), num_products)
+
+    def test_random_permutation_yields_each_number_once(self):
+        """ Tests that _random_permutation yields every number in the range exactly once,
+            including for sizes that aren't a power of 4
+        """
+        for size in (1, 2, 3, 4, 5, 17, 1000):
+            # Act
+            permutation = list(_random_permutation(size))
+
+            # Assert
+            self.assertEqual(sorted(permutation), list(range(size)))
+
+class MeetingsToMaskTests(unittest.TestCase):
+    """ Tests for the meetings_to_mask helper function """
+    def test_meetings_to_mask_detects_overlap(self):
+        """ Tests that masks of overlapping meetings on the same day share bits """
+        # Arrange
+        first = [UnavailableTime(time(9), time(9, 50), 0)]
+        second = [UnavailableTime(time(9, 30), time(10, 20), 0)]
+
+        # Act
+        overlap = meetings_to_mask(first) & meetings_to_mask(second)
+
+        # Assert
+        self.assertTrue(overlap)
+
+    def test_meetings_to_mask_includes_end_minute(self):
+        """ Tests that a meeting starting the minute another ends conflicts with it """
+        # Arrange
+        first = [UnavailableTime(time(9), time(9, 50), 2)]
+        second = [UnavailableTime(time(9, 50), time(10, 40), 2)]
+
+        # Act
+        overlap = meetings_to_mask(first) & meetings_to_mask(second)
+
+        # Assert
+        self.assertTrue(overlap)
+
+    def test_meetings_to_mask_separates_adjacent_meetings(self):
+        """ Tests that meetings ending a minute before another starts don't conflict """
+        # Arrange
+        first = [UnavailableTime(time(9), time(9, 49), 2)]
+        second = [UnavailableTime(time(9, 50), time(10, 40), 2)]
+
+        # Act
+        overlap = meetings_to_mask(first) & meetings_to_mask(second)
+
+        # Assert
+        self.assertFalse(overlap)
+
+    def test_meetings_to_mask_separates_days(self):
+        """ Tests that meetings at the same time on different days don't conflict """
+        # Arrange
+        first = [UnavailableTime(time(0), time(23, 59), 0)]
+        second = [UnavailableTime(time(0), time(23, 59), 1)]
+
+        # Act
+        overlap = meetings_to_mask(first) & meetings_to_mask(second)
+
+        # Assert
+        self.assertFalse(overlap)
+
+    def test_meetings_to_mask_ignores_meetings_without_times(self):
+        """ Tests that meetings without a start or end time don't take up any time """
+        # Arrange
+        meetings = [UnavailableTime(None, time(10), 0), UnavailableTime(time(9), None, 0)]
+
+        # Act
+        mask = meetings_to_mask(meetings)
+
+        # Assert
+        self.assertEqual(mask, 0)
+
+class TimeBudgetTests(unittest.TestCase):
+    """ Tests for TimeBudget """
+
+    @patch('scheduler.utils.monotonic')
+    def test_time_budget_expires_after_its_seconds(self, monotonic_mock):
+        """ Tests that a TimeBudget expires once its seconds have passed, and stays
+            expired
+        """
+        # Arrange
+        monotonic_mock.return_value = 100
+        budget = TimeBudget(2)
+
+        # Act
+        times = [101, 102, 101]
+        expired = []
+        for now in times:
+            monotonic_mock.return_value = now
+            expired.append(budget.expired())
+
+        # Assert
+        self.assertEqual(expired, [False, True, True])
+        self.assertTrue(budget.truncated)
+
+    def test_time_budget_without_seconds_never_expires(self):
+        """ Tests that a TimeBudget without a limit never expires """
+        # Act
+        budget = TimeBudget()
+
+        # Assert
+        self.assertFalse(budget.expired())
+        self.assertFalse(budget.truncated)
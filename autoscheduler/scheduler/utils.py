@@ -1,10 +1,38 @@
 from datetime import time
 from functools import reduce
+from itertools import islice
 from operator import mul
 import random
-from typing import Any, Iterable, List, NamedTuple, Tuple
+from time import monotonic
+from typing import Any, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 import enum
 
+# Number of rounds used by _random_permutation's Feistel network
+_FEISTEL_ROUNDS = 4
+
+# Number of bits each day takes up in a meeting bitmask, one for every minute of the day
+MINUTES_PER_DAY = 24 * 60
+
+def _random_permutation(size: int) -> Iterator[int]:
+    """ Lazily yields every number in range(size) exactly once in a random order,
+        without storing them.
+
+        Numbers are shuffled with a Feistel network keyed with random round keys, which
+        is a permutation of the smallest power of 4 that's at least size. Outputs that
+        are too big are skipped, which takes at most 4 tries per number yielded.
+    """
+    half_bits = max(1, ((size - 1).bit_length() + 1) // 2)
+    half_mask = (1 << half_bits) - 1
+    keys = [random.getrandbits(64) for _ in range(_FEISTEL_ROUNDS)]
+
+    for i in range(1 << (2 * half_bits)):
+        left, right = i >> half_bits, i & half_mask
+        for key in keys:
+            left, right = right, left ^ (hash((key, right)) & half_mask)
+        value = (left << half_bits) | right
+        if value < size:
+            yield value
+
 def random_product(*iterables: Iterable[Iterable], limit=100_000) -> Tuple[Any]:
     """ Generates up to limit (or all possible) random unique cartesian products of
         *iterables. Iterables must be indexable, otherwise it is impossible to
@@ -25,8 +53,9 @@ def random_product(*iterables: Iterable[Iterable], limit=100_000) -> Tuple[Any]:
         yield from ()
         return
 
-    # Randomly sample from possible products
-    products = random.sample(range(num_products), min(num_products, limit))
+    # Randomly sample from possible products. These are generated lazily, since we
+    # usually stop well before the limit
+    products = islice(_random_permutation(num_products), limit)
     # Numbers to divide product by in order to find correct item in each iterable
     divs = []
     for length in lengths:
@@ -38,6 +67,41 @@ def random_product(*iterables: Iterable[Iterable], limit=100_000) -> Tuple[Any]:
         yield tuple(iterable[(product // div) % len(iterable)]
                     for div, iterable in zip(divs, iterables))
 
+def _minute_of_day(time_obj: time) -> int:
+    """ Converts a datetime.time object to the number of minutes since midnight """
+    return time_obj.hour * 60 + time_obj.minute
+
+def meetings_to_mask(meetings: Iterable[Any]) -> int:
+    """ Compiles meetings into a bitmask of the minutes of the week they take up, so
+        checking if two sections conflict is a single AND. Bit day * MINUTES_PER_DAY + m
+        is set if any meeting takes place during minute m of day (0 is Monday).
+
+        Meetings include both their start and end minute, so meetings that end the same
+        minute another starts conflict. Meetings without a start or end time don't take
+        up any time.
+
+    Args:
+        meetings: Iterable of objects with start_time, end_time, and meeting_days
+                  attributes, where meeting_days is a collection of day numbers.
+                  Meeting models must have meeting_days converted to this format first
+
+    Returns:
+        The bitmask as an int
+    """
+    mask = 0
+    for meeting in meetings:
+        if meeting.start_time is None or meeting.end_time is None:
+            continue
+        start = _minute_of_day(meeting.start_time)
+        end = _minute_of_day(meeting.end_time)
+        if end < start: # Malformed, so treat it like it doesn't have a time
+            continue
+        # Bits for the meeting's time on a single day, shifted into place for each day
+        day_mask = ((1 << (end - start + 1)) - 1) << start
+        for day in meeting.meeting_days:
+            mask |= day_mask << (day * MINUTES_PER_DAY)
+    return mask
+
 class UnavailableTime:
     """ Class giving availability blocks an interface compatible with meeting objects
 
@@ -85,3 +149,51 @@ class CourseFilter(NamedTuple):
     asynchronous: BasicFilter = BasicFilter.NO_PREFERENCE
     include_full: bool = False
     section_nums: List[str] = []
+
+class SchedulePreferences(NamedTuple):
+    """ Contains how much the user cares about each aspect of a schedule, which is used
+        to rank schedules instead of returning random ones. Each field is the weight of
+        its aspect's cost, and a weight of 0 ignores that aspect. Weights can't be
+        negative, since ScheduleScorer.lower_bound relies on costs only growing as
+        sections are added
+
+    Fields:
+        gaps: Cost of each hour spent between classes on the same day
+        early_start: Cost of each hour that each day's first class starts before noon
+        days: Cost of each day with any classes
+        gpa: Cost of each grade point that each section's instructor's average GPA
+             in the course is below 4.0
+    """
+    gaps: float = 0
+    early_start: float = 0
+    days: float = 0
+    gpa: float = 0
+
+class TimeBudget:
+    """ Limits how long schedule generation can take. Searches check expired() as they
+        go, and stop early with the schedules they've found so far once it's true.
+        Searches also record each candidate they check, which is used for benchmarking
+
+    Parameters:
+        seconds: How long from now the budget lasts, or None for no limit
+    """
+    def __init__(self, seconds: Optional[float] = None):
+        self.deadline = None if seconds is None else monotonic() + seconds
+        # Whether the budget ran out, so a search may have stopped before finishing
+        self.truncated = False
+        # Number of schedules or partial schedules checked, and how many were invalid
+        self.candidates = 0
+        self.rejected = 0
+
+    def record(self, valid: bool) -> bool:
+        """ Records that a candidate was checked, and returns whether it was valid """
+        self.candidates += 1
+        if not valid:
+            self.rejected += 1
+        return valid
+
+    def expired(self) -> bool:
+        """ Returns whether the budget has run out """
+        if not self.truncated and self.deadline is not None:
+            self.truncated = monotonic() >= self.deadline
+        return self.truncated
@@ -1,13 +1,26 @@
-from typing import List, Tuple
+import math
+from typing import Dict, List, Tuple
 from rest_framework.views import APIView
 from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 
 from scheduler.create_schedules import create_schedules, NoSchedulesError
-from scheduler.utils import UnavailableTime, CourseFilter, BasicFilter
+from scheduler.utils import (
+    UnavailableTime, CourseFilter, BasicFilter, SchedulePreferences, TimeBudget,
+)
 from scraper.management.commands.scrape_courses import convert_meeting_time
-from scraper.serializers import SectionSerializer
 from scraper.models import Section
+from scraper.section_json_cache import (
+    dumps, get_sections_json, json_array, json_object, json_response,
+)
+
+# Max number of seconds create_schedules can spend searching for schedules per request
+_TIME_BUDGET = 2
+
+# Query parameter and header clients can set to get normalized schedules (see
+# _serialize_normalized_schedules). Otherwise each schedule contains its full sections
+_NORMALIZED_PARAM = 'normalized'
+_FORMAT_HEADER = 'X-Schedule-Format'
 
 def _parse_course_filter(course) -> CourseFilter:
     """ Parses the given course to retrieve and convert it to a CourseFilter object
@@ -40,40 +53,119 @@ def _parse_unavailable_time(avail) -> UnavailableTime:
 
     return UnavailableTime(start_time, end_time, day)
 
-def _serialize_schedules(schedules: List[Tuple[str]]) -> List[List]:
-    """ Converts the given schedules, retrieves the corresponding sections,
-        then serializes and returns them
+def _parse_weight(preferences, key: str) -> float:
+    """ Parses the weight of the given preference, which is 0 if it's missing
+
+    Raises:
+        ValueError: If the weight isn't a finite, non-negative number. create_schedules
+                    can only skip schedules that can't be the best ones when every
+                    weight is non-negative
+    """
+
+    try:
+        weight = float(preferences.get(key, 0))
+    except (TypeError, ValueError) as err:
+        raise ValueError(f'{key} must be a number') from err
+
+    if not math.isfinite(weight) or weight < 0:
+        raise ValueError(f'{key} must be a non-negative number')
+
+    return weight
+
+def _parse_preferences(preferences) -> SchedulePreferences:
+    """ Parses the weights of each schedule preference and converts them to a
+        SchedulePreferences object to be used in create_schedules. Missing weights are 0,
+        and so are all of them if preferences is None
+
+    Raises:
+        ValueError: If preferences isn't an object or any weight is invalid
+    """
+
+    if preferences is None:
+        preferences = {}
+    if not isinstance(preferences, dict):
+        raise ValueError('preferences must be an object')
+
+    return SchedulePreferences(gaps=_parse_weight(preferences, "gaps"),
+                               early_start=_parse_weight(preferences, "earlyStart"),
+                               days=_parse_weight(preferences, "days"),
+                               gpa=_parse_weight(preferences, "gpa"))
+
+def _wants_normalized_schedules(request) -> bool:
+    """ Whether the client asked for normalized schedules, with either the
+        ?normalized=true query parameter or the X-Schedule-Format: normalized header
+    """
+
+    return (request.query_params.get(_NORMALIZED_PARAM) == 'true'
+            or request.headers.get(_FORMAT_HEADER) == 'normalized')
+
+def _get_schedule_sections(
+        schedules: List[Tuple[str]]
+) -> Tuple[Dict[int, str], List[List[int]]]:
+    """ Retrieves and serializes the sections of the given schedules, and removes any
+        sections that are no longer available from them
 
     Args:
         schedules: The schedules returned from create_schedules
 
-    Returns
-        The list of given schedules with the corresponding serialized sections
+    Returns:
+        A tuple of a dict mapping each section's id to its JSON, and the schedules
+        without the unavailable sections. Schedules without any sections left are
+        removed
     """
 
     # Retrieve the section models in bulk so we only do one DB query
     # Put the section ids in a set to remove duplicates
     section_set = set(section_id for schedule in schedules for section_id in schedule)
-    models = Section.objects.filter(
+    models = list(Section.objects.filter(
         id__in=section_set,
-    ).select_related('instructor').prefetch_related('meetings')
+    ).select_related('instructor'))
 
-    # Maps each section's id to their corresponding section model
-    sections_dict = {section.id: section for section in models}
+    # Maps each section's id to its JSON. Sections are serialized once, even if
+    # they're in multiple schedules
+    sections_dict = dict(zip((section.id for section in models),
+                             get_sections_json(models)))
 
-    def sections_for_schedule(schedule):
-        sections = (sections_dict[section] for section in schedule
-                    if section in sections_dict)
+    available = []
+    for schedule in schedules:
+        sections = [section for section in schedule if section in sections_dict]
+        if sections:
+            available.append(sections)
 
-        return SectionSerializer(sections, many=True).data
+    return (sections_dict, available)
 
-    ret = []
-    for schedule in schedules:
-        serialized_schedule = sections_for_schedule(schedule)
-        if serialized_schedule:
-            ret.append(serialized_schedule)
+def _serialize_schedules(schedules: List[Tuple[str]]) -> List[str]:
+    """ Converts the given schedules, retrieves the corresponding sections,
+        then serializes and returns them
+
+    Args:
+        schedules: The schedules returned from create_schedules
+
+    Returns
+        The list of given schedules, each encoded as a JSON array of its serialized
+        sections
+    """
 
-    return ret
+    sections, schedules = _get_schedule_sections(schedules)
+    return [json_array(sections[section] for section in schedule)
+            for schedule in schedules]
+
+def _serialize_normalized_schedules(schedules: List[Tuple[str]]) -> Tuple[str, List[str]]:
+    """ Like _serialize_schedules, but gives each section once instead of in every
+        schedule that contains it, which makes responses several times smaller
+
+    Args:
+        schedules: The schedules returned from create_schedules
+
+    Returns:
+        A tuple of a JSON object mapping each section's id to its serialized section,
+        and the list of given schedules, each encoded as a JSON array of section ids
+    """
+
+    sections, schedules = _get_schedule_sections(schedules)
+    sections_json = json_object(**{str(section_id): section
+                                   for section_id, section in sections.items()})
+    return (sections_json, [dumps(schedule) for schedule in schedules])
 
 class ScheduleView(APIView):
     """ Handles requests to the generate schedules algorithm  """
@@ -93,17 +185,34 @@ class ScheduleView(APIView):
 
         term = query["term"]
 
+        # Schedules are only ranked if the user gave any preferences
+        try:
+            preferences = _parse_preferences(query.get("preferences"))
+        except ValueError as err:
+            return Response(str(err), status=400)
+
         num_schedules = 5
 
         schedules = []
         message = ''
+        budget = TimeBudget(_TIME_BUDGET)
         try:
-            schedules = create_schedules(courses, term, unavailable_times, num_schedules)
+            schedules = create_schedules(courses, term, unavailable_times, num_schedules,
+                                         preferences, budget)
         except NoSchedulesError as err:
             message = str(err)
 
-        response = {
-            'schedules': _serialize_schedules(schedules),
-            'message': message
-        }
-        return Response(response)
+        fields = {}
+        if _wants_normalized_schedules(request):
+            fields['sections'], schedules = _serialize_normalized_schedules(schedules)
+        else:
+            schedules = _serialize_schedules(schedules)
+
+        response = json_object(
+            **fields,
+            schedules=json_array(schedules),
+            message=dumps(message),
+            # Whether the search ran out of time, so better schedules may exist
+            truncated=dumps(budget.truncated),
+        )
+        return json_response(response)
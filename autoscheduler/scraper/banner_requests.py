@@ -23,14 +23,30 @@
 import time
 import random
 import asyncio
+from concurrent.futures import Executor
+from contextlib import asynccontextmanager
 import string
-from typing import Dict, List, Tuple, Callable
+from typing import Awaitable, Dict, List, Optional, Tuple, Callable
 from enum import Enum
 from aiohttp.client_exceptions import ClientConnectorError, ContentTypeError
-from aiohttp import ClientSession
+from aiohttp import ClientSession, TCPConnector
 
 import requests
 
+# Max number of connections to Banner open at once. Every search shares this pool of
+# connections, and keeps them alive to reuse, rather than connecting to Banner again.
+# This is also the most concurrent searches AdaptiveLimiter allows
+_CONNECTION_LIMIT = 100
+
+# Number of seconds idle connections are kept alive for
+_KEEPALIVE_TIMEOUT = 30
+
+# Number of seconds DNS lookups are cached for
+_DNS_CACHE_TTL = 600
+
+# Number of times to retry requests that fail due to network errors
+_RETRY_MAX = 10
+
 class Semester(Enum):
     """ The semester of a given term """
     SPRING = 1
@@ -64,6 +80,81 @@ def get_term_code(year: str, semester: Semester, location: Location):
 
     return year + str(semester.value) + str(location.value)
 
+class AdaptiveLimiter: # pylint: disable=too-many-instance-attributes
+    """ Limits the number of concurrent requests, like a semaphore whose size adapts
+        to how well Banner is keeping up, using additive increase/multiplicative
+        decrease (AIMD) like TCP congestion control.
+
+        Each request that succeeds faster than slow_latency raises the limit by
+        1 / limit, so it grows by about 1 each time a full limit's worth of requests
+        succeed. Each request that fails or is slower halves the limit, unless it was
+        started before the last time the limit was halved, since a burst of errors
+        from the same overload should only back off once.
+    """
+
+    def __init__(self, initial: int = 10, maximum: int = _CONNECTION_LIMIT,
+                 slow_latency: float = 20):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.slow_latency = slow_latency
+
+        # Highest limit reached and number of times the limit was decreased, which are
+        # shown in the scrape summary
+        self.peak = self.limit
+        self.backoffs = 0
+
+        self._in_flight = 0
+        self._last_backoff = time.monotonic()
+        self._condition = asyncio.Condition()
+
+    def _increase(self):
+        """ Additively increases the limit after a healthy request """
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        self.peak = max(self.peak, self.limit)
+
+    def _decrease(self, start: float):
+        """ Halves the limit after a failed or slow request that began at start """
+        if start < self._last_backoff:
+            return
+
+        self.limit = max(1.0, self.limit / 2)
+        self._last_backoff = time.monotonic()
+        self.backoffs += 1
+
+    @asynccontextmanager
+    async def request(self):
+        """ Waits until there's room for another request under the limit, then
+            measures how long the request inside this takes and whether it raises
+        """
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self._decrease(start)
+            raise
+        else:
+            if time.monotonic() - start > self.slow_latency:
+                self._decrease(start)
+            else:
+                self._increase()
+        finally:
+            async with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+def create_connector() -> TCPConnector:
+    """ Creates a pool of keep-alive connections to share between ClientSessions.
+        Must be called from within a running event loop
+    """
+
+    return TCPConnector(limit=_CONNECTION_LIMIT, limit_per_host=_CONNECTION_LIMIT,
+                        keepalive_timeout=_KEEPALIVE_TIMEOUT,
+                        ttl_dns_cache=_DNS_CACHE_TTL)
+
 class BannerRequests():
     """ Handles basic banner requests """
 
@@ -74,10 +165,11 @@ class BannerRequests():
                           'dataType=json&offset=1&term={term}&max={max}' % base_url)
 
         self.course_search_url = ('https://%s/StudentRegistrationSsb/ssb/searchResults/'
-                                  'searchResults/?pageOffset=0&sortDirection=asc&'
-                                  'sortColumn=subjectDescription&txt_subject={subject}&'
-                                  'txt_term={term}&uniqueSessionId={uniqueSessionId}&'
-                                  'pageMaxSize={num_courses}' % base_url)
+                                  'searchResults/?pageOffset={offset}&sortDirection=asc'
+                                  '&sortColumn=courseReferenceNumber&txt_subject='
+                                  '{subject}&txt_term={term}&uniqueSessionId='
+                                  '{uniqueSessionId}&pageMaxSize={num_courses}'
+                                  % base_url)
 
         self.create_session_url = ('https://%s/StudentRegistrationSsb/ssb/term/search?'
                                    'mode=search&dataType=json' % base_url)
@@ -97,16 +189,24 @@ class BannerRequests():
             'term': term,
         }
 
-        await session.post(self.create_session_url, data=data)
+        # Reads the response so its connection is released back to the connector
+        # instead of being closed
+        async with session.post(self.create_session_url, data=data) as response:
+            await response.read()
 
-        return session
+        return session_id
 
     async def get_courses(self, session: ClientSession, session_id: str, dept: str, # pylint: disable=too-many-arguments
-                          term: str, amount: int) -> List[Dict]:
-        """ Retrieves all of the courses for a given department
+                          term: str, amount: int,
+                          offset: int = 0) -> Tuple[Optional[List[Dict]], int]:
+        """ Retrieves a page of the courses for a given department
 
             dept: Department, a four letter string, such as CSCE
             amount: max amount of courses to retrieve
+            offset: Number of courses to skip, for retrieving pages after the first
+
+            Returns a tuple of the retrieved courses, or None if Banner gave an error,
+            and the total number of courses in the department
         """
 
         data = {
@@ -114,6 +214,7 @@ class BannerRequests():
             'term': term,
             'subject': dept,
             'num_courses': amount,
+            'offset': offset,
         }
 
         url = self.course_search_url.format(**data)
@@ -123,9 +224,7 @@ class BannerRequests():
 
         await self.reset_search(session)
 
-        data = json['data']
-
-        return data
+        return (json['data'], json.get('totalCount') or 0)
 
     def get_departments(self, term: str, amount: int = 300) -> List[Dict]:
         """ Retrieves all of the departments for the given term
@@ -147,48 +246,106 @@ class BannerRequests():
 
         return depts
 
-    async def search(self, depts_terms: List[Tuple[str, str]],
-                     sem: asyncio.Semaphore,
+    async def search(self, depts_terms: List[Tuple[str, str]], # pylint: disable=too-many-arguments,too-many-locals
+                     limiter: AdaptiveLimiter,
                      parse_all_courses: Callable[[list], list],
-                     amount: int = 750
+                     page_size: int = 500,
+                     on_department: Callable[[str, str, list], Awaitable] = None,
+                     parse_executor: Executor = None,
                     ) -> List[List[Dict]]:
         """ Concurrently retrieves all of the given departments and returns them as
             a list of course-lists, with each index corresponding to the courses/sections
-            for a department.
+            for a department. Departments are retrieved page_size courses at a time, and
+            the pages after the first are retrieved concurrently. The number of pages
+            retrieved at once is limited by limiter.
+
+            If on_department is given, it's awaited with the department, term, and
+            parsed courses of each department as soon as they're retrieved instead, so
+            they don't all have to be kept in memory, and None is returned for each
+            department.
+
+            If parse_executor is given, departments are parsed on it (such as in a
+            process pool) so parsing doesn't hold up downloading. parse_all_courses must
+            then return a list rather than a generator, and since the sets of seen
+            courses and instructors can't be shared with the executor, each department
+            is given its own, so callers have to remove duplicates across departments.
         """
 
         loop = asyncio.get_running_loop()
+        connector = create_connector()
 
         courses_set = set()
         instructors_set = set()
 
-        async def perform_search(dept: str, term: str):
-            async with ClientSession(loop=loop) as session:
-                retry_max = 10
-                for i in range(1, retry_max + 1):
-                    try:
-                        # Must limit the number of concurrent requests, otherwise will get
-                        # a "too many file descriptors in select()" error from aiohttp
-                        async with sem:
-                            print(f"Starting {dept} {term}")
+        async def fetch_page(dept: str, term: str,
+                             offset: int) -> Optional[Tuple[List[Dict], int]]:
+            for i in range(1, _RETRY_MAX + 1):
+                try:
+                    # Banner keeps track of each search with cookies, so every page needs
+                    # its own session. Sessions share connections, so there's only a TLS
+                    # handshake per connection rather than per page
+                    async with ClientSession(loop=loop, connector=connector,
+                                             connector_owner=False) as session:
+                        # Must limit the number of concurrent requests, otherwise will
+                        # get a "too many file descriptors in select()" error from
+                        # aiohttp, and Banner slows down or refuses connections
+                        async with limiter.request():
+                            print(f"Starting {dept} {term} from {offset}")
                             session_id = await self.create_session(session, term)
 
-                            course_list = await self.get_courses(session, session_id,
-                                                                 dept, term, amount)
+                            course_list, total = await self.get_courses(
+                                session, session_id, dept, term, page_size, offset
+                            )
 
-                        if course_list is None:
-                            continue # Error, retry
+                    if course_list is None:
+                        continue # Error, retry
 
-                        # We only want to limit the requests, not parsing, so call this
-                        # outside of the semaphore
-                        ret = parse_all_courses(course_list, term, courses_set,
-                                                instructors_set)
+                    return (course_list, total)
 
-                        return ret
+                except (ClientConnectorError, ContentTypeError):
+                    # Empty lines help it stand out from the rest of the outputs
+                    print(f"\n\nNETWORK ERROR: Retrying {dept} {term} from {offset}: "
+                          f"Take {i} \n\n")
+
+            return None
+
+        async def perform_search(dept: str, term: str):
+            first_page = await fetch_page(dept, term, 0)
+            if first_page is None:
+                return None
+
+            # The first page gives how many courses there are, so get the rest at once.
+            # Pages are sorted by CRN, which is unique, so they're in the same order
+            course_list, total = first_page
+            pages = await asyncio.gather(*(fetch_page(dept, term, offset)
+                                           for offset in range(page_size, total,
+                                                               page_size)))
+
+            # Sections added or removed while the pages are retrieved can still shift
+            # others onto the next page, so skip any that an earlier page gave
+            seen_ids = set(course['id'] for course in course_list) if pages else set()
+            for page in pages:
+                if page is None:
+                    return None
+                for course in page[0]:
+                    if course['id'] not in seen_ids:
+                        seen_ids.add(course['id'])
+                        course_list.append(course)
+
+            # We only want to limit the requests, not parsing, so call this
+            # outside of the limiter
+            if parse_executor is None:
+                course_data = parse_all_courses(course_list, term, courses_set,
+                                                instructors_set)
+            else:
+                course_data = await loop.run_in_executor(
+                    parse_executor, parse_all_courses, course_list, term, set(), set()
+                )
+            if on_department is None:
+                return course_data
 
-                    except (ClientConnectorError, ContentTypeError):
-                        # Empty lines help it stand out from the rest of the outputs
-                        print(f"\n\nNETWORK ERROR: Retrying {dept} {term}: Take {i} \n\n")
+            await on_department(dept, term, course_data)
+            return None
 
         tasks = [perform_search(dept, term) for dept, term  in depts_terms]
 
@@ -196,8 +353,11 @@ class BannerRequests():
 
         # Runs all of the tasks concurrently, stopping in this for loop after each one is
         # completed
-        for result in await asyncio.gather(*tasks, loop=loop):
-            results.append(result)
+        try:
+            for result in await asyncio.gather(*tasks):
+                results.append(result)
+        finally:
+            await connector.close()
 
         return results
 
@@ -209,4 +369,5 @@ class BannerRequests():
             firsts'
         """
 
-        await session.post(self.reset_search_url)
+        async with session.post(self.reset_search_url) as response:
+            await response.read()
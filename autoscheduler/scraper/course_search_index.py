@@ -0,0 +1,165 @@
+""" In-memory index of each term's courses, used by /api/course/search.
+
+    Course search is called on every keystroke, so rather than making two LIKE queries
+    each time, each term's courses are loaded once and kept in arrays sorted by id and
+    by title, which can be searched by prefix with bisect. Indexes are rebuilt when the
+    term is rescraped (see TermCache), which is only checked every _STAMP_TTL seconds
+    so that searches usually don't need any queries at all.
+
+    For fuzzy searches, which match anywhere in a course's name and tolerate typos, the
+    index also maps each trigram (3 letter sequence) to the courses containing it. A
+    course's score is the fraction of the search's trigrams it contains, like
+    pg_trgm's word_similarity.
+"""
+
+from bisect import bisect_left
+from collections import Counter, defaultdict
+import heapq
+import math
+import re
+from typing import FrozenSet, List, Optional, Sequence, Tuple
+from scraper.models import Course
+from scraper.term_cache import TermCache
+
+# Greater than any character, so every string starting with a prefix sorts before
+# the prefix followed by this
+_MAX_CHAR = chr(0x10ffff)
+
+# Min fraction of a fuzzy search's trigrams a course must contain to be a result
+_MIN_SCORE = 0.5
+
+_WORD = re.compile(r'[A-Z0-9]+')
+
+# Seconds that an index is used for before checking whether its term was rescraped
+_STAMP_TTL = 10
+
+def _trigrams(text: str) -> FrozenSet[str]:
+    """ Gets the trigrams of each word in text. Like pg_trgm, words are padded with
+        two spaces before and one after, so the starts of words count for more
+    """
+    return frozenset(padded[i:i + 3]
+                     for padded in (f'  {word} ' for word in _WORD.findall(text.upper()))
+                     for i in range(len(padded) - 2))
+
+class CourseSearchIndex:
+    """ A term's courses, which can be searched by the start of their ids or titles,
+        or fuzzily by trigrams
+    """
+
+    def __init__(self, courses: Sequence[Course]):
+        # Courses in the order search results are given in
+        self._courses = sorted(courses, key=lambda course: (course.dept,
+                                                            course.course_num))
+        # (key, index in self._courses) pairs, sorted by key
+        self._ids = sorted((course.id, i) for i, course in enumerate(self._courses))
+        self._titles = sorted((course.title, i) for i, course in enumerate(self._courses)
+                              if course.title is not None)
+
+        # Maps each trigram to the indexes of the courses containing it, in order. The
+        # department & number are included both separately and together, so both
+        # CSCE 315 and CSCE315 match
+        self._trigrams = defaultdict(list)
+        for i, course in enumerate(self._courses):
+            text = f'{course.dept} {course.course_num} {course.dept}{course.course_num} '
+            for trigram in _trigrams(text + (course.title or '')):
+                self._trigrams[trigram].append(i)
+
+    def _find(self, entries: List[Tuple[str, int]], prefix: str,
+              limit: int) -> List[Course]:
+        """ Finds the first limit courses whose keys in entries start with prefix """
+        start = bisect_left(entries, (prefix,))
+        end = bisect_left(entries, (prefix + _MAX_CHAR,))
+        indexes = heapq.nsmallest(limit, (i for _, i in entries[start:end]))
+        return [self._courses[i] for i in indexes]
+
+    def search(self, id_prefix: str, title_prefix: str, limit: int) -> List[Course]:
+        """ Searches for courses whose ids start with id_prefix, followed by courses
+            whose titles start with title_prefix, each ordered by department and course
+            number. Like Course.objects.filter(id__startswith=...), this is case sensitive
+
+        Args:
+            id_prefix: Start of the ids to search for, such as CSCE3
+            title_prefix: Start of the titles to search for
+            limit: Max number of courses to return
+
+        Returns:
+            Up to limit matching courses
+        """
+        results = self._find(self._ids, id_prefix, limit)
+        if len(results) < limit:
+            results += self._find(self._titles, title_prefix, limit - len(results))
+        return results
+
+    def fuzzy_search(self, text: str, limit: int) -> List[Course]:
+        """ Searches for courses containing most of the trigrams of text anywhere in
+            their department, number, or title, so it matches substrings and typos
+
+        Args:
+            text: Text to search for, such as "programing lang" or "315"
+            limit: Max number of courses to return
+
+        Returns:
+            Up to limit matching courses, from most to least relevant. Courses that are
+            equally relevant are ordered by department and course number
+        """
+        trigrams = _trigrams(text)
+        if not trigrams:
+            return []
+
+        counts = Counter()
+        for trigram in trigrams:
+            counts.update(self._trigrams.get(trigram, ()))
+
+        min_count = math.ceil(len(trigrams) * _MIN_SCORE)
+        # Sorts by count in descending order, then by index
+        best = heapq.nsmallest(limit, ((-count, i) for i, count in counts.items()
+                                       if count >= min_count))
+        return [self._courses[i] for _, i in best]
+
+def _create_index(term: int) -> CourseSearchIndex:
+    """ Loads the courses of the given term into an index """
+    courses = Course.objects.filter(term=str(term)).only('id', 'dept', 'course_num',
+                                                         'title')
+    return CourseSearchIndex(list(courses))
+
+_INDEXES = TermCache(_create_index, ttl=_STAMP_TTL)
+
+def _get_index(term: str) -> Optional[CourseSearchIndex]:
+    """ Gets the index of the given term, or None if it hasn't been scraped """
+    if term is None or not term.isdigit():
+        return None
+
+    return _INDEXES.get(term)
+
+def search_courses(term: str, id_prefix: str, title_prefix: str,
+                   limit: int) -> Optional[List[Course]]:
+    """ Searches the courses of the given term using its index (see
+        CourseSearchIndex.search)
+
+    Returns:
+        Up to limit matching courses, or None if the term doesn't have an index
+        because it hasn't been scraped
+    """
+    index = _get_index(term)
+    if index is None:
+        return None
+
+    return index.search(id_prefix, title_prefix, limit)
+
+def fuzzy_search_courses(term: str, text: str, limit: int) -> Optional[List[Course]]:
+    """ Searches the courses of the given term by relevance using its index (see
+        CourseSearchIndex.fuzzy_search)
+
+    Returns:
+        Up to limit matching courses, or None if the term doesn't have an index
+        because it hasn't been scraped
+    """
+    index = _get_index(term)
+    if index is None:
+        return None
+
+    return index.fuzzy_search(text, limit)
+
+def clear_cache():
+    """ Removes all cached indexes """
+    _INDEXES.clear()
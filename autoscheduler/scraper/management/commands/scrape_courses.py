@@ -1,20 +1,36 @@
 import asyncio
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from html import unescape
 import time
 import datetime
 from itertools import groupby
-from typing import List, Tuple
+from typing import Iterable, List, Optional, Set, Tuple, Type
 from django.utils import timezone
 from django.core.management import base
-from django.db import transaction
-from scraper.banner_requests import BannerRequests
-from scraper.models import Course, Instructor, Section, Meeting, Department, Grades, Term
+from django.db import connection, connections, transaction
+from django.db.models import Model, Q, QuerySet
+from scraper.banner_requests import AdaptiveLimiter, BannerRequests
+from scraper.models import (
+    Course, Instructor, Section, Meeting, Department, Grades, GradeSummary, Term,
+)
 from scraper.models.course import generate_course_id
 from scraper.models.section import generate_meeting_id
+from scraper.management.commands.utils.copy_loader import (
+    copy_models, drop_staged_models, publish_staged_models, stage_models,
+)
+from scraper.management.commands.utils.scraped_records import (
+    ScrapedCourse, ScrapedInstructor, ScrapedMeeting, ScrapedModels, ScrapedSection,
+    to_models,
+)
 from scraper.management.commands.utils.scraper_utils import (
     get_all_terms, get_recent_terms,
 )
 
+# Max number of scraped departments waiting to be saved when streaming. Downloads wait
+# for the database once this many are waiting, which caps how much is kept in memory
+_STREAM_QUEUE_SIZE = 20
+
 # Map from parsed instructional method to section.instructional_method choice
 _INSTRUCTIONAL_METHODS = {
     # Normal instructional methods
@@ -75,8 +91,10 @@ def parse_meeting_days(meetings_data) -> List[bool]:
 
     return [meetings_data['meetingTime'][day] for day in meeting_class_days]
 
-def parse_section(course_data, instructor: Instructor) -> Tuple[Section, List[Meeting]]: # pylint: disable=too-many-locals
-    """ Puts section data in database & calls parse_meeting.
+def parse_section(course_data, # pylint: disable=too-many-locals
+                  instructor: Optional[ScrapedInstructor],
+                 ) -> Tuple[ScrapedSection, List[ScrapedMeeting]]:
+    """ Parses the section data into a ScrapedSection & calls parse_meeting.
         Called from parse_course.
     """
 
@@ -107,31 +125,30 @@ def parse_section(course_data, instructor: Instructor) -> Tuple[Section, List[Me
     )
     remote = instructional_method in _REMOTE_INSTRUCTIONAL_METHODS
 
-    # Creates and saves section object
-    section_model = Section(
-        id=section_id, subject=subject, course_num=course_number,
-        section_num=section_number, term_code=term_code, crn=crn, min_credits=min_credits,
-        max_credits=max_credits, honors=honors, remote=remote,
-        max_enrollment=max_enrollment, current_enrollment=current_enrollment,
-        instructor=instructor, instructional_method=instructional_method,
-        mcallen=mcallen
-    )
-
     # Parse each meeting in this section. i is the counter used to identify each Meeting
-    meetings = list(parse_meeting(meetings_data, section_model, i)
+    meetings = list(parse_meeting(meetings_data, section_id, i)
                     for i, meetings_data in enumerate(course_data['meetingsFaculty']))
 
-    section_model.asynchronous = all(m.start_time is None or m.end_time is None
-                                     for m in meetings)
+    asynchronous = all(m.start_time is None or m.end_time is None for m in meetings)
+
+    section = ScrapedSection(
+        id=section_id, subject=subject, course_num=course_number,
+        section_num=section_number, term_code=term_code, crn=crn, min_credits=min_credits,
+        max_credits=max_credits, honors=honors, remote=remote, asynchronous=asynchronous,
+        mcallen=mcallen, max_enrollment=max_enrollment,
+        current_enrollment=current_enrollment,
+        instructor_id=instructor.id if instructor is not None else None,
+        instructional_method=instructional_method
+    )
 
-    return (section_model, meetings)
+    return (section, meetings)
 
-def parse_meeting(meetings_data, section: Section, meeting_count: int) -> Meeting:
-    """ Parses the meeting data and saves it as a Meeting model.
+def parse_meeting(meetings_data, section_id: int, meeting_count: int) -> ScrapedMeeting:
+    """ Parses the meeting data into a ScrapedMeeting.
         Called by parse_section on each of the section's meeting times.
     """
 
-    meeting_id = generate_meeting_id(str(section.id), str(meeting_count))
+    meeting_id = int(generate_meeting_id(str(section_id), str(meeting_count)))
 
     class_days = parse_meeting_days(meetings_data)
 
@@ -146,13 +163,13 @@ def parse_meeting(meetings_data, section: Section, meeting_count: int) -> Meetin
 
     class_type = meetings_data['meetingTime']['meetingType']
 
-    meeting_model = Meeting(id=meeting_id, building=building, meeting_days=class_days,
-                            start_time=start_time, end_time=end_time, room=room,
-                            meeting_type=class_type, section=section)
-    return meeting_model
+    return ScrapedMeeting(id=meeting_id, building=building, room=room,
+                          meeting_days=class_days, start_time=start_time,
+                          end_time=end_time, meeting_type=class_type,
+                          section_id=section_id)
 
-def parse_instructor(course_data) -> Instructor:
-    """ Parses the instructor data and saves it as a Instructor model.
+def parse_instructor(course_data) -> Optional[ScrapedInstructor]:
+    """ Parses the instructor data into a ScrapedInstructor.
         Called from parse_course.
     """
 
@@ -169,15 +186,16 @@ def parse_instructor(course_data) -> Instructor:
 
         email = faculty_data['emailAddress']
 
-        return Instructor(id=name, email_address=email)
+        return ScrapedInstructor(id=name, email_address=email)
 
     return None
 
 def parse_course(course_data: List,
                  courses_set: set,
                  instructors_set: set,
-                ) -> Tuple[Course, Instructor, Tuple[Section, List[Meeting]]]:
-    """ Creates Course model and saves it to the databsae.
+                ) -> Tuple[ScrapedCourse, ScrapedInstructor,
+                           Tuple[ScrapedSection, List[ScrapedMeeting]]]:
+    """ Parses the course data into a ScrapedCourse.
         Calls parse_instructor and parse_section
     """
 
@@ -195,7 +213,7 @@ def parse_course(course_data: List,
         title = title[4:]
     credit_hours = course_data['creditHourLow']
 
-    # Parse the instructor, then send the returned Instructor model to parse_section
+    # Parse the instructor, then send the returned ScrapedInstructor to parse_section
     instructor_model = parse_instructor(course_data)
     section_data = parse_section(course_data, instructor_model)
 
@@ -207,8 +225,9 @@ def parse_course(course_data: List,
 
     # Save course only if it hasn't already been created
     if course_id not in courses_set:
-        course_model = Course(id=course_id, dept=dept, course_num=course_number,
-                              title=title, credit_hours=credit_hours, term=term_code)
+        course_model = ScrapedCourse(id=course_id, dept=dept, course_num=course_number,
+                                     title=title, credit_hours=credit_hours,
+                                     term=term_code)
         courses_set.add(course_id)
         return (course_model, instructor_model, section_data)
 
@@ -234,24 +253,62 @@ def parse_all_courses(course_list, term: str, courses_set: set,
 
     return (parse_course(course, courses_set, instructors_set) for course in course_list)
 
+def parse_department(course_list, term: str, courses_set: set,
+                     instructors_set: set) -> List:
+    """ Parses all of a department's courses at once, like parse_all_courses. Used
+        when parsing in worker processes, since generators can't be sent back from them
+    """
+    return list(parse_all_courses(course_list, term, courses_set, instructors_set))
+
+def _create_parse_executor(parse_workers: Optional[int]):
+    """ Creates a pool of parse_workers processes to parse departments in
+
+    Returns:
+        A tuple of the pool and the parse function to give banner.search. If
+        parse_workers isn't given, the pool is None and departments are parsed in this
+        process instead
+    """
+    if not parse_workers:
+        return (None, parse_all_courses)
+
+    return (ProcessPoolExecutor(max_workers=parse_workers), parse_department)
+
 def get_course_data(  # pylint: disable=too-many-locals
-        depts_terms,
-) -> Tuple[List[Instructor], List[Section], List[Meeting], List[Course]]:
-    """ Retrieves all of the course data from Banner """
-    # This limit is artifical for speed at this point,
-    concurrent_limit = 50
-    sem = asyncio.Semaphore(concurrent_limit)
+        depts_terms, parse_workers: int = None,
+) -> ScrapedModels:
+    """ Retrieves all of the course data from Banner. If parse_workers is given,
+        departments are parsed in that many processes while the rest are downloading
+    """
+    # Adjusts how many departments are retrieved at once to how fast Banner is
+    limiter = AdaptiveLimiter()
 
     banner = BannerRequests()
     loop = asyncio.get_event_loop()
+    executor, parse = _create_parse_executor(parse_workers)
 
     start = time.time()
-    data_set = loop.run_until_complete(banner.search(depts_terms, sem,
-                                                     parse_all_courses))
+    try:
+        data_set = loop.run_until_complete(banner.search(depts_terms, limiter, parse,
+                                                         parse_executor=executor))
+    finally:
+        if executor is not None:
+            executor.shutdown()
     print(f"Downloaded and scraped {len(data_set)} departments data in"
           f" {time.time() - start:.2f} seconds")
+    print(f"Concurrency ended at {int(limiter.limit)} requests, peaked at"
+          f" {int(limiter.peak)}, and backed off {limiter.backoffs} times")
+
+    return _flatten_course_data(data_set)
 
-    instructors = []
+def _flatten_course_data(
+        data_set: Iterable[List],
+) -> ScrapedModels:
+    """ Splits the parsed courses of each department into lists of each model.
+        Instructors are only included once, even if departments were parsed separately
+        (see parse_department) and each included them
+    """
+    # Maps each instructor's id to the instructor
+    instructors = {}
     sections = []
     meetings = []
     courses = []
@@ -261,24 +318,23 @@ def get_course_data(  # pylint: disable=too-many-locals
             if course is not None:
                 courses.append(course)
             if instructor is not None:
-                instructors.append(instructor)
+                instructors.setdefault(instructor.id, instructor)
 
             sections.append(section)
             meetings.extend(meetings_list)
 
-    return (instructors, sections, meetings, courses)
+    return (list(instructors.values()), sections, meetings, courses)
 
-def save_models(instructors: List[Instructor], sections: List[Section], # pylint: disable=too-many-arguments
-                meetings: List[Meeting], courses: List[Course], terms: List[int],
-                options):
+def save_models(instructors: List[ScrapedInstructor], # pylint: disable=too-many-arguments
+                sections: List[ScrapedSection], meetings: List[ScrapedMeeting],
+                courses: List[ScrapedCourse], terms: List[int], options):
     """ Takes in a tuple of the models and attempts to save them
         "bulk updates" the models by deleting the according models then re-saving them
         in a single transaction.
     """
     start_save = time.time()
     start = time.time()
-    Instructor.objects.bulk_create(instructors,
-                                   ignore_conflicts=True, batch_size=50_000)
+    copy_models(Instructor, instructors, ignore_conflicts=True)
     finish = time.time()
     print(f"Saved {len(instructors)} instructors in {(finish-start):.2f} seconds")
 
@@ -288,33 +344,43 @@ def save_models(instructors: List[Instructor], sections: List[Section], # pylint
         # here to resave later. Note we're force-evaluating the QuerySet
         # (by calling list()), as it would be empty if we evaluated it after due to the
         # cascade-deletion.
-        grades_to_resave = list(Grades.objects.filter(section__in=sections))
+        grades_to_resave = list(Grades.objects.filter(
+            section_id__in=[section.id for section in sections]
+        ))
         print(f"Retrieved the grades models in {(time.time()-start):.2f}")
 
         if options['term'] or options['year'] or options['recent']:
             queryset = Section.objects.filter(term_code__in=terms)
+            # Sections' instructors can change, and deleted sections lose their grades,
+            # so every course with grades in these terms needs its summaries recomputed
+            graded_courses = _graded_courses(queryset)
         else:
             queryset = Section.objects.all()
+            graded_courses = None # Recompute all of them
 
         print("Starting to delete")
         queryset.delete()
         print(f"Done deleting in {(time.time() - start):.2f}")
 
-        Section.objects.bulk_create(sections, batch_size=50_000)
+        copy_models(Section, sections)
         finish = time.time()
         print(f"Saved {len(sections)} sections in {(finish-start):.2f} seconds")
 
         start = time.time()
         # Deleting the Sections will cascade into deleting the Meetings,
         # so no need to do it manually
-        Meeting.objects.bulk_create(meetings, batch_size=50_000)
+        copy_models(Meeting, meetings)
         finish = time.time()
         print(f"Saved {len(meetings)} meetings in {(finish-start):.2f} seconds")
 
         start = time.time()
-        Grades.objects.bulk_create(grades_to_resave, batch_size=50_000)
+        copy_models(Grades, grades_to_resave)
         print(f"Resaved {len(grades_to_resave)} grades in {(time.time()-start):.2f}")
 
+        start = time.time()
+        GradeSummary.objects.refresh(graded_courses)
+        print(f"Refreshed grade summaries in {(time.time()-start):.2f}")
+
     start = time.time()
     with transaction.atomic():
         if options['term'] or options['year'] or options['recent']:
@@ -324,7 +390,7 @@ def save_models(instructors: List[Instructor], sections: List[Section], # pylint
 
         queryset.delete()
 
-        Course.objects.bulk_create(courses, batch_size=50_000)
+        copy_models(Course, courses)
 
     finish = time.time()
     print(f"Saved {len(courses)} courses in {(finish-start):.2f} seconds")
@@ -334,8 +400,374 @@ def save_models(instructors: List[Instructor], sections: List[Section], # pylint
 
     print(f"Saved all in {elapsed_time:.2f} seconds")
 
+def _graded_courses(sections) -> Set[Tuple[str, str]]:
+    """ Gets the (subject, course_num) pairs of the courses with grades for any of the
+        given sections, whose grade summaries need to be refreshed if they change
+    """
+    return set(Grades.objects.filter(section__in=sections)
+               .values_list('section__subject', 'section__course_num')
+               .distinct())
+
+def _content_hash(values: Iterable) -> int:
+    """ Hashes a row's field values, converting lists (from ArrayFields) to tuples """
+    return hash(tuple(tuple(value) if isinstance(value, list) else value
+                      for value in values))
+
+def _diff_models(model: Type[Model], objects: List[Model], queryset: QuerySet):
+    """ Compares scraped models with the existing rows of queryset by id, using
+        hashes of their fields rather than keeping the existing rows in memory
+
+    Returns:
+        A tuple of the models that don't exist yet, the models whose fields changed,
+        and the ids of the existing rows that weren't scraped
+    """
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    existing = {
+        row[0]: _content_hash(row[1:]) for row in
+        queryset.values_list('pk', *(field.attname for field in fields)).iterator()
+    }
+
+    pk = model._meta.pk
+    created = []
+    updated = []
+    for obj in objects:
+        old_hash = existing.pop(pk.to_python(getattr(obj, pk.attname)), None)
+        # Scraped values may not have the same types as the database's (such as term
+        # codes, which are scraped as strings), so convert them first
+        new_hash = _content_hash(field.to_python(getattr(obj, field.attname))
+                                 for field in fields)
+        if old_hash is None:
+            created.append(obj)
+        elif old_hash != new_hash:
+            updated.append(obj)
+
+    return (created, updated, list(existing))
+
+def _apply_diff(model: Type[Model], created: List[Model], updated: List[Model],
+                deleted: List):
+    """ Saves a diff given by _diff_models and prints how many rows changed """
+    start = time.time()
+    fields = [field.name for field in model._meta.concrete_fields
+              if not field.primary_key]
+
+    model.objects.filter(pk__in=deleted).delete()
+    copy_models(model, created)
+    model.objects.bulk_update(to_models(model, updated), fields, batch_size=1000)
+
+    print(f"{model.__name__}s: created {len(created)}, updated {len(updated)}, deleted"
+          f" {len(deleted)} in {(time.time()-start):.2f} seconds")
+
+def upsert_models(instructors: List[ScrapedInstructor], # pylint: disable=too-many-arguments,too-many-locals
+                  sections: List[ScrapedSection], meetings: List[ScrapedMeeting],
+                  courses: List[ScrapedCourse], terms: List[int], options):
+    """ Saves the models like save_models, but only inserts, updates, and deletes
+        the rows that changed. Unchanged sections keep their rows and grades, so only
+        a small part of each table is rewritten
+    """
+    start_save = time.time()
+    scraping_terms = options['term'] or options['year'] or options['recent']
+    with transaction.atomic():
+        copy_models(Instructor, instructors, ignore_conflicts=True)
+
+        section_queryset = Section.objects.all()
+        meeting_queryset = Meeting.objects.all()
+        course_queryset = Course.objects.all()
+        if scraping_terms:
+            section_queryset = section_queryset.filter(term_code__in=terms)
+            meeting_queryset = meeting_queryset.filter(section__term_code__in=terms)
+            course_queryset = course_queryset.filter(term__in=terms)
+
+        created, updated, deleted = _diff_models(Section, sections, section_queryset)
+        # Changed sections may have a different instructor or honors, and deleted
+        # sections lose their grades, so their courses' summaries need to be refreshed
+        changed_ids = [section.id for section in updated] + deleted
+        graded_courses = _graded_courses(Section.objects.filter(id__in=changed_ids))
+        _apply_diff(Section, created, updated, deleted)
+
+        # Meetings of deleted sections were deleted along with them
+        _apply_diff(Meeting, *_diff_models(Meeting, meetings, meeting_queryset))
+        _apply_diff(Course, *_diff_models(Course, courses, course_queryset))
+
+        GradeSummary.objects.refresh(graded_courses)
+
+    print(f"Saved all in {(time.time() - start_save):.2f} seconds")
+
+def publish_models(instructors: List[ScrapedInstructor], # pylint: disable=too-many-arguments
+                   sections: List[ScrapedSection], meetings: List[ScrapedMeeting],
+                   courses: List[ScrapedCourse], terms: List[int], options):
+    """ Saves the models like save_models, but copies them into staging tables
+        first, then swaps them in with publish_staged_models in one short transaction.
+        Requests never see a term with missing sections or courses, and aren't slowed
+        down by the rows being written, so this can run while the site is in use.
+        Falls back to save_models on databases other than Postgres
+    """
+    if connection.vendor != 'postgresql':
+        save_models(instructors, sections, meetings, courses, terms, options)
+        return
+
+    start_save = time.time()
+    copy_models(Instructor, instructors, ignore_conflicts=True)
+
+    staged = [(Section, sections), (Meeting, meetings), (Course, courses)]
+    try:
+        for model, objects in staged:
+            start = time.time()
+            stage_models(model, objects)
+            print(f"Staged {len(objects)} {model.__name__.lower()}s in"
+                  f" {(time.time()-start):.2f} seconds")
+
+        start = time.time()
+        with transaction.atomic():
+            if options['term'] or options['year'] or options['recent']:
+                section_queryset = Section.objects.filter(term_code__in=terms)
+                meeting_queryset = Meeting.objects.filter(section__term_code__in=terms)
+                course_queryset = Course.objects.filter(term__in=terms)
+                graded_courses = _graded_courses(section_queryset)
+            else:
+                section_queryset = Section.objects.all()
+                meeting_queryset = Meeting.objects.all()
+                course_queryset = Course.objects.all()
+                graded_courses = None # Recompute all of them
+
+            # Sections go first, since the staged meetings refer to them
+            publish_staged_models(Section, section_queryset)
+            publish_staged_models(Meeting, meeting_queryset)
+            publish_staged_models(Course, course_queryset)
+            GradeSummary.objects.refresh(graded_courses)
+        print(f"Published the staged models in {(time.time()-start):.2f} seconds")
+    finally:
+        for model, _ in staged:
+            drop_staged_models(model)
+
+    print(f"Saved all in {(time.time() - start_save):.2f} seconds")
+
+def save_department(dept: str, term: str,
+                    course_data) -> Tuple[Set[Tuple[str, str]], int]:
+    """ Replaces the sections (and their meetings) and courses of a department in a term
+        with newly scraped ones in a single transaction, keeping their grades. Used when
+        streaming, so the department is never missing while the rest are scraped
+
+    Args:
+        dept: Department that was scraped
+        term: Term the department was scraped for
+        course_data: Parsed courses of the department, given by parse_all_courses
+
+    Returns:
+        A tuple of the courses whose grade summaries need to be refreshed, and the number
+        of sections saved
+    """
+    instructors, sections, meetings, courses = _flatten_course_data([course_data])
+
+    with transaction.atomic():
+        copy_models(Instructor, instructors, ignore_conflicts=True)
+
+        # Sections can move between departments, so replace any with the same ids too
+        section_ids = [section.id for section in sections]
+        queryset = Section.objects.filter(Q(term_code=term, subject=dept)
+                                          | Q(id__in=section_ids))
+        grades_to_resave = list(Grades.objects.filter(section_id__in=section_ids))
+        graded_courses = _graded_courses(queryset)
+        queryset.delete()
+
+        copy_models(Section, sections)
+        copy_models(Meeting, meetings)
+        copy_models(Grades, grades_to_resave)
+
+        Course.objects.filter(Q(term=term, dept=dept)
+                              | Q(id__in=[course.id for course in courses])).delete()
+        copy_models(Course, courses)
+
+    return (graded_courses, len(sections))
+
+def _delete_unscraped(depts_terms: List[Tuple[str, str]], terms: List[str],
+                      options) -> Set[Tuple[str, str]]:
+    """ Deletes the sections and courses of departments that weren't scraped in the
+        given terms, and of every other term if all terms were scraped. Departments that
+        were scraped but couldn't be retrieved keep their old sections and courses
+
+    Returns:
+        The courses whose grade summaries need to be refreshed
+    """
+    graded_courses = set()
+    for term in terms:
+        depts = [dept for dept, dept_term in depts_terms if str(dept_term) == str(term)]
+        sections = Section.objects.filter(term_code=term).exclude(subject__in=depts)
+        graded_courses.update(_graded_courses(sections))
+        sections.delete()
+        Course.objects.filter(term=term).exclude(dept__in=depts).delete()
+
+    if not (options['term'] or options['year'] or options['recent']):
+        sections = Section.objects.exclude(term_code__in=terms)
+        graded_courses.update(_graded_courses(sections))
+        sections.delete()
+        Course.objects.exclude(term__in=terms).delete()
+
+    return graded_courses
+
+def stream_course_data(depts_terms, terms: List[str], options) -> Set[str]: # pylint: disable=too-many-locals
+    """ Retrieves course data from Banner like get_course_data, but saves each
+        department with save_department as soon as it's retrieved, while the others are
+        still downloading. At most _STREAM_QUEUE_SIZE departments are kept in memory
+        waiting to be saved
+
+    Returns:
+        The terms that have any sections
+    """
+    depts_terms = list(depts_terms)
+    limiter = AdaptiveLimiter()
+    banner = BannerRequests()
+    loop = asyncio.get_event_loop()
+
+    # Departments are saved on another thread so downloading continues while saving
+    executor = ThreadPoolExecutor(max_workers=1)
+    parse_executor, parse = _create_parse_executor(options['parse_workers'])
+    queue = asyncio.Queue(maxsize=_STREAM_QUEUE_SIZE)
+    graded_courses = set()
+    terms_with_sections = set()
+
+    async def save_departments():
+        while True:
+            department = await queue.get()
+            if department is None:
+                return
+
+            dept, term, course_data = department
+            department_graded, num_sections = await loop.run_in_executor(
+                executor, save_department, dept, term, course_data
+            )
+            graded_courses.update(department_graded)
+            if num_sections:
+                terms_with_sections.add(term)
+
+    async def on_department(dept: str, term: str, course_data):
+        await queue.put((dept, term, course_data))
+
+    async def stream():
+        writer = asyncio.ensure_future(save_departments())
+        search = asyncio.ensure_future(
+            banner.search(depts_terms, limiter, parse, on_department=on_department,
+                          parse_executor=parse_executor)
+        )
+        try:
+            # The writer only finishes first if saving failed, in which case stop
+            # downloading rather than waiting for room in the queue forever
+            await asyncio.wait([writer, search], return_when=asyncio.FIRST_COMPLETED)
+            if writer.done():
+                writer.result()
+            await search
+            await queue.put(None)
+            await writer
+        finally:
+            search.cancel()
+            writer.cancel()
+
+    start = time.time()
+    try:
+        loop.run_until_complete(stream())
+    finally:
+        # Close the writer thread's database connection
+        executor.submit(connections.close_all).result()
+        executor.shutdown()
+        if parse_executor is not None:
+            parse_executor.shutdown()
+    print(f"Downloaded and saved {len(depts_terms)} departments in"
+          f" {time.time() - start:.2f} seconds")
+    print(f"Concurrency ended at {int(limiter.limit)} requests, peaked at"
+          f" {int(limiter.peak)}, and backed off {limiter.backoffs} times")
+
+    start = time.time()
+    with transaction.atomic():
+        graded_courses.update(_delete_unscraped(depts_terms, terms, options))
+        GradeSummary.objects.refresh(graded_courses)
+    print(f"Removed unscraped departments in {(time.time()-start):.2f} seconds")
+
+    return terms_with_sections
+
+def parse_enrollment(course_list, term: str, *_) -> List[Tuple[int, int, int]]:
+    """ Gets the (id, current_enrollment, max_enrollment) of each section in a
+        department. Passed to banner.search in place of parse_all_courses when only
+        refreshing enrollment, so no models are created
+    """
+    dept_name = course_list[0].get('subject', '') if course_list else ''
+    print(f'{dept_name} {term}: Scraped the enrollment of {len(course_list)} sections')
+
+    return [(int(course['id']), course['enrollment'], course['maximumEnrollment'])
+            for course in course_list]
+
+def save_enrollment(term: str, enrollments: List[Tuple[int, int, int]]) -> int:
+    """ Updates the enrollment of the term's sections with a single UPDATE statement.
+        Only rows whose enrollment changed are written, and sections that haven't been
+        scraped yet are skipped
+
+    Args:
+        term: Term the sections are in
+        enrollments: (id, current_enrollment, max_enrollment) of each section
+
+    Returns:
+        The number of sections whose enrollment changed
+    """
+    if not enrollments:
+        return 0
+
+    values = ', '.join(['(%s, %s, %s)'] * len(enrollments))
+    params = [value for enrollment in enrollments for value in enrollment]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {connection.ops.quote_name(Section._meta.db_table)} AS section'
+            ' SET current_enrollment = enrollment.current_enrollment,'
+            '     max_enrollment = enrollment.max_enrollment'
+            f' FROM (VALUES {values})'
+            '     AS enrollment (id, current_enrollment, max_enrollment)'
+            ' WHERE section.id = enrollment.id AND section.term_code = %s'
+            '     AND (section.current_enrollment, section.max_enrollment) IS DISTINCT'
+            '     FROM (enrollment.current_enrollment, enrollment.max_enrollment)',
+            params + [int(term)]
+        )
+        return cursor.rowcount
+
+def refresh_enrollment(depts_terms, terms: List[str]):
+    """ Retrieves just the enrollment of every section from Banner, saves it with
+        save_enrollment, and sets the terms' Term.enrollment_updated. Much cheaper than
+        a full scrape, so it can be run every few minutes
+
+        Departments that couldn't be retrieved are skipped, and their terms'
+        enrollment_updated isn't set, since their enrollment wasn't refreshed
+    """
+    depts_terms = list(depts_terms)
+    limiter = AdaptiveLimiter()
+    banner = BannerRequests()
+    loop = asyncio.get_event_loop()
+
+    start = time.time()
+    data_set = loop.run_until_complete(banner.search(depts_terms, limiter,
+                                                     parse_enrollment))
+    print(f"Downloaded the enrollment of {len(data_set)} departments in"
+          f" {time.time() - start:.2f} seconds")
+
+    enrollments = defaultdict(list)
+    incomplete_terms = set()
+    for (dept, term), department in zip(depts_terms, data_set):
+        if department is None:
+            print(f"Failed to retrieve the enrollment of {dept} {term}")
+            incomplete_terms.add(str(term))
+            continue
+
+        enrollments[str(term)].extend(department)
+
+    start = time.time()
+    with transaction.atomic():
+        changed = sum(save_enrollment(term, enrollments[term]) for term in terms)
+        refreshed = [term for term in terms if term not in incomplete_terms]
+        Term.objects.filter(code__in=refreshed).update(enrollment_updated=timezone.now())
+    print(f"Updated the enrollment of {changed} sections in"
+          f" {(time.time()-start):.2f} seconds")
+
 def save_terms(terms, courses, options):
     """ Creates terms objects to save """
+    _save_terms(terms, set(course.term for course in courses), options)
+
+def _save_terms(terms, terms_with_courses: Set[str], options):
+    """ Creates terms objects to save, for the terms in terms_with_courses """
 
     start = time.time()
     now = timezone.now() # use timezone.now() so Django doesn't complain about naive times
@@ -349,7 +781,6 @@ def save_terms(terms, courses, options):
             queryset = Term.objects.all()
 
         # Only save terms that actually have courses so that users don't see empty terms
-        terms_with_courses = set(course.term for course in courses)
         terms_to_save = [
             Term(code=term, last_updated=now) for term in terms
             if term in terms_with_courses
@@ -377,6 +808,32 @@ class Command(base.BaseCommand):
             '--recent', '-r', action='store_true',
             help="Scrapes the most recent semester(s) for all locations"
         )
+        parser.add_argument(
+            '--parse-workers', type=int,
+            help=("Parses departments in this many processes while the rest are "
+                  "downloading, rather than on the downloading thread")
+        )
+        save_args = parser.add_mutually_exclusive_group()
+        save_args.add_argument(
+            '--stream', action='store_true',
+            help=("Saves each department as soon as it's scraped, rather than saving "
+                  "everything at the end, so less memory is used")
+        )
+        save_args.add_argument(
+            '--publish', action='store_true',
+            help=("Loads the scraped models into staging tables, then swaps them in "
+                  "all at once, so the site can be used while scraping")
+        )
+        save_args.add_argument(
+            '--enrollment-only', action='store_true',
+            help=("Only updates the enrollment of sections that have already been "
+                  "scraped. Much faster than a full scrape")
+        )
+        save_args.add_argument(
+            '--incremental', '-i', action='store_true',
+            help=("Only inserts, updates, and deletes the sections, meetings, and "
+                  "courses that changed, rather than recreating all of them")
+        )
 
     def handle(self, *args, **options):
         depts_terms = []
@@ -394,8 +851,25 @@ class Command(base.BaseCommand):
 
         depts_terms = get_department_names(terms)
 
-        instructors, sections, meetings, courses = get_course_data(depts_terms)
-        save_models(instructors, sections, meetings, courses, terms, options)
-        save_terms(terms, courses, options)
+        if options['enrollment_only']:
+            refresh_enrollment(depts_terms, terms)
+            print(f"Finished refreshing enrollment in {time.time() - start_all:.2f}"
+                  " seconds")
+            return
+
+        if options['stream']:
+            terms_with_courses = stream_course_data(depts_terms, terms, options)
+            _save_terms(terms, terms_with_courses, options)
+        else:
+            instructors, sections, meetings, courses = get_course_data(
+                depts_terms, options['parse_workers']
+            )
+            if options['incremental']:
+                upsert_models(instructors, sections, meetings, courses, terms, options)
+            elif options['publish']:
+                publish_models(instructors, sections, meetings, courses, terms, options)
+            else:
+                save_models(instructors, sections, meetings, courses, terms, options)
+            save_terms(terms, courses, options)
 
         print(f"Finished scraping in {time.time() - start_all:.2f} seconds")
@@ -307,7 +307,7 @@ class Command(base.BaseCommand):
         )
 
         # Have to import here due to Django "App not found" error due to multiprocessing
-        from scraper.models import Grades
+        from scraper.models import Grades, GradeSummary
 
         # Save all of the models
         save_start = time.time()
@@ -318,6 +318,13 @@ class Command(base.BaseCommand):
         elapsed_time = save_end - save_start
         print(f"Saving {len(scraped_grades)} grades took {elapsed_time:.2f} sec")
 
+        # Recompute the summaries of every course that has new grades
+        summary_start = time.time()
+        GradeSummary.objects.refresh(set((grade.section.subject, grade.section.course_num)
+                                         for grade in scraped_grades))
+        elapsed_time = time.time() - summary_start
+        print(f"Refreshing grade summaries took {elapsed_time:.2f} sec")
+
         end = time.time()
         elapsed_time = end - start
         print(f"Grade scraping took {elapsed_time:.2f} sec")
@@ -0,0 +1,188 @@
+""" Saves models with Postgres' COPY FROM STDIN, which is much faster than the large
+    INSERT statements bulk_create makes. Rows are sent in Postgres' text format in
+    batches, so only one batch is kept in memory as text at a time.
+
+    Models can also be copied into a temporary staging table with stage_models, then
+    moved into their real table with publish_staged_models, which only takes a couple
+    of set-based statements.
+"""
+
+from io import StringIO
+from typing import List, Type
+from django.db import connection, transaction
+from django.db.models import CASCADE, AutoField, Model, QuerySet
+from scraper.management.commands.utils.scraped_records import to_models
+
+# Number of rows sent by each COPY statement
+_COPY_BATCH_SIZE = 50_000
+
+# Characters that have to be escaped in COPY's text format
+_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+def _array_element(value) -> str:
+    """ Converts an element of a list to the format of a Postgres array literal """
+    if value is None:
+        return 'NULL'
+    if isinstance(value, list):
+        return _array_literal(value)
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+
+    escaped = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{escaped}"'
+
+def _array_literal(values: list) -> str:
+    """ Converts a list (from an ArrayField) to a Postgres array literal """
+    return '{' + ','.join(_array_element(value) for value in values) + '}'
+
+def _copy_value(value) -> str:
+    """ Converts a database value to COPY's text format """
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, list):
+        value = _array_literal(value)
+
+    return str(value).translate(_ESCAPES)
+
+def _copy_fields(model: Type[Model], objects: List):
+    """ Gets the fields to copy. Auto-incrementing primary keys are left out if they
+        aren't set, so the database generates them
+    """
+    fields = model._meta.concrete_fields
+    pk = model._meta.pk
+    if isinstance(pk, AutoField) and objects and getattr(objects[0], pk.attname) is None:
+        fields = [field for field in fields if not field.primary_key]
+    return fields
+
+def _copy(cursor, table: str, fields, objects: List):
+    """ Sends objects to the given table with COPY, _COPY_BATCH_SIZE at a time """
+    qn = connection.ops.quote_name
+    sql = (f'COPY {qn(table)} ({", ".join(qn(field.column) for field in fields)})'
+           ' FROM STDIN')
+
+    for i in range(0, len(objects), _COPY_BATCH_SIZE):
+        rows = StringIO()
+        for obj in objects[i:i + _COPY_BATCH_SIZE]:
+            # Converts values the same way bulk_create does
+            values = (field.get_db_prep_save(field.pre_save(obj, True), connection)
+                      for field in fields)
+            rows.write('\t'.join(_copy_value(value) for value in values))
+            rows.write('\n')
+
+        rows.seek(0)
+        cursor.copy_expert(sql, rows)
+
+def _staging_table(model: Type[Model]) -> str:
+    """ Gets the name of the staging table of model """
+    return f'{model._meta.db_table}_staging'
+
+def stage_models(model: Type[Model], objects: List):
+    """ Copies objects into a new temporary staging table with the same columns as
+        model's table. The table lasts until drop_staged_models is called or the
+        connection is closed, and isn't written to the WAL
+    """
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE TEMPORARY TABLE {qn(_staging_table(model))}'
+                       f' (LIKE {qn(model._meta.db_table)} INCLUDING DEFAULTS)')
+        _copy(cursor, _staging_table(model), _copy_fields(model, objects), objects)
+
+def drop_staged_models(model: Type[Model]):
+    """ Drops the staging table of model, if it exists """
+    with connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS'
+                       f' {connection.ops.quote_name(_staging_table(model))}')
+
+def _delete_rows(cursor, model: Type[Model], where: str, params: list):
+    """ Deletes the rows of model's table matching the where clause with a single
+        DELETE statement. Rows that depend on them through a CASCADE foreign key are
+        deleted first the same way, like QuerySet.delete does, but without fetching any
+        of them
+    """
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    for relation in model._meta.related_objects:
+        if relation.on_delete is not CASCADE:
+            continue
+
+        target_column = qn(relation.field.target_field.column)
+        _delete_rows(cursor, relation.related_model,
+                     f'{qn(relation.field.column)} IN'
+                     f' (SELECT {table}.{target_column} FROM {table} WHERE {where})',
+                     params)
+
+    cursor.execute(f'DELETE FROM {table} WHERE {where}', params)
+
+def publish_staged_models(model: Type[Model], queryset: QuerySet):
+    """ Makes the rows of queryset match the rows of model's staging table. Rows that
+        aren't staged are deleted (along with the rows depending on them), and staged
+        rows are inserted, or update the existing rows with their id if any of their
+        values changed. Existing rows stay in place, so rows referring to them are kept
+
+        This runs inside the transaction that swaps in a scrape, so it only makes one
+        set-based statement for each table instead of loading the rows it deletes
+    """
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    staging = qn(_staging_table(model))
+    pk_column = qn(model._meta.pk.column)
+    columns = [qn(field.column) for field in model._meta.concrete_fields]
+    updated = [column for column in columns if column != pk_column]
+
+    queryset_sql, params = queryset.values('pk').query.sql_with_params()
+    unstaged = (f'{table}.{pk_column} IN ({queryset_sql}) AND NOT EXISTS'
+                f' (SELECT 1 FROM {staging}'
+                f' WHERE {staging}.{pk_column} = {table}.{pk_column})')
+    with connection.cursor() as cursor:
+        _delete_rows(cursor, model, unstaged, list(params))
+        cursor.execute(
+            f'INSERT INTO {table} ({", ".join(columns)})'
+            f' SELECT {", ".join(columns)} FROM {staging}'
+            f' ON CONFLICT ({pk_column}) DO UPDATE'
+            f' SET {", ".join(f"{column} = EXCLUDED.{column}" for column in updated)}'
+            # Skips rows that didn't change, so they aren't rewritten
+            f' WHERE ({", ".join(f"{table}.{column}" for column in updated)})'
+            f' IS DISTINCT FROM ({", ".join(f"EXCLUDED.{column}" for column in updated)})'
+        )
+
+def copy_models(model: Type[Model], objects: List, ignore_conflicts=False):
+    """ Saves objects like model.objects.bulk_create, but using COPY on Postgres.
+        Falls back to bulk_create on other databases
+
+    Args:
+        model: Model of the objects
+        objects: Model instances or records (see scraped_records) to save. Either all
+                 of them or none of them must have their primary keys set
+        ignore_conflicts: Whether to skip objects that already exist instead of
+                          failing. These are copied into a temporary table first,
+                          then inserted from it with ON CONFLICT DO NOTHING
+    """
+    if connection.vendor != 'postgresql':
+        model.objects.bulk_create(to_models(model, objects), batch_size=_COPY_BATCH_SIZE,
+                                  ignore_conflicts=ignore_conflicts)
+        return
+
+    if not objects:
+        return
+
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    fields = _copy_fields(model, objects)
+
+    if not ignore_conflicts:
+        with transaction.atomic(), connection.cursor() as cursor:
+            _copy(cursor, model._meta.db_table, fields, objects)
+        return
+
+    columns = ', '.join(qn(field.column) for field in fields)
+    staging = qn(_staging_table(model))
+    try:
+        with transaction.atomic():
+            stage_models(model, objects)
+            with connection.cursor() as cursor:
+                cursor.execute(f'INSERT INTO {table} ({columns}) SELECT {columns}'
+                               f' FROM {staging} ON CONFLICT DO NOTHING')
+    finally:
+        drop_staged_models(model)
@@ -0,0 +1,68 @@
+""" Lightweight records of scraped rows, which scrape_courses' parse functions create
+    instead of model instances. Model instances take several times as much memory
+    (each has a __dict__ and a ModelState), and a full scrape holds hundreds of
+    thousands of them until they're saved.
+
+    Fields are named after the attnames of the model's fields (such as instructor_id
+    rather than instructor), so copy_models can save records the same way as model
+    instances. to_models converts them for when model instances are needed.
+"""
+
+import datetime
+from typing import Iterable, List, NamedTuple, Optional, Tuple, Type
+from django.db.models import Model
+
+class ScrapedInstructor(NamedTuple):
+    """ An Instructor that was scraped """
+    id: str
+    email_address: Optional[str]
+
+class ScrapedCourse(NamedTuple):
+    """ A Course that was scraped """
+    id: str
+    dept: str
+    course_num: str
+    title: str
+    credit_hours: Optional[int]
+    term: str
+
+class ScrapedSection(NamedTuple):
+    """ A Section that was scraped """
+    id: int
+    subject: str
+    course_num: str
+    section_num: str
+    term_code: str
+    crn: int
+    min_credits: int
+    max_credits: Optional[int]
+    honors: bool
+    remote: bool
+    asynchronous: bool
+    mcallen: bool
+    max_enrollment: int
+    current_enrollment: int
+    instructor_id: Optional[str]
+    instructional_method: str
+
+class ScrapedMeeting(NamedTuple):
+    """ A Meeting that was scraped """
+    id: int
+    building: Optional[str]
+    room: Optional[str]
+    meeting_days: List[bool]
+    start_time: Optional[datetime.time]
+    end_time: Optional[datetime.time]
+    meeting_type: str
+    section_id: int
+
+# Lists of each kind of record, as given by scraping
+ScrapedModels = Tuple[List[ScrapedInstructor], List[ScrapedSection], List[ScrapedMeeting],
+                      List[ScrapedCourse]]
+
+def to_models(model: Type[Model], objects: Iterable) -> List[Model]:
+    """ Converts records of the given model to model instances. Objects that are
+        already model instances are kept as is
+    """
+    return [obj if isinstance(obj, Model) else model(**obj._asdict())
+            for obj in objects]
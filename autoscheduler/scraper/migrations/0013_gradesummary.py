@@ -0,0 +1,65 @@
+# Generated by Django 2.2.28 on 2026-10-18 19:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+_LETTERS = ['A', 'B', 'C', 'D', 'F', 'I', 'S', 'U', 'Q', 'X']
+
+def populate_grade_summaries(apps, schema_editor):
+    """ Summarizes all of the grades that have already been scraped """
+    Grades = apps.get_model('scraper', 'Grades')
+    GradeSummary = apps.get_model('scraper', 'GradeSummary')
+
+    performances = (
+        Grades.objects
+        .values('section__subject', 'section__course_num', 'section__instructor',
+                'section__honors')
+        .annotate(total_gpa=models.Avg('gpa'), total_count=models.Count('gpa'),
+                  **{f'total_{letter}': models.Sum(letter) for letter in _LETTERS})
+    )
+    GradeSummary.objects.bulk_create((
+        GradeSummary(subject=performance['section__subject'],
+                     course_num=performance['section__course_num'],
+                     instructor_id=performance['section__instructor'],
+                     honors=performance['section__honors'],
+                     gpa=performance['total_gpa'], count=performance['total_count'],
+                     **{letter: performance[f'total_{letter}'] for letter in _LETTERS})
+        for performance in performances.iterator()
+    ), batch_size=50_000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0012_merge_20211116_1843'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=4)),
+                ('course_num', models.CharField(max_length=5)),
+                ('honors', models.BooleanField(null=True)),
+                ('gpa', models.FloatField()),
+                ('A', models.IntegerField()),
+                ('B', models.IntegerField()),
+                ('C', models.IntegerField()),
+                ('D', models.IntegerField()),
+                ('F', models.IntegerField()),
+                ('I', models.IntegerField()),
+                ('S', models.IntegerField()),
+                ('U', models.IntegerField()),
+                ('Q', models.IntegerField()),
+                ('X', models.IntegerField()),
+                ('count', models.IntegerField()),
+                ('instructor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='scraper.Instructor')),
+            ],
+            options={
+                'db_table': 'grade_summaries',
+                'unique_together': {('subject', 'course_num', 'instructor', 'honors')},
+            },
+        ),
+        migrations.RunPython(populate_grade_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 19:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0013_gradesummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='term',
+            name='enrollment_updated',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
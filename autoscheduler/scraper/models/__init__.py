@@ -2,7 +2,8 @@ from .department import Department
 from .instructor import Instructor
 from .course import Course
 from .section import Section, Meeting
-from .grades import Grades
+from .grades import Grades, GradeSummary
 from .term import Term
 
-__all__ = ["Department", "Instructor", "Course", "Section", "Meeting", "Grades", "Term"]
+__all__ = ["Department", "Instructor", "Course", "Section", "Meeting", "Grades",
+           "GradeSummary", "Term"]
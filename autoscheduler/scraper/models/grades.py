@@ -1,7 +1,37 @@
 """ Heavily based off of Good Bull Schedules """
 
-from typing import Dict, Union
-from django.db import models
+from typing import Dict, Iterable, Optional, Tuple, Union
+from django.db import models, transaction
+
+# (subject, course_num, instructor id, honors) of an instructor's performance
+PerformanceKey = Tuple[str, str, Optional[str], Optional[bool]]
+
+def _performance_key(section) -> PerformanceKey:
+    """ Gets the key of the performance of a section's instructor in its course """
+    return (section.subject, section.course_num, section.instructor_id, section.honors)
+
+def _performance_aggregates() -> Dict[str, models.Aggregate]:
+    """ Creates the aggregates used by instructor_performance """
+    return {
+        "gpa": models.Avg("gpa"), # Averages all of the GPA's together
+
+        # We want a sum so we can more-easily calculate the percentage
+        # Sums the count of each grade
+        "A": models.Sum("A"),
+        "B": models.Sum("B"),
+        "C": models.Sum("C"),
+        "D": models.Sum("D"),
+        "F": models.Sum("F"),
+        "I": models.Sum("I"),
+        "S": models.Sum("S"),
+        "U": models.Sum("U"),
+        "Q": models.Sum("Q"),
+        "X": models.Sum("X"),
+
+        # Could really count any of the fields, since it doesn't count only unique
+        # values
+        "count": models.Count("gpa"),
+    }
 
 class GradeManager(models.Manager):
     """ Connects to the Grades models so we can call
@@ -26,28 +56,52 @@ class GradeManager(models.Manager):
                 section__course_num=course_num,
                 section__instructor=instructor,
                 section__honors=honors,
-            ).aggregate(
-                gpa=models.Avg("gpa"), # Averages all of the GPA's together
-
-                # We want a sum so we can more-easily calculate the percentage
-                # Sums the count of each grade
-                A=models.Sum("A"),
-                B=models.Sum("B"),
-                C=models.Sum("C"),
-                D=models.Sum("D"),
-                F=models.Sum("F"),
-                I=models.Sum("I"),
-                S=models.Sum("S"),
-                U=models.Sum("U"),
-                Q=models.Sum("Q"),
-                X=models.Sum("X"),
-
-                # Could really count any of the fields, since it doesn't count only unique
-                # values
-                count=models.Count("gpa"),
-            )
+            ).aggregate(**_performance_aggregates())
+        )
+
+    def course_performances(
+            self, courses: Optional[Iterable[Tuple[str, str]]] = None,
+    ) -> Dict[PerformanceKey, Dict[str, Union[int, float]]]:
+        """ Gets instructor_performance for every instructor & honors combination of the
+            given courses in a single grouped query
+
+            Args:
+                courses: (subject, course_num) pairs to get performances for, or None for
+                         all courses
+
+            Returns a dictionary mapping (subject, course_num, instructor id, honors) to
+            the same dictionary instructor_performance returns. Since courses are
+            filtered by subject and course number separately, this may also include
+            other courses made up of the same subjects and course numbers
+        """
+
+        queryset = self.all()
+        if courses is not None:
+            courses = list(courses)
+            if not courses:
+                return {}
+            subjects, course_nums = zip(*courses)
+            queryset = queryset.filter(section__subject__in=set(subjects),
+                                       section__course_num__in=set(course_nums))
+
+        aggregates = _performance_aggregates()
+        performances = (
+            queryset
+            .values("section__subject", "section__course_num", "section__instructor",
+                    "section__honors")
+            # Annotations can't have the same names as the model's fields, so prefix them
+            .annotate(**{f"total_{name}": aggregate
+                         for name, aggregate in aggregates.items()})
         )
 
+        return {
+            (performance["section__subject"], performance["section__course_num"],
+             performance["section__instructor"], performance["section__honors"]):
+                {name: performance[f"total_{name}"] for name in aggregates}
+            for performance in performances
+        }
+
+
 class Grades(models.Model):
     """ Represents a collection of the grade distribution values for a
         specific section
@@ -78,3 +132,116 @@ class Grades(models.Model):
 
     class Meta:
         db_table = "grades"
+
+class GradeSummaryManager(models.Manager):
+    """ Connects to the GradeSummary model so we can call
+        GradeSummary.objects.performance
+    """
+
+    def performance(
+            self, dept: str, course_num: str, instructor: str, honors: bool
+    ) -> Dict[str, Union[int, float]]:
+        """ Gets the same dictionary as Grades.objects.instructor_performance, but from
+            the precomputed summaries
+        """
+
+        summary = self.filter(subject=dept, course_num=course_num, instructor=instructor,
+                              honors=honors).first()
+        if summary is None:
+            # Same as what instructor_performance's aggregate gives without any grades
+            return dict({name: None for name in _performance_aggregates()}, count=0)
+
+        return summary.performance()
+
+    def performances(
+            self, sections: Iterable["Section"]
+    ) -> Dict[PerformanceKey, Dict[str, Union[int, float]]]:
+        """ Gets the performance of every given section's instructor, course, and
+            honors in a single query, so serializing many sections doesn't take a query
+            per section
+
+            Returns a dictionary mapping (subject, course_num, instructor id, honors) to
+            the same dictionary Grades.objects.instructor_performance returns.
+            Combinations without any grades aren't included
+        """
+
+        keys = set(_performance_key(section) for section in sections
+                   if section.instructor_id is not None)
+        if not keys:
+            return {}
+
+        subjects, course_nums, instructors, _ = zip(*keys)
+        summaries = self.filter(subject__in=set(subjects),
+                                course_num__in=set(course_nums),
+                                instructor__in=set(instructors))
+        return {_performance_key(summary): summary.performance()
+                for summary in summaries if _performance_key(summary) in keys}
+
+    def refresh(self, courses: Optional[Iterable[Tuple[str, str]]] = None):
+        """ Recomputes the summaries of the given courses from their grades. This should
+            be called whenever grades or the sections they're for change
+
+            Args:
+                courses: (subject, course_num) pairs of the courses to recompute, or None
+                         to recompute every summary
+        """
+
+        if courses is not None:
+            courses = list(courses)
+            if not courses:
+                return
+
+        performances = Grades.objects.course_performances(courses)
+        summaries = [
+            GradeSummary(subject=subject, course_num=course_num,
+                         instructor_id=instructor, honors=honors, **performance)
+            for (subject, course_num, instructor, honors), performance
+            in performances.items()
+        ]
+
+        queryset = self.all()
+        if courses is not None:
+            # Uses the same filter as course_performances, so every summary that's
+            # deleted is recreated if it still has grades
+            subjects, course_nums = zip(*courses)
+            queryset = queryset.filter(subject__in=set(subjects),
+                                       course_num__in=set(course_nums))
+
+        with transaction.atomic():
+            queryset.delete()
+            self.bulk_create(summaries, batch_size=50_000)
+
+class GradeSummary(models.Model):
+    """ The grades of every section an instructor has taught for a course, summed up
+        so Grades.objects.instructor_performance doesn't have to be computed on every
+        request. Rebuilt by GradeSummary.objects.refresh when grades are scraped
+    """
+
+    subject = models.CharField(max_length=4)
+    course_num = models.CharField(max_length=5)
+    instructor = models.ForeignKey("Instructor", on_delete=models.CASCADE, null=True)
+    honors = models.BooleanField(null=True)
+
+    objects = GradeSummaryManager()
+
+    # Same as the values given by Grades.objects.instructor_performance
+    gpa = models.FloatField()
+    A = models.IntegerField()
+    B = models.IntegerField()
+    C = models.IntegerField()
+    D = models.IntegerField()
+    F = models.IntegerField()
+    I = models.IntegerField()
+    S = models.IntegerField()
+    U = models.IntegerField()
+    Q = models.IntegerField()
+    X = models.IntegerField()
+    count = models.IntegerField()
+
+    def performance(self) -> Dict[str, Union[int, float]]:
+        """ Converts this to the dictionary instructor_performance gives """
+        return {name: getattr(self, name) for name in _performance_aggregates()}
+
+    class Meta:
+        db_table = "grade_summaries"
+        unique_together = [("subject", "course_num", "instructor", "honors")]
@@ -4,6 +4,9 @@ class Term(models.Model):
     """ Represents a term """
     code = models.IntegerField(primary_key=True)
     last_updated = models.DateTimeField()
+    # When the enrollment of the term's sections was last refreshed by
+    # scrape_courses --enrollment-only, if it has been since last_updated
+    enrollment_updated = models.DateTimeField(null=True)
 
     class Meta:
         db_table = "terms"
@@ -0,0 +1,236 @@
+""" In-process cache of each section's JSON, as SectionSerializer serializes it.
+
+    /api/sections and /scheduler/generate return serialized sections, and running
+    SectionSerializer on each of them takes up most of those requests' time, even
+    though sections only change when scrape_courses runs. Instead, each section's JSON
+    is cached as a fragment the first time it's serialized, and responses are put
+    together by joining the cached fragments. Grades are left out of the fragments and
+    added per response, since they change whenever scrape_grades runs instead, and so
+    is enrollment, which is refreshed much more often than the rest of the section.
+
+    Fragments are stamped with their term's Term.last_updated (using TermCache), so
+    they're reserialized once the term is rescraped, and the least recently used ones
+    are evicted once their total length is over _MAX_SIZE. The first time a process
+    sees a new last_updated of one of the terms being registered for, it serializes
+    the rest of the term's sections on a background thread, so later requests find
+    them cached without having to wait. Older terms are only cached as they're
+    requested, and refreshing just the enrollment doesn't change the stamp, so it
+    doesn't cause any sections to be reserialized.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+import json
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence
+from django.db import connections
+from django.db.models import prefetch_related_objects
+from django.http import HttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+from scraper.management.commands.utils.scraper_utils import get_recent_terms
+from scraper.models import GradeSummary, Section
+from scraper.serializers import SectionSerializer
+from scraper.term_cache import TermCache
+
+# Max total length of the cached fragments, in characters. Each section takes about
+# 1 KB, so this fits every section of a few terms
+_MAX_SIZE = 64 * 1024 * 1024
+
+# Number of sections serialized at a time when warming a term
+_WARM_BATCH_SIZE = 2000
+
+# Fields that are left out of the fragments and added to them per response
+_UNCACHED_FIELDS = ['current_enrollment', 'max_enrollment', 'grades']
+
+def dumps(data) -> str:
+    """ Encodes data as JSON the same way as DRF's JSONRenderer """
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+def json_array(items: Iterable[str]) -> str:
+    """ Joins already encoded JSON values into a JSON array """
+    return f'[{",".join(items)}]'
+
+def json_object(**fields: str) -> str:
+    """ Joins already encoded JSON values into a JSON object with the given keys """
+    return '{' + ','.join(f'{dumps(key)}:{value}' for key, value in fields.items()) + '}'
+
+def json_response(content: str) -> HttpResponse:
+    """ Creates a response containing already encoded JSON """
+    return HttpResponse(content, content_type='application/json')
+
+class FragmentCache:
+    """ Least recently used cache of strings, bounded by their total length. Each
+        string is stored with a stamp, and is only returned if it's given the same one
+    """
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._size = 0
+        # Maps keys to (stamp, fragment) pairs, from least to most recently used
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, stamp) -> Optional[str]:
+        """ Returns the fragment for key, or None if it isn't cached with this stamp """
+        with self._lock:
+            entry = self._fragments.get(key)
+            if entry is None or entry[0] is not stamp:
+                return None
+
+            self._fragments.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, stamp, fragment: str):
+        """ Caches fragment for key, evicting the least recently used fragments if the
+            cache is too large
+        """
+        with self._lock:
+            old = self._fragments.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+
+            self._fragments[key] = (stamp, fragment)
+            self._size += len(fragment)
+            while self._size > self._max_size:
+                _, (_, evicted) = self._fragments.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        """ Removes all cached fragments """
+        with self._lock:
+            self._fragments.clear()
+            self._size = 0
+
+# Terms that this process is warming, so that each one is only warmed by one thread
+_WARMING = set()
+_WARMING_LOCK = threading.Lock()
+
+def _create_stamp(term: int) -> object:
+    """ Creates the stamp of a term that was just (re)scraped, and starts warming it if
+        it's one of the terms being registered for and isn't already being warmed
+    """
+    stamp = object()
+    if str(term) in get_recent_terms(datetime.now()):
+        with _WARMING_LOCK:
+            start = term not in _WARMING
+            _WARMING.add(term)
+        if start:
+            thread = threading.Thread(target=_warm_in_background, args=(term,),
+                                      daemon=True)
+            thread.start()
+    return stamp
+
+# Maps each term to an object that's replaced whenever the term is rescraped, which
+# fragments are stamped with
+_TERM_STAMPS = TermCache(_create_stamp)
+
+_FRAGMENTS = FragmentCache(_MAX_SIZE)
+
+def _serialize(sections: Sequence[Section]) -> Dict[int, str]:
+    """ Serializes the given sections without their _UNCACHED_FIELDS
+
+    Returns:
+        A dict mapping each section's id to its JSON, without the closing brace so
+        the uncached fields can be added on
+    """
+    prefetch_related_objects(sections, 'meetings')
+    data = SectionSerializer(sections, many=True, context={'skip_grades': True}).data
+
+    fragments = {}
+    for section in data:
+        for field in _UNCACHED_FIELDS:
+            del section[field]
+        fragments[section['id']] = dumps(section)[:-1]
+    return fragments
+
+def _get_fragments(sections: Sequence[Section]) -> Dict[int, str]:
+    """ Gets the cached fragments of the given sections, serializing and caching the
+        ones that aren't cached yet
+    """
+    stamps = {term: _TERM_STAMPS.get(term)
+              for term in set(section.term_code for section in sections)}
+
+    fragments = {}
+    missing = {}
+    for section in sections:
+        stamp = stamps[section.term_code]
+        # Sections of terms without a Term entry aren't cached (see TermCache)
+        fragment = None if stamp is None else _FRAGMENTS.get(section.id, stamp)
+        if fragment is None:
+            missing[section.id] = section
+        else:
+            fragments[section.id] = fragment
+
+    if missing:
+        serialized = _serialize(list(missing.values()))
+        for section_id, fragment in serialized.items():
+            stamp = stamps[missing[section_id].term_code]
+            if stamp is not None:
+                _FRAGMENTS.set(section_id, stamp, fragment)
+        fragments.update(serialized)
+
+    return fragments
+
+def get_sections_json(sections: Sequence[Section]) -> List[str]:
+    """ Gets the JSON of each of the given sections, including their grades, with the
+        same fields SectionSerializer gives
+
+    Args:
+        sections: Sections to get the JSON of, with their instructors selected
+                  (select_related). Their meetings are only fetched if they aren't cached
+
+    Returns:
+        A list containing the JSON of each section, in the same order as sections
+    """
+    fragments = _get_fragments(sections)
+    grades = GradeSummary.objects.performances(sections)
+
+    def section_json(section):
+        key = (section.subject, section.course_num, section.instructor_id, section.honors)
+        # Closes the fragment after adding the uncached fields
+        return (f'{fragments[section.id]},'
+                f'"current_enrollment":{dumps(section.current_enrollment)},'
+                f'"max_enrollment":{dumps(section.max_enrollment)},'
+                f'"grades":{dumps(grades.get(key))}}}')
+
+    return [section_json(section) for section in sections]
+
+def _warm_term(term: int, stamp: object):
+    """ Serializes and caches every section of the given term that isn't cached with
+        stamp yet, _WARM_BATCH_SIZE at a time. Stops early if the term is rescraped
+        again, since the fragments would be outdated
+    """
+    section_ids = list(Section.objects.filter(term_code=term)
+                       .order_by('id').values_list('id', flat=True))
+    for i in range(0, len(section_ids), _WARM_BATCH_SIZE):
+        if _TERM_STAMPS.get(term) is not stamp:
+            return
+
+        batch = [section_id for section_id in section_ids[i:i + _WARM_BATCH_SIZE]
+                 if _FRAGMENTS.get(section_id, stamp) is None]
+        sections = list(Section.objects.filter(id__in=batch)
+                        .select_related('instructor'))
+        for section_id, fragment in _serialize(sections).items():
+            _FRAGMENTS.set(section_id, stamp, fragment)
+
+def _warm_in_background(term: int):
+    """ Runs _warm_term on a background thread, which has its own database connection.
+        Warms the term again if it's rescraped while it's being warmed, since
+        _create_stamp doesn't start another thread for it
+    """
+    try:
+        stamp = None
+        while True:
+            latest = _TERM_STAMPS.get(term)
+            if latest is None or latest is stamp:
+                break
+            stamp = latest
+            _warm_term(term, stamp)
+    finally:
+        with _WARMING_LOCK:
+            _WARMING.discard(term)
+        connections.close_all()
+
+def clear_cache():
+    """ Removes all cached fragments """
+    _FRAGMENTS.clear()
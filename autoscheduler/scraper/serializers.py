@@ -1,6 +1,6 @@
 from datetime import time
 from rest_framework import serializers
-from scraper.models import Course, Section, Grades, Term
+from scraper.models import Course, Section, GradeSummary, Term
 
 def format_time(time_obj: time) -> str:
     """ Formats a time object to a string HH:MM, for use with section serializer """
@@ -54,7 +54,7 @@ class SectionSerializer(serializers.ModelSerializer):
         if skip_grades:
             return None
 
-        grades = Grades.objects.instructor_performance(
+        grades = GradeSummary.objects.performance(
             section.subject,
             section.course_num,
             section.instructor,
@@ -0,0 +1,68 @@
+""" Per-process caches for data derived from a term's courses and sections.
+
+    Course data only changes when scrape_courses runs, which sets the term's
+    Term.last_updated. Cached data is stamped with last_updated and rebuilt the first
+    time it's used after the term is rescraped, so every process picks up new data
+    without needing to be notified. Caches of data that includes sections' enrollment
+    are also stamped with Term.enrollment_updated, which is set whenever just the
+    enrollment is refreshed.
+
+    Checking the stamp takes a query, so caches that are used very often can be given
+    a ttl to only check it that often, at the cost of picking up new data that much
+    later.
+"""
+
+import threading
+from time import monotonic
+from typing import Any, Callable, Optional
+from scraper.models import Term
+
+class TermCache:
+    """ Caches a value for each term, creating it with factory(term) the first time
+        it's used after the term was (re)scraped, or also after its enrollment was
+        refreshed if include_enrollment is set. If ttl is set, a term's stamp is only
+        checked again once it's been ttl seconds since it was last checked.
+
+        Terms without a Term entry are never cached, since there's no way of knowing
+        when their data changes, so get returns None for them.
+    """
+
+    def __init__(self, factory: Callable[[int], Any], include_enrollment=False,
+                 ttl: float = 0):
+        self._factory = factory
+        self._stamp_fields = ['last_updated']
+        if include_enrollment:
+            self._stamp_fields.append('enrollment_updated')
+        self._ttl = ttl
+        # Maps term codes to (stamp, value, time the stamp was checked) tuples
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, term: str) -> Optional[Any]:
+        """ Returns the cached value for the given term, or None if it can't be cached """
+        term = int(term)
+        checked = monotonic()
+        if self._ttl:
+            entry = self._entries.get(term)
+            if entry is not None and checked - entry[2] < self._ttl:
+                return entry[1]
+
+        stamp = (Term.objects.filter(code=term)
+                 .values_list(*self._stamp_fields).first())
+        if stamp is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(term)
+            if entry is None or entry[0] != stamp:
+                entry = (stamp, self._factory(term), checked)
+            else:
+                entry = (stamp, entry[1], checked)
+            self._entries[term] = entry
+
+        return entry[1]
+
+    def clear(self):
+        """ Removes all cached values """
+        with self._lock:
+            self._entries.clear()
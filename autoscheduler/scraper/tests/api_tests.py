@@ -1,7 +1,11 @@
 from datetime import time, datetime
+from unittest.mock import patch
 from django.utils import timezone
 from rest_framework.test import APITestCase, APIClient
-from scraper.models import Course, Instructor, Meeting, Section, Grades, Term
+from scraper.models import (
+    Course, Instructor, Meeting, Section, Grades, GradeSummary, Term,
+)
+from scraper.section_json_cache import clear_cache
 from scraper.serializers import (CourseSerializer, SectionSerializer, TermSerializer,
                                  CourseSearchSerializer, season_num_to_string,
                                  campus_num_to_string, format_time)
@@ -9,6 +13,12 @@ from scraper.serializers import (CourseSerializer, SectionSerializer, TermSerial
 
 class APITests(APITestCase): #pylint: disable=too-many-public-methods
     """ Tests API functionality """
+    def setUp(self):
+        # Don't warm the section JSON cache on background threads
+        warm_patch = patch('scraper.section_json_cache._warm_in_background')
+        warm_patch.start()
+        self.addCleanup(warm_patch.stop)
+
     @classmethod
     def setUpTestData(cls):
         cls.client = APIClient()
@@ -103,6 +113,8 @@ class APITests(APITestCase): #pylint: disable=too-many-public-methods
         Section.objects.bulk_create(cls.sections)
         Meeting.objects.bulk_create(cls.meetings)
         Grades.objects.bulk_create(cls.grades)
+        # Summaries are recomputed whenever grades are scraped
+        GradeSummary.objects.refresh()
 
         # Convert INSTRUCTIONAL_METHOD_CHOICES to dict
         cls.instructional_methods = dict(Section.INSTRUCTIONAL_METHOD_CHOICES)
@@ -491,6 +503,26 @@ class APITests(APITestCase): #pylint: disable=too-many-public-methods
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), expected)
 
+    def test_api_sections_gets_grades_in_one_query(self):
+        """ Tests that /api/sections gets the grades for all of its sections together,
+            rather than making a query per section, and only gets meetings of sections
+            that aren't cached
+        """
+        # Arrange
+        Term(code='201931', last_updated=timezone.now()).save()
+        clear_cache()
+        data = {'dept': 'CSCE', 'course_num': 310, 'term': '201931'}
+
+        # Act + Assert
+        # One query each for the term, the sections, their meetings, and their grades
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/sections', data=data)
+        self.assertEqual(response.status_code, 200)
+        # Meetings aren't needed once the sections are cached
+        with self.assertNumQueries(3):
+            cached_response = self.client.get('/api/sections', data=data)
+        self.assertEqual(cached_response.json(), response.json())
+
     def test_api_course_search_gives_correct_results_cs(self):
         """ Tests that /api/course/search filters courses that don't match the entire
             search term
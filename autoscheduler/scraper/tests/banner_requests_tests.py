@@ -1,9 +1,11 @@
 import unittest
 
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
 from aiohttp import ClientSession
 from scraper.banner_requests import generate_session_id, get_term_code
-from scraper.banner_requests import Semester, Location, BannerRequests
+from scraper.banner_requests import Semester, Location, BannerRequests, AdaptiveLimiter
 from .aio_test_case import AioTestCase
 
 # A lot of these funcitons have to be self in order to be part of the TestCase and thus,
@@ -61,6 +63,287 @@ class GetTermCodeTests(unittest.TestCase):
             assert True
             return
 
+class AdaptiveLimiterTests(AioTestCase):
+    """ Tests AdaptiveLimiter from banner_requests.py """
+
+    async def test_request_increases_limit_after_healthy_requests(self):
+        """ Tests that the limit grows by about 1 after a limit's worth of successful
+            requests, up to the maximum
+        """
+
+        # Arrange
+        limiter = AdaptiveLimiter(initial=4, maximum=5)
+
+        # Act
+        for _ in range(4):
+            async with limiter.request():
+                pass
+        grown = limiter.limit
+        for _ in range(20):
+            async with limiter.request():
+                pass
+
+        # Assert
+        self.assertGreater(grown, 4.8)
+        self.assertEqual(limiter.limit, 5)
+        self.assertEqual(limiter.peak, 5)
+
+    async def test_request_backs_off_once_per_overload(self):
+        """ Tests that errors and slow requests halve the limit, but that requests
+            started before the last backoff don't halve it again
+        """
+
+        # Arrange
+        limiter = AdaptiveLimiter(initial=8, slow_latency=0)
+
+        async def fail():
+            async with limiter.request():
+                await asyncio.sleep(0)
+                raise ConnectionError()
+
+        # Act
+        # Both requests start before either fails, so it only backs off once
+        await asyncio.gather(fail(), fail(), return_exceptions=True)
+        after_errors = limiter.limit
+        await asyncio.sleep(0.01)
+        async with limiter.request():
+            await asyncio.sleep(0.01)
+
+        # Assert
+        self.assertEqual(after_errors, 4)
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.backoffs, 2)
+
+    async def test_request_waits_for_room_under_limit(self):
+        """ Tests that no more requests than the limit run at once """
+
+        # Arrange
+        limiter = AdaptiveLimiter(initial=2, maximum=2)
+        running = []
+        most_running = []
+
+        async def run():
+            async with limiter.request():
+                running.append(None)
+                most_running.append(len(running))
+                await asyncio.sleep(0.01)
+                running.pop()
+
+        # Act
+        await asyncio.gather(*(run() for _ in range(6)))
+
+        # Assert
+        self.assertEqual(max(most_running), 2)
+
+class _FakeResponse:
+    """ Stands in for an aiohttp response, recording whether it was read and released """
+
+    def __init__(self):
+        self.was_read = False
+        self.released = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        self.released = True
+
+    async def read(self):
+        """ Reads the response's (empty) body """
+        self.was_read = True
+        return b''
+
+class _FakeSession:
+    """ Stands in for a ClientSession, recording the responses to its POST requests """
+
+    def __init__(self):
+        self.responses = []
+
+    def post(self, *_args, **_kwargs):
+        """ Starts a POST request, giving a _FakeResponse """
+        response = _FakeResponse()
+        self.responses.append(response)
+        return response
+
+class BannerRequestsSessionTests(AioTestCase):
+    """ Tests BannerRequests' session requests without accessing the network """
+
+    async def test_session_requests_release_their_responses(self):
+        """ Tests that create_session and reset_search read and release their
+            responses, so their connections can be reused
+        """
+
+        # Arrange
+        request = BannerRequests()
+        session = _FakeSession()
+
+        # Act
+        await request.create_session(session, "201931")
+        await request.reset_search(session)
+
+        # Assert
+        self.assertEqual(len(session.responses), 2)
+        for response in session.responses:
+            self.assertTrue(response.was_read)
+            self.assertTrue(response.released)
+
+class BannerRequestsSearchTests(AioTestCase):
+    """ Tests BannerRequests.search without accessing the network """
+
+    async def test_search_shares_connections_between_sessions(self):
+        """ Tests that search gives each department its own session, and that the
+            sessions share one pool of connections, which is closed afterwards
+        """
+
+        # Arrange
+        request = BannerRequests()
+        sessions = []
+        connectors = []
+
+        async def create_session(session, _term):
+            sessions.append(session)
+            connectors.append(session.connector)
+            return generate_session_id()
+
+        async def get_courses(_session, _session_id, dept, _term, _amount, _offset):
+            return ([{'subject': dept}], 1)
+
+        request.create_session = create_session
+        request.get_courses = get_courses
+        depts_terms = [("CSCE", "201931"), ("MATH", "201931")]
+
+        # Act
+        result = await request.search(depts_terms, AdaptiveLimiter(2),
+                                      lambda course_list, *_: course_list)
+
+        # Assert
+        self.assertEqual(result, [[{'subject': "CSCE"}], [{'subject': "MATH"}]])
+        self.assertEqual(len(set(id(session) for session in sessions)), 2)
+        self.assertIs(connectors[0], connectors[1])
+        self.assertTrue(connectors[0].closed)
+
+    async def test_search_retrieves_every_page(self):
+        """ Tests that search retrieves each page of a department in its own session,
+            and combines them in order
+        """
+
+        # Arrange
+        request = BannerRequests()
+        sessions = []
+
+        async def create_session(session, _term):
+            sessions.append(session)
+            return generate_session_id()
+
+        async def get_courses(_session, _session_id, _dept, _term, amount, offset):
+            # The department has 5 courses, numbered 0 to 4
+            return ([{'id': num} for num in range(offset, min(offset + amount, 5))], 5)
+
+        request.create_session = create_session
+        request.get_courses = get_courses
+
+        # Act
+        result = await request.search([("CSCE", "201931")], AdaptiveLimiter(2),
+                                      lambda course_list, *_: course_list, 2)
+
+        # Assert
+        self.assertEqual(result, [[{'id': num} for num in range(5)]])
+        self.assertEqual(len(set(id(session) for session in sessions)), 3)
+
+    async def test_search_removes_sections_repeated_across_pages(self):
+        """ Tests that search only keeps the first copy of sections that shifted onto
+            a later page while the pages were retrieved
+        """
+
+        # Arrange
+        request = BannerRequests()
+
+        async def create_session(_session, _term):
+            return generate_session_id()
+
+        async def get_courses(_session, _session_id, _dept, _term, amount, offset):
+            # A section was added before the second page was retrieved, shifting
+            # section 1 onto it
+            ids = [0, 1, 2, 3] if offset == 0 else [-1, 0, 1, 2, 3]
+            return ([{'id': num} for num in ids[offset:offset + amount]], 4)
+
+        request.create_session = create_session
+        request.get_courses = get_courses
+
+        # Act
+        result = await request.search([("CSCE", "201931")], AdaptiveLimiter(2),
+                                      lambda course_list, *_: course_list, 2)
+
+        # Assert
+        self.assertEqual(result, [[{'id': num} for num in (0, 1, 2)]])
+
+    async def test_search_gives_departments_to_on_department(self):
+        """ Tests that search awaits on_department with each department's courses
+            instead of returning them
+        """
+
+        # Arrange
+        request = BannerRequests()
+        departments = []
+
+        async def create_session(_session, _term):
+            return generate_session_id()
+
+        async def get_courses(_session, _session_id, dept, _term, _amount, _offset):
+            return ([{'subject': dept}], 1)
+
+        async def on_department(dept, term, course_data):
+            departments.append((dept, term, course_data))
+
+        request.create_session = create_session
+        request.get_courses = get_courses
+        depts_terms = [("CSCE", "201931"), ("MATH", "201931")]
+
+        # Act
+        result = await request.search(depts_terms, AdaptiveLimiter(2),
+                                      lambda course_list, *_: course_list,
+                                      on_department=on_department)
+
+        # Assert
+        self.assertEqual(result, [None, None])
+        self.assertEqual(sorted(departments),
+                         [("CSCE", "201931", [{'subject': "CSCE"}]),
+                          ("MATH", "201931", [{'subject': "MATH"}])])
+
+    async def test_search_parses_on_parse_executor(self):
+        """ Tests that search parses departments on parse_executor when it's given,
+            with separate sets of seen courses and instructors for each department
+        """
+
+        # Arrange
+        request = BannerRequests()
+        seen_sets = []
+
+        async def create_session(_session, _term):
+            return generate_session_id()
+
+        async def get_courses(_session, _session_id, dept, _term, _amount, _offset):
+            return ([{'subject': dept}], 1)
+
+        def parse(course_list, _term, courses_set, _instructors_set):
+            seen_sets.append(courses_set)
+            return [(course_list, threading.current_thread().name)]
+
+        request.create_session = create_session
+        request.get_courses = get_courses
+        depts_terms = [("CSCE", "201931"), ("MATH", "201931")]
+
+        # Act
+        with ThreadPoolExecutor(thread_name_prefix='parser') as executor:
+            result = await request.search(depts_terms, AdaptiveLimiter(2), parse,
+                                          parse_executor=executor)
+
+        # Assert
+        self.assertEqual([course_list for (course_list, _), in result],
+                         [[{'subject': "CSCE"}], [{'subject': "MATH"}]])
+        self.assertTrue(all(thread.startswith('parser') for (_, thread), in result))
+        self.assertIsNot(seen_sets[0], seen_sets[1])
+
 class BannerRequestsTests(AioTestCase):
     """ Tests BannerRequests for functionality. These access the network for communicating
         with Banner, so they are naturally pretty slow(relatively)
@@ -79,7 +362,7 @@ class BannerRequestsTests(AioTestCase):
             session_id = await request.create_session(session, term)
 
             # Act
-            result = await request.get_courses(session, session_id, dept, term, 1)
+            result, _ = await request.get_courses(session, session_id, dept, term, 1)
 
             subject = result[0]["subject"]
 
@@ -107,7 +390,7 @@ class BannerRequestsTests(AioTestCase):
             return []
 
         # Act
-        await request.search(depts_terms, asyncio.Semaphore(3), spy, 1)
+        await request.search(depts_terms, AdaptiveLimiter(3), spy)
         result = spy.result
 
         # Get all of the according subjects for the retrieved courses
@@ -0,0 +1,166 @@
+from datetime import time
+from unittest import mock
+import django.test
+from django.db import connection
+
+from scraper.management.commands.utils.copy_loader import (
+    copy_models, drop_staged_models, publish_staged_models, stage_models,
+)
+from scraper.management.commands.utils.scraped_records import (
+    ScrapedInstructor, ScrapedSection,
+)
+from scraper.models import Course, Grades, Instructor, Meeting, Section
+
+class CopyLoaderTests(django.test.TestCase):
+    """ Tests for copy_loader.copy_models """
+
+    def test_copy_models_saves_all_field_types(self):
+        """ Tests that copy_models saves the same values bulk_create would, including
+            nulls, arrays, times, and strings containing special characters
+        """
+        # Arrange
+        section = Section(id=1, crn=1, subject='CSCE', course_num='121',
+                          section_num='501', term_code='201931', min_credits=3,
+                          honors=None, remote=False, max_enrollment=50,
+                          asynchronous=False, current_enrollment=40)
+        meetings = [
+            Meeting(id=10, building='A\tB\\C', room=None, meeting_days=[True, False] * 3
+                    + [True], start_time=time(9), end_time=time(9, 50),
+                    meeting_type='LEC', section=section),
+            Meeting(id=11, building='"\nN', room='1', meeting_days=[False] * 7,
+                    start_time=None, end_time=None, meeting_type='LAB', section=section),
+        ]
+
+        # Act
+        copy_models(Section, [section])
+        copy_models(Meeting, meetings)
+
+        # Assert
+        saved_section = Section.objects.get(id=1)
+        self.assertEqual((saved_section.term_code, saved_section.honors), (201931, None))
+        self.assertEqual(
+            list(Meeting.objects.order_by('id').values_list(
+                'building', 'room', 'meeting_days', 'start_time', 'end_time'
+            )),
+            [('A\tB\\C', None, [True, False, True, False, True, False, True], time(9),
+              time(9, 50)),
+             ('"\nN', '1', [False] * 7, None, None)]
+        )
+
+    def test_copy_models_saves_records(self):
+        """ Tests that copy_models saves scraped records like model instances, both
+            with COPY and with bulk_create
+        """
+        # Arrange
+        instructor = ScrapedInstructor(id='First Last', email_address=None)
+        sections = [ScrapedSection(id=section_id, subject='CSCE', course_num='121',
+                                   section_num=str(500 + section_id), term_code='201931',
+                                   crn=section_id, min_credits=3, max_credits=None,
+                                   honors=False, remote=False, asynchronous=False,
+                                   mcallen=False, max_enrollment=50,
+                                   current_enrollment=40, instructor_id='First Last',
+                                   instructional_method=Section.F2F)
+                    for section_id in (1, 2)]
+
+        # Act
+        copy_models(Instructor, [instructor])
+        copy_models(Section, sections[:1])
+        with mock.patch.object(connection, 'vendor', 'sqlite'):
+            copy_models(Section, sections[1:])
+
+        # Assert
+        self.assertEqual(list(Section.objects.order_by('id').values_list(
+            'id', 'section_num', 'term_code', 'instructor_id'
+        )), [(1, '501', 201931, 'First Last'), (2, '502', 201931, 'First Last')])
+
+    def test_copy_models_ignores_conflicts(self):
+        """ Tests that copy_models skips existing rows when ignore_conflicts is set """
+        # Arrange
+        Instructor(id='First Last', email_address='old@tamu.edu').save()
+        instructors = [Instructor(id='First Last', email_address='new@tamu.edu'),
+                       Instructor(id='Other Name', email_address=None)]
+
+        # Act
+        copy_models(Instructor, instructors, ignore_conflicts=True)
+
+        # Assert
+        self.assertEqual(list(Instructor.objects.order_by('id')
+                              .values_list('id', 'email_address')),
+                         [('First Last', 'old@tamu.edu'), ('Other Name', None)])
+
+    def test_copy_models_falls_back_to_bulk_create(self):
+        """ Tests that copy_models uses bulk_create on databases other than Postgres """
+        # Arrange
+        courses = [Course(id='CSCE121-201931', dept='CSCE', course_num='121',
+                          title='INTRO PGM DESIGN CONCEPT', credit_hours=4,
+                          term='201931')]
+
+        # Act
+        with mock.patch.object(connection, 'vendor', 'sqlite'), \
+                mock.patch.object(Course.objects, 'bulk_create') as bulk_create:
+            copy_models(Course, courses)
+
+        # Assert
+        bulk_create.assert_called_once_with(courses, batch_size=50_000,
+                                            ignore_conflicts=False)
+
+    def test_publish_staged_models_replaces_queryset(self):
+        """ Tests that publish_staged_models inserts and updates the staged rows, and
+            deletes the rows of the queryset that weren't staged, but not other rows
+        """
+        # Arrange
+        def course(course_num, title, term='201931'):
+            return Course(id=f'CSCE{course_num}-{term}', dept='CSCE',
+                          course_num=course_num, title=title, credit_hours=3, term=term)
+
+        Course.objects.bulk_create([course('121', 'OLD'), course('221', 'GONE'),
+                                    course('121', 'OTHER TERM', '202011')])
+        stage_models(Course, [course('121', 'NEW'), course('222', 'ADDED')])
+
+        # Act
+        publish_staged_models(Course, Course.objects.filter(term='201931'))
+        drop_staged_models(Course)
+
+        # Assert
+        self.assertEqual(list(Course.objects.order_by('id').values_list('id', 'title')),
+                         [('CSCE121-201931', 'NEW'), ('CSCE121-202011', 'OTHER TERM'),
+                          ('CSCE222-201931', 'ADDED')])
+
+    def test_publish_staged_models_deletes_dependent_rows_in_one_statement_each(self):
+        """ Tests that publish_staged_models deletes the meetings and grades of the
+            sections it deletes, with one set-based statement for each table
+        """
+        # Arrange
+        def section(section_id):
+            return Section(id=section_id, crn=section_id, subject='CSCE',
+                           course_num='121', section_num=str(500 + section_id),
+                           term_code=201931, min_credits=3, honors=False, remote=False,
+                           max_enrollment=50, asynchronous=False, current_enrollment=40)
+
+        sections = [section(section_id) for section_id in range(1, 5)]
+        Section.objects.bulk_create(sections)
+        Meeting.objects.bulk_create(
+            Meeting(id=section.id * 10, meeting_days=[True] * 7, start_time=time(9),
+                    end_time=time(9, 50), meeting_type='LEC', section=section)
+            for section in sections
+        )
+        Grades.objects.bulk_create(
+            Grades(section=section, gpa=3.0, A=0, B=1, C=0, D=0, F=0, I=0, S=0, U=0,
+                   Q=0, X=0)
+            for section in sections
+        )
+        stage_models(Section, [section(1), section(2)])
+
+        # Act
+        # One DELETE each for the grades, meetings, and sections, then the upsert
+        with self.assertNumQueries(4):
+            publish_staged_models(Section, Section.objects.filter(term_code=201931))
+        drop_staged_models(Section)
+
+        # Assert
+        self.assertEqual(list(Section.objects.order_by('id')
+                              .values_list('id', flat=True)), [1, 2])
+        self.assertEqual(list(Meeting.objects.order_by('id')
+                              .values_list('id', flat=True)), [10, 20])
+        self.assertEqual(list(Grades.objects.order_by('section_id')
+                              .values_list('section_id', flat=True)), [1, 2])
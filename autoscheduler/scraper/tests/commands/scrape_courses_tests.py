@@ -1,14 +1,38 @@
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import datetime
+from unittest.mock import patch
 import django.test
 
 from scraper.management.commands.scrape_courses import (
     parse_section, parse_meeting, parse_instructor, parse_course, convert_meeting_time,
-    save_terms,
+    save_terms, save_department, upsert_models, publish_models, parse_enrollment,
+    save_enrollment, refresh_enrollment, parse_all_courses, parse_department,
+    _diff_models,
+    _flatten_course_data,
 )
-from scraper.models import Section, Meeting, Instructor, Course, Term
+from scraper.management.commands.utils.copy_loader import copy_models
+from scraper.models import Section, Meeting, Instructor, Course, Term, Grades
 from scraper.tests.utils.load_json import load_json_file
 
+def _department_data(subject: str, section_ids, term: str = '201931'):
+    """ Creates unsaved parsed course data like parse_all_courses gives, with a
+        course numbered 121 in the given subject that has the given sections
+    """
+    course = Course(id=f'{subject}121-{term}', dept=subject, course_num='121',
+                    title='Course', credit_hours=3, term=term)
+    data = []
+    for i, section_id in enumerate(section_ids):
+        section = Section(id=section_id, crn=section_id, subject=subject,
+                          course_num='121', section_num=str(501 + i), term_code=term,
+                          min_credits=3, honors=False, remote=False, asynchronous=False,
+                          max_enrollment=50, current_enrollment=40)
+        meeting = Meeting(id=section_id * 10, meeting_days=[True] * 7,
+                          start_time=datetime.time(9), end_time=datetime.time(9, 50),
+                          meeting_type='LEC', section=section)
+        data.append((course if i == 0 else None, None, (section, [meeting])))
+    return data
+
 class ScrapeCoursesTests(django.test.TestCase):
     """ Tests scrape_courses-related functions """
     def setUp(self):
@@ -50,8 +74,8 @@ class ScrapeCoursesTests(django.test.TestCase):
 
         # Act
         section, meetings = parse_section(self.csce_section_json, fake_instructor)
-        section.save()
-        Meeting.objects.bulk_create(meetings)
+        copy_models(Section, [section])
+        copy_models(Meeting, meetings)
 
         # Assert
 
@@ -76,8 +100,8 @@ class ScrapeCoursesTests(django.test.TestCase):
 
         # Act
         section, meetings = parse_section(self.csce_section_json, fake_instructor)
-        section.save()
-        Meeting.objects.bulk_create(meetings)
+        copy_models(Section, [section])
+        copy_models(Meeting, meetings)
 
         # Assert
         count = Meeting.objects.count()
@@ -109,8 +133,9 @@ class ScrapeCoursesTests(django.test.TestCase):
         section.save() # Must be saved for the assert query to work
 
         # Act
-        meeting = parse_meeting(self.csce_section_json["meetingsFaculty"][0], section, 0)
-        meeting.save()
+        meeting = parse_meeting(self.csce_section_json["meetingsFaculty"][0],
+                                section.id, 0)
+        copy_models(Meeting, [meeting])
 
         # Assert
         # If parse_meeting doesn't save the model correctly, then this query
@@ -128,7 +153,7 @@ class ScrapeCoursesTests(django.test.TestCase):
 
         # Act
         instructor = parse_instructor(self.csce_section_json)
-        instructor.save()
+        copy_models(Instructor, [instructor])
 
         # Assert
         # If parse_instructor doesn't save the model correctly, then this query
@@ -164,7 +189,7 @@ class ScrapeCoursesTests(django.test.TestCase):
 
         # Act
         course, *_ = parse_course(self.csce_section_json, set(), set())
-        course.save()
+        copy_models(Course, [course])
 
         # Assert
         Course.objects.get(dept=subject, course_num=course_num, title=title,
@@ -182,7 +207,7 @@ class ScrapeCoursesTests(django.test.TestCase):
 
         # Act
         course, *_ = parse_course(self.law_section_json, set(), set())
-        course.save()
+        copy_models(Course, [course])
 
         # Assert
         Course.objects.get(dept=subject, course_num=course_num, title=title,
@@ -203,7 +228,7 @@ class ScrapeCoursesTests(django.test.TestCase):
 
         # Act
         course, *_ = parse_course(self.pols_section_json, set(), set())
-        course.save()
+        copy_models(Course, [course])
 
         # Assert
         Course.objects.get(dept=subject, course_num=course_num, title=correct_title,
@@ -222,7 +247,7 @@ class ScrapeCoursesTests(django.test.TestCase):
 
         # Act
         course, *_ = parse_course(self.acct_section_json, set(), set())
-        course.save()
+        copy_models(Course, [course])
 
         # Assert
         Course.objects.get(dept=subject, course_num=course_num, title=correct_title,
@@ -250,16 +275,17 @@ class ScrapeCoursesTests(django.test.TestCase):
         #Act
         course, instructor, (section, meetings) = parse_course(self.csce_section_json,
                                                                set(), set())
-        instructor.save()
-        section.save()
-        Meeting.objects.bulk_create(meetings)
-        course.save()
+        copy_models(Instructor, [instructor])
+        copy_models(Section, [section])
+        copy_models(Meeting, meetings)
+        copy_models(Course, [course])
 
         # Assert
         Instructor.objects.get(id=instructor_id, email_address=instructor_email)
         Meeting.objects.get(id=meeting_id, building=building,
                             meeting_days=meeting_days, start_time=begin_time,
-                            end_time=end_time, meeting_type=meeting_type, section=section)
+                            end_time=end_time, meeting_type=meeting_type,
+                            section_id=section.id)
 
     def test_parse_section_handles_alphanumeric_section_num(self):
         """ Tests if parse_section accepts an alphanumeric section_num """
@@ -283,7 +309,7 @@ class ScrapeCoursesTests(django.test.TestCase):
 
         # Act
         section, _ = parse_section(self.engl_section_json, fake_instructor)
-        section.save()
+        copy_models(Section, [section])
 
         # Assert
         Section.objects.get(id=section_id, subject=subject, course_num=course_num,
@@ -315,7 +341,7 @@ class ScrapeCoursesTests(django.test.TestCase):
 
         # Act
         section, _ = parse_section(self.acct_section_json, fake_instructor)
-        section.save()
+        copy_models(Section, [section])
 
         # Assert
         Section.objects.get(id=section_id, subject=subject, course_num=course_num,
@@ -346,7 +372,7 @@ class ScrapeCoursesTests(django.test.TestCase):
 
         # Act
         section, _ = parse_section(self.csce_remote_section_json, fake_instructor)
-        section.save()
+        copy_models(Section, [section])
 
         # Assert
         Section.objects.get(id=section_id, subject=subject, course_num=course_num,
@@ -366,7 +392,7 @@ class ScrapeCoursesTests(django.test.TestCase):
 
         # Act
         section, _ = parse_section(self.csce_remote_section_json, fake_instructor)
-        section.save()
+        copy_models(Section, [section])
 
         # Assert
         # We don't care if it gets the other fields right - just that it gets asynchronous
@@ -382,7 +408,7 @@ class ScrapeCoursesTests(django.test.TestCase):
 
         # Act
         section, _ = parse_section(self.acct_section_json, fake_instructor)
-        section.save()
+        copy_models(Section, [section])
 
         # Assert
         # We don't care if it gets the other fields right - just that it gets asynchronous
@@ -398,7 +424,7 @@ class ScrapeCoursesTests(django.test.TestCase):
 
         # Act
         section, _ = parse_section(self.acct_section_json, fake_instructor)
-        section.save()
+        copy_models(Section, [section])
 
         # Assert
         # We don't care if it gets the other fields right
@@ -426,7 +452,7 @@ class ScrapeCoursesTests(django.test.TestCase):
 
         # Act
         section, _ = parse_section(self.csce_remote_section_json, fake_instructor)
-        section.save()
+        copy_models(Section, [section])
 
         # Assert
         Section.objects.get(id=section_id, subject=subject, course_num=course_num,
@@ -476,3 +502,237 @@ class ScrapeCoursesTests(django.test.TestCase):
         # Assert
         self.assertEqual(len(Term.objects.all()), 1)
         self.assertEqual(Term.objects.all().first().code, int(term_with_course))
+
+    def test_save_department_only_replaces_department(self):
+        """ Tests that scrape_courses.save_department replaces the sections and
+            courses of the given department and term, and leaves other ones alone
+        """
+        # Arrange
+        save_department('CSCE', '201931', _department_data('CSCE', [1, 2]))
+        save_department('MATH', '201931', _department_data('MATH', [3]))
+        save_department('CSCE', '202011', _department_data('CSCE', [4], '202011'))
+
+        # Act
+        _, num_sections = save_department('CSCE', '201931',
+                                          _department_data('CSCE', [5]))
+
+        # Assert
+        self.assertEqual(num_sections, 1)
+        self.assertEqual(sorted(Section.objects.values_list('id', flat=True)),
+                         [3, 4, 5])
+        self.assertEqual(sorted(Meeting.objects.values_list('id', flat=True)),
+                         [30, 40, 50])
+        self.assertEqual(Course.objects.count(), 3)
+
+    def test_save_department_keeps_grades_of_moved_sections(self):
+        """ Tests that scrape_courses.save_department keeps the grades of sections
+            that moved from another department, and gives their courses as needing
+            their grade summaries refreshed
+        """
+        # Arrange
+        save_department('CSCE', '201931', _department_data('CSCE', [1]))
+        Grades(section_id=1, gpa=3.0, A=0, B=1, C=0, D=0, F=0, I=0, S=0, U=0, Q=0,
+               X=0).save()
+
+        # Act
+        graded_courses, _ = save_department('ECEN', '201931',
+                                            _department_data('ECEN', [1]))
+
+        # Assert
+        self.assertEqual(graded_courses, {('CSCE', '121')})
+        self.assertEqual(Section.objects.get(id=1).subject, 'ECEN')
+        self.assertTrue(Grades.objects.filter(section_id=1).exists())
+
+    def test_diff_models_finds_changed_sections(self):
+        """ Tests that scrape_courses._diff_models finds which sections are new,
+            changed, and gone, and doesn't count scraped values whose types differ
+            from the database's as changes
+        """
+        # Arrange
+        save_department('CSCE', '201931', _department_data('CSCE', [1, 2, 3]))
+        _, sections, _, _ = _flatten_course_data([_department_data('CSCE', [1, 2, 4])])
+        sections[1].current_enrollment = 45
+
+        # Act
+        created, updated, deleted = _diff_models(Section, sections,
+                                                 Section.objects.all())
+
+        # Assert
+        self.assertEqual([section.id for section in created], [4])
+        self.assertEqual([section.id for section in updated], [2])
+        self.assertEqual(deleted, [3])
+
+    def test_upsert_models_keeps_grades_of_existing_sections(self):
+        """ Tests that scrape_courses.upsert_models saves the scraped sections of the
+            given terms without deleting the grades of sections that still exist
+        """
+        # Arrange
+        save_department('CSCE', '201931', _department_data('CSCE', [1, 2, 3]))
+        save_department('CSCE', '202011', _department_data('CSCE', [5], '202011'))
+        for section_id in (1, 2, 3):
+            Grades(section_id=section_id, gpa=3.0, A=0, B=1, C=0, D=0, F=0, I=0, S=0,
+                   U=0, Q=0, X=0).save()
+        _, sections, meetings, courses = _flatten_course_data(
+            [_department_data('CSCE', [1, 2, 4])]
+        )
+        sections[1].current_enrollment = 45
+        meetings[0].meeting_type = 'LAB'
+        options = defaultdict(lambda: None, term='201931')
+
+        # Act
+        upsert_models([], sections, meetings, courses, ['201931'], options)
+
+        # Assert
+        self.assertEqual(sorted(Section.objects.values_list('id', flat=True)),
+                         [1, 2, 4, 5])
+        self.assertEqual(Section.objects.get(id=2).current_enrollment, 45)
+        self.assertEqual(Meeting.objects.get(id=10).meeting_type, 'LAB')
+        self.assertEqual(sorted(Grades.objects.values_list('section_id', flat=True)),
+                         [1, 2])
+        self.assertEqual(Course.objects.count(), 2)
+
+    def test_upsert_models_keeps_unchanged_meetings(self):
+        """ Tests that scrape_courses.upsert_models doesn't rewrite the rows of
+            scraped meetings that didn't change
+        """
+        # Arrange
+        instructor = Instructor(id="Fake", email_address="a@b.c")
+        instructor.save()
+        section, meetings = parse_section(self.csce_section_json, instructor)
+        copy_models(Section, [section])
+        copy_models(Meeting, meetings)
+
+        def meeting_rows():
+            # A row's ctid changes whenever it's updated or deleted and inserted again
+            return list(Meeting.objects.extra(select={'row': 'ctid::text'})
+                        .order_by('id').values_list('id', 'row'))
+        expected = meeting_rows()
+
+        section, meetings = parse_section(self.csce_section_json, instructor)
+        options = defaultdict(lambda: None, term=section.term_code)
+
+        # Act
+        upsert_models([], [section], meetings, [], [section.term_code], options)
+
+        # Assert
+        self.assertEqual(_diff_models(Meeting, meetings, Meeting.objects.all()),
+                         ([], [], []))
+        self.assertEqual(meeting_rows(), expected)
+
+    def test_publish_models_swaps_in_scraped_terms(self):
+        """ Tests that scrape_courses.publish_models replaces the sections, meetings,
+            and courses of the given terms, keeping the grades of sections that still
+            exist, and leaves other terms alone
+        """
+        # Arrange
+        save_department('CSCE', '201931', _department_data('CSCE', [1, 2, 3]))
+        save_department('CSCE', '202011', _department_data('CSCE', [5], '202011'))
+        for section_id in (1, 3):
+            Grades(section_id=section_id, gpa=3.0, A=0, B=1, C=0, D=0, F=0, I=0, S=0,
+                   U=0, Q=0, X=0).save()
+        instructor = Instructor(id='First Last')
+        _, sections, meetings, courses = _flatten_course_data(
+            [_department_data('MATH', [1, 4])]
+        )
+        sections[0].instructor = instructor
+        options = defaultdict(lambda: None, term='201931')
+
+        # Act
+        publish_models([instructor], sections, meetings, courses, ['201931'], options)
+
+        # Assert
+        self.assertEqual(list(Section.objects.order_by('id')
+                              .values_list('id', 'subject', 'instructor_id')),
+                         [(1, 'MATH', 'First Last'), (4, 'MATH', None),
+                          (5, 'CSCE', None)])
+        self.assertEqual(sorted(Meeting.objects.values_list('id', flat=True)),
+                         [10, 40, 50])
+        self.assertEqual(list(Grades.objects.values_list('section_id', flat=True)), [1])
+        self.assertEqual(sorted(Course.objects.values_list('id', flat=True)),
+                         ['CSCE121-202011', 'MATH121-201931'])
+
+    def test_parse_enrollment_gets_enrollment(self):
+        """ Tests that scrape_courses.parse_enrollment gets each section's id and
+            enrollment
+        """
+        # Arrange
+        course_list = [self.csce_section_json, self.law_section_json]
+        expected = [(int(course['id']), course['enrollment'],
+                     course['maximumEnrollment']) for course in course_list]
+
+        # Act
+        result = parse_enrollment(course_list, '201931')
+
+        # Assert
+        self.assertEqual(result, expected)
+
+    def test_parse_department_in_process_pool(self):
+        """ Tests that parse_department gives the same models in worker processes as
+            parse_all_courses does, and that instructors of separately parsed
+            departments are only flattened once
+        """
+        # Arrange
+        course_list = load_json_file("../data/section_input.json")["data"]
+        expected = _flatten_course_data(
+            [parse_all_courses(course_list, '201931', set(), set())]
+        )
+
+        # Act
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            departments = [executor.submit(parse_department, course_list, '201931',
+                                           set(), set())
+                           for _ in range(2)]
+            result = _flatten_course_data([department.result()
+                                           for department in departments])
+
+        # Assert
+        self.assertEqual(result[0], expected[0])
+        self.assertEqual(result[1], expected[1] * 2)
+        self.assertEqual(result[2], expected[2] * 2)
+
+    def test_save_enrollment_updates_term_sections(self):
+        """ Tests that scrape_courses.save_enrollment updates the enrollment of the
+            term's sections, and counts the ones that changed
+        """
+        # Arrange
+        save_department('CSCE', '201931', _department_data('CSCE', [1, 2]))
+        save_department('CSCE', '202011', _department_data('CSCE', [3], '202011'))
+        enrollments = [(1, 50, 55), (2, 40, 50), (3, 0, 0), (4, 0, 0)]
+
+        # Act
+        changed = save_enrollment('201931', enrollments)
+
+        # Assert
+        self.assertEqual(changed, 1)
+        self.assertEqual(list(Section.objects.order_by('id').values_list(
+            'id', 'current_enrollment', 'max_enrollment'
+        )), [(1, 50, 55), (2, 40, 50), (3, 40, 50)])
+
+    @patch('scraper.management.commands.scrape_courses.BannerRequests')
+    def test_refresh_enrollment_skips_failed_departments(self, banner_mock):
+        """ Tests that scrape_courses.refresh_enrollment saves the departments it
+            retrieved, and only sets enrollment_updated for terms without any
+            departments that failed
+        """
+        # Arrange
+        save_department('CSCE', '201931', _department_data('CSCE', [1]))
+        save_department('MATH', '201931', _department_data('MATH', [2]))
+        save_department('CSCE', '202011', _department_data('CSCE', [3], '202011'))
+        now = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+        Term.objects.bulk_create([Term(code='201931', last_updated=now),
+                                  Term(code='202011', last_updated=now)])
+        depts_terms = [('CSCE', '201931'), ('MATH', '201931'), ('CSCE', '202011')]
+
+        async def search(*_args, **_kwargs):
+            return [[(1, 50, 55)], None, [(3, 50, 60)]]
+        banner_mock.return_value.search = search
+
+        # Act
+        refresh_enrollment(depts_terms, ['201931', '202011'])
+
+        # Assert
+        self.assertEqual(list(Section.objects.order_by('id').values_list(
+            'id', 'current_enrollment', 'max_enrollment'
+        )), [(1, 50, 55), (2, 40, 50), (3, 50, 60)])
+        self.assertIsNone(Term.objects.get(code='201931').enrollment_updated)
+        self.assertIsNotNone(Term.objects.get(code='202011').enrollment_updated)
@@ -0,0 +1,166 @@
+from datetime import timedelta
+import unittest
+from unittest.mock import patch
+import django.test
+from django.utils import timezone
+
+from scraper.course_search_index import (
+    CourseSearchIndex, search_courses, clear_cache, _STAMP_TTL,
+)
+from scraper.models import Course, Term
+
+def _course(dept: str, course_num: str, title: str, term: str = '201931') -> Course:
+    """ Creates an unsaved course with the given department, number, and title """
+    return Course(id=f'{dept}{course_num}-{term}', dept=dept, course_num=course_num,
+                  title=title, term=term)
+
+def _names(courses):
+    """ Converts courses to 'DEPT NUM' strings, for easier comparisons """
+    return [f'{course.dept} {course.course_num}' for course in courses]
+
+class CourseSearchIndexTests(unittest.TestCase):
+    """ Tests for CourseSearchIndex """
+
+    def setUp(self):
+        self.index = CourseSearchIndex([
+            _course('CSCE', '315', 'PROGRAMMING STUDIO'),
+            _course('MATH', '151', 'ENGINEERING MATH I'),
+            _course('CSCE', '121', 'INTRO PROGRAM DESIGN CONCEPT'),
+            _course('COMM', '203', 'PUBLIC SPEAKING'),
+            _course('CHEM', '107', 'GEN CHEM FOR ENGINEERS'),
+            _course('ENGR', '102', 'ENGR LAB I COMPUTATION'),
+        ])
+
+    def test_search_gives_id_matches_before_title_matches(self):
+        """ Tests that search gives courses matching by id first, followed by ones
+            matching by title, each ordered by department and course number
+        """
+        # Act
+        result = self.index.search('CS', 'GEN', 25)
+
+        # Assert
+        self.assertEqual(_names(result), ['CSCE 121', 'CSCE 315', 'CHEM 107'])
+
+    def test_search_uses_limit(self):
+        """ Tests that search gives the first limit results, counting title matches """
+        # Act
+        result = (self.index.search('C', 'C', 2), self.index.search('MATH', 'P', 3))
+
+        # Assert
+        self.assertEqual(_names(result[0]), ['CHEM 107', 'COMM 203'])
+        self.assertEqual(_names(result[1]), ['MATH 151', 'COMM 203', 'CSCE 315'])
+
+    def test_fuzzy_search_matches_substrings_and_typos(self):
+        """ Tests that fuzzy_search finds courses by their number alone, by words in
+            the middle of their title, and with misspelled words
+        """
+        # Act
+        result = [self.index.fuzzy_search(text, 1)
+                  for text in ('315', 'design concept', 'programing studo', 'csce315')]
+
+        # Assert
+        self.assertEqual([_names(courses) for courses in result],
+                         [['CSCE 315'], ['CSCE 121'], ['CSCE 315'], ['CSCE 315']])
+
+    def test_fuzzy_search_ranks_by_relevance(self):
+        """ Tests that fuzzy_search gives closer matches first, and leaves out courses
+            that don't match enough of the search
+        """
+        # Act
+        result = self.index.fuzzy_search('engineering', 25)
+
+        # Assert
+        self.assertEqual(_names(result), ['MATH 151', 'CHEM 107'])
+
+class SearchCoursesTests(django.test.TestCase):
+    """ Tests for search_courses """
+
+    def setUp(self):
+        clear_cache()
+
+    def test_search_courses_matches_database(self):
+        """ Tests that search_courses gives the same courses as searching the
+            database, in the same order
+        """
+        # Arrange
+        Term(code=201931, last_updated=timezone.now()).save()
+        Course.objects.bulk_create([
+            _course('CSCE', '315', 'PROGRAMMING STUDIO'),
+            _course('CSCE', '121', 'INTRO PROGRAM DESIGN CONCEPT'),
+            _course('COMM', '203', 'PUBLIC SPEAKING'),
+            _course('LAW', '7500S', 'SPORTS LAW'),
+            _course('CSCE', '181', 'INTRO TO COMPUTING', term='201831'),
+        ])
+        searches = [('CSCE1', 'CSCE 1'), ('C', 'C'), ('P', 'P'), ('', ''), ('X', 'X')]
+        expected = [
+            _names(list(Course.objects.filter(id__startswith=id_search, term='201931')
+                        .order_by('dept', 'course_num'))
+                   + list(Course.objects.filter(title__startswith=title_search,
+                                                term='201931')
+                          .order_by('dept', 'course_num')))
+            for id_search, title_search in searches
+        ]
+
+        # Act
+        result = [_names(search_courses('201931', id_search, title_search, 25))
+                  for id_search, title_search in searches]
+
+        # Assert
+        self.assertEqual(result, expected)
+
+    @patch('scraper.term_cache.monotonic')
+    def test_search_courses_caches_until_term_is_updated(self, monotonic_mock):
+        """ Tests that search_courses only loads courses again once the term's
+            last_updated changes, which it only checks for every _STAMP_TTL seconds,
+            and gives None for terms that haven't been scraped
+        """
+        # Arrange
+        monotonic_mock.return_value = 0
+        term = Term(code=201931, last_updated=timezone.now())
+        term.save()
+        search_courses('201931', 'CSCE', 'CSCE', 25)
+        _course('CSCE', '121', 'INTRO PROGRAM DESIGN CONCEPT').save()
+
+        # Act
+        with self.assertNumQueries(0):
+            cached = search_courses('201931', 'CSCE', 'CSCE', 25)
+        term.last_updated += timedelta(hours=1)
+        term.save()
+        before_ttl = search_courses('201931', 'CSCE', 'CSCE', 25)
+        monotonic_mock.return_value = _STAMP_TTL
+        updated = search_courses('201931', 'CSCE', 'CSCE', 25)
+        unscraped = search_courses('201831', 'CSCE', 'CSCE', 25)
+
+        # Assert
+        self.assertEqual(_names(cached), [])
+        self.assertEqual(_names(before_ttl), [])
+        self.assertEqual(_names(updated), ['CSCE 121'])
+        self.assertIsNone(unscraped)
+
+class FuzzyCourseSearchAPITests(django.test.TestCase):
+    """ Tests for /api/course/search?fuzzy=true """
+
+    def setUp(self):
+        clear_cache()
+
+    def test_api_course_search_fuzzy_gives_ranked_results(self):
+        """ Tests that /api/course/search?fuzzy=true gives courses matching anywhere
+            in their name, from most to least relevant
+        """
+        # Arrange
+        Term(code=201931, last_updated=timezone.now()).save()
+        Course.objects.bulk_create([
+            _course('CSCE', '315', 'PROGRAMMING STUDIO'),
+            _course('CSCE', '314', 'PROGRAMMING LANGUAGES'),
+            _course('COMM', '203', 'PUBLIC SPEAKING'),
+        ])
+        data = {'search': 'programming lang', 'term': '201931', 'fuzzy': 'true'}
+        expected = {'results': ['CSCE 314 - PROGRAMMING LANGUAGES',
+                                'CSCE 315 - PROGRAMMING STUDIO']}
+
+        # Act
+        response = self.client.get('/api/course/search', data=data)
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), expected)
@@ -43,3 +43,21 @@ class LastUpdatedTests(APITestCase):
         # Assert
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data, expected)
+
+    def test_refreshed_enrollment_returns_enrollment_date(self):
+        """ Tests that api/get_last_updated returns when the term's enrollment was
+            refreshed if that was after it was last scraped
+        """
+        # Arrange
+        expected = timezone.make_aware(datetime(2020, 1, 2))
+
+        code = '202031'
+        Term(code=code, last_updated=timezone.make_aware(datetime(2020, 1, 1)),
+             enrollment_updated=expected).save()
+
+        # Act
+        response = self.client.get(f'/api/get_last_updated?term={code}')
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, expected)
@@ -6,7 +6,7 @@ import django.test
 from scraper.models.course import generate_course_id
 from scraper.models.department import generate_department_id
 from scraper.models.section import generate_meeting_id, Section
-from scraper.models.grades import Grades
+from scraper.models.grades import Grades, GradeSummary
 from scraper.models.instructor import Instructor
 
 class DepartmentTests(unittest.TestCase):
@@ -226,3 +226,130 @@ class GradesTests(django.test.TestCase):
 
         # Assert
         self.assertEqual(expected, result)
+
+    def test_summary_performances_matches_instructor_performance(self):
+        """ Tests that GradeSummary.objects.performances gets the same performance as
+            instructor_performance for each section's course, instructor, and honors
+        """
+
+        # Arrange
+        instructors = [Instructor(id="First Last"), Instructor(id="Second Last")]
+        Instructor.objects.bulk_create(instructors)
+        subject = "CSCE"
+        course_num = "121"
+
+        sections = [
+            Section(id=10, subject=subject, course_num=course_num,
+                    instructor=instructors[0], term_code=201931, section_num=500,
+                    min_credits=3, asynchronous=False, current_enrollment=0,
+                    max_enrollment=10, honors=True),
+            Section(id=11, subject=subject, course_num=course_num,
+                    instructor=instructors[0], term_code=201831, section_num=500,
+                    min_credits=3, asynchronous=False, current_enrollment=0,
+                    max_enrollment=10, honors=False),
+            Section(id=12, subject=subject, course_num=course_num,
+                    instructor=instructors[0], term_code=201731, section_num=500,
+                    min_credits=3, asynchronous=False, current_enrollment=0,
+                    max_enrollment=10, honors=False),
+            Section(id=13, subject=subject, course_num=course_num,
+                    instructor=instructors[1], term_code=201931, section_num=501,
+                    min_credits=3, asynchronous=False, current_enrollment=0,
+                    max_enrollment=10, honors=False),
+        ]
+
+        Section.objects.bulk_create(sections)
+
+        grades = [
+            Grades(section=sections[0], gpa=2.0, C=1, A=0, B=0, D=0, F=0, I=0, S=0, U=0,
+                   Q=0, X=0),
+            Grades(section=sections[1], gpa=3.0, B=1, A=0, C=0, D=0, F=0, I=0, S=0, U=0,
+                   Q=0, X=0),
+            Grades(section=sections[2], gpa=4.0, A=2, B=0, C=0, D=0, F=0, I=0, S=0, U=0,
+                   Q=0, X=0),
+        ]
+
+        Grades.objects.bulk_create(grades)
+        GradeSummary.objects.refresh()
+
+        # The second instructor doesn't have any grades, so they aren't included
+        expected = {
+            (subject, course_num, section.instructor_id, section.honors):
+                Grades.objects.instructor_performance(
+                    dept=subject, course_num=course_num, instructor=section.instructor,
+                    honors=section.honors
+                )
+            for section in sections[:2]
+        }
+
+        # Act
+        result = GradeSummary.objects.performances(sections)
+
+        # Assert
+        self.assertEqual(expected, result)
+
+class GradeSummaryTests(django.test.TestCase):
+    """ Tests for GradeSummary and its manager """
+
+    def setUp(self):
+        self.instructor = Instructor(id="First Last")
+        self.instructor.save()
+
+        self.sections = [
+            Section(id=10, subject="CSCE", course_num="121", instructor=self.instructor,
+                    term_code=201931, section_num=500, min_credits=3,
+                    asynchronous=False, current_enrollment=0, max_enrollment=10,
+                    honors=False),
+            Section(id=11, subject="CSCE", course_num="121", instructor=self.instructor,
+                    term_code=201831, section_num=500, min_credits=3,
+                    asynchronous=False, current_enrollment=0, max_enrollment=10,
+                    honors=False),
+            Section(id=12, subject="CSCE", course_num="221", instructor=self.instructor,
+                    term_code=201931, section_num=500, min_credits=3,
+                    asynchronous=False, current_enrollment=0, max_enrollment=10,
+                    honors=False),
+        ]
+        Section.objects.bulk_create(self.sections)
+
+        Grades.objects.bulk_create([
+            Grades(section=self.sections[0], gpa=2.0, C=1, A=0, B=0, D=0, F=0, I=0, S=0,
+                   U=0, Q=0, X=0),
+            Grades(section=self.sections[1], gpa=4.0, A=2, B=0, C=0, D=0, F=0, I=0, S=0,
+                   U=0, Q=0, X=0),
+            Grades(section=self.sections[2], gpa=3.0, B=1, A=0, C=0, D=0, F=0, I=0, S=0,
+                   U=0, Q=0, X=0),
+        ])
+
+    def test_refresh_matches_instructor_performance(self):
+        """ Tests that the summaries refresh makes give the same performance as
+            instructor_performance, including for instructors without any grades
+        """
+
+        # Arrange
+        keys = [("CSCE", "121", self.instructor, False),
+                ("CSCE", "221", self.instructor, False),
+                ("CSCE", "121", self.instructor, True)]
+        expected = [Grades.objects.instructor_performance(*key) for key in keys]
+
+        # Act
+        GradeSummary.objects.refresh()
+        result = [GradeSummary.objects.performance(*key) for key in keys]
+
+        # Assert
+        self.assertEqual(expected, result)
+
+    def test_refresh_only_recomputes_given_courses(self):
+        """ Tests that refresh with courses rebuilds only their summaries, and removes
+            summaries of sections that no longer have grades
+        """
+
+        # Arrange
+        GradeSummary.objects.refresh()
+        Grades.objects.filter(section__in=self.sections[:2]).delete()
+        Grades.objects.filter(section=self.sections[2]).update(gpa=1.0)
+
+        # Act
+        GradeSummary.objects.refresh([("CSCE", "121")])
+
+        # Assert
+        self.assertFalse(GradeSummary.objects.filter(course_num="121").exists())
+        self.assertEqual(GradeSummary.objects.get(course_num="221").gpa, 3.0)
@@ -0,0 +1,229 @@
+from datetime import time, timedelta
+import json
+import unittest
+from unittest.mock import Mock, patch
+import django.test
+from django.utils import timezone
+
+from scraper.models import Grades, GradeSummary, Instructor, Meeting, Section, Term
+from scraper.section_json_cache import (
+    FragmentCache, get_sections_json, clear_cache, _TERM_STAMPS, _WARMING, _create_stamp,
+    _warm_in_background, _warm_term,
+)
+from scraper.serializers import SectionSerializer
+
+def _create_section(section_id: int, section_num: str, instructor=None) -> Section:
+    """ Creates and saves a CSCE 121 section for 201931 with the given id and number """
+    section = Section(id=section_id, crn=section_id, subject='CSCE', course_num='121',
+                      section_num=section_num, term_code=201931, min_credits=3,
+                      honors=False, remote=False, max_enrollment=50, asynchronous=False,
+                      current_enrollment=40, instructor=instructor)
+    section.save()
+    Meeting(id=section_id * 10, meeting_days=[True] * 7, start_time=time(9),
+            end_time=time(9, 50), meeting_type='LEC', section=section).save()
+    return section
+
+def _get_sections(*section_ids):
+    """ Gets the given sections with their instructors, like the views do """
+    return list(Section.objects.filter(id__in=section_ids).order_by('id')
+                .select_related('instructor'))
+
+class FragmentCacheTests(unittest.TestCase):
+    """ Tests for FragmentCache """
+
+    def test_set_evicts_least_recently_used(self):
+        """ Tests that set evicts the least recently used fragments once the cache is
+            over its max size
+        """
+        # Arrange
+        cache = FragmentCache(max_size=6)
+        stamp = object()
+        cache.set(1, stamp, 'aa')
+        cache.set(2, stamp, 'bb')
+        cache.set(3, stamp, 'cc')
+        cache.get(1, stamp)
+
+        # Act
+        cache.set(4, stamp, 'dd')
+
+        # Assert
+        self.assertEqual([cache.get(key, stamp) for key in (1, 2, 3, 4)],
+                         ['aa', None, 'cc', 'dd'])
+
+    def test_get_ignores_other_stamps(self):
+        """ Tests that get doesn't return fragments cached with a different stamp """
+        # Arrange
+        cache = FragmentCache(max_size=6)
+        cache.set(1, object(), 'aa')
+
+        # Act
+        result = cache.get(1, object())
+
+        # Assert
+        self.assertIsNone(result)
+
+class SectionJsonCacheTests(django.test.TestCase):
+    """ Tests for get_sections_json """
+
+    def setUp(self):
+        clear_cache()
+        _TERM_STAMPS.clear()
+        # Tests that cover warming call it themselves instead
+        warm_patch = patch('scraper.section_json_cache._warm_in_background')
+        self.warm_mock = warm_patch.start()
+        self.addCleanup(warm_patch.stop)
+
+    def test_get_sections_json_matches_section_serializer(self):
+        """ Tests that get_sections_json gives the same data as SectionSerializer,
+            including the grades of sections with and without an instructor
+        """
+        # Arrange
+        instructor = Instructor(id='First Last')
+        instructor.save()
+        section = _create_section(1, '501', instructor)
+        _create_section(2, '502')
+        Grades(section=section, gpa=3.0, A=0, B=1, C=0, D=0, F=0, I=0, S=0, U=0, Q=0,
+               X=0).save()
+        GradeSummary.objects.refresh()
+        sections = _get_sections(1, 2)
+        expected = [SectionSerializer(section).data for section in sections]
+
+        # Act
+        result = [json.loads(section) for section in get_sections_json(sections)]
+
+        # Assert
+        self.assertEqual(result, expected)
+
+    def test_get_sections_json_caches_until_term_is_updated(self):
+        """ Tests that get_sections_json doesn't serialize sections again until the
+            term's last_updated changes
+        """
+        # Arrange
+        term = Term(code=201931, last_updated=timezone.now())
+        term.save()
+        _create_section(1, '501')
+        get_sections_json(_get_sections(1))
+        Section.objects.filter(id=1).update(section_num='502')
+
+        # Act
+        # One query each for the term and the grades, but none for the meetings
+        with self.assertNumQueries(2):
+            cached = get_sections_json(_get_sections(1))
+        term.last_updated += timedelta(hours=1)
+        term.save()
+        updated = get_sections_json(_get_sections(1))
+
+        # Assert
+        self.assertEqual(json.loads(cached[0])['section_num'], '501')
+        self.assertEqual(json.loads(updated[0])['section_num'], '502')
+
+    def test_get_sections_json_doesnt_cache_grades(self):
+        """ Tests that get_sections_json gets the latest grades of cached sections """
+        # Arrange
+        Term(code=201931, last_updated=timezone.now()).save()
+        instructor = Instructor(id='First Last')
+        instructor.save()
+        section = _create_section(1, '501', instructor)
+        get_sections_json(_get_sections(1))
+        Grades(section=section, gpa=3.0, A=0, B=1, C=0, D=0, F=0, I=0, S=0, U=0, Q=0,
+               X=0).save()
+        GradeSummary.objects.refresh()
+
+        # Act
+        result = get_sections_json(_get_sections(1))
+
+        # Assert
+        self.assertEqual(json.loads(result[0])['grades']['gpa'], 3.0)
+
+    def test_get_sections_json_doesnt_cache_enrollment(self):
+        """ Tests that get_sections_json gets the latest enrollment of cached
+            sections
+        """
+        # Arrange
+        Term(code=201931, last_updated=timezone.now()).save()
+        _create_section(1, '501')
+        get_sections_json(_get_sections(1))
+        Section.objects.filter(id=1).update(current_enrollment=50, max_enrollment=60)
+
+        # Act
+        result = json.loads(get_sections_json(_get_sections(1))[0])
+
+        # Assert
+        self.assertEqual((result['current_enrollment'], result['max_enrollment']),
+                         (50, 60))
+
+    def test_warm_term_caches_every_section_of_term(self):
+        """ Tests that _warm_term caches the sections of the term that haven't been
+            requested yet
+        """
+        # Arrange
+        Term(code=201931, last_updated=timezone.now()).save()
+        _create_section(1, '501')
+        _create_section(2, '502')
+        get_sections_json(_get_sections(1))
+
+        # Act
+        _warm_term(201931, _TERM_STAMPS.get(201931))
+
+        # Assert
+        # One query each for the term and the grades, but none for the meetings
+        with self.assertNumQueries(2):
+            get_sections_json(_get_sections(2))
+
+    @patch('scraper.section_json_cache.get_recent_terms', Mock(return_value=['201931']))
+    def test_create_stamp_only_warms_recent_terms_once(self):
+        """ Tests that _create_stamp only starts warming terms that are being registered
+            for, and doesn't start warming a term that's already being warmed
+        """
+        # Act
+        with patch('scraper.section_json_cache.threading.Thread') as thread_mock:
+            _create_stamp(201931)
+            _create_stamp(201931)
+            _create_stamp(201831)
+        _WARMING.clear()
+
+        # Assert
+        thread_mock.assert_called_once()
+        self.assertEqual(thread_mock.call_args[1]['args'], (201931,))
+
+    def test_stamp_isnt_changed_by_enrollment_refreshes(self):
+        """ Tests that refreshing a term's enrollment doesn't give it a new stamp, so
+            its sections aren't reserialized or warmed again
+        """
+        # Arrange
+        term = Term(code=201931, last_updated=timezone.now())
+        term.save()
+        stamp = _TERM_STAMPS.get(201931)
+        term.enrollment_updated = timezone.now()
+        term.save()
+
+        # Act
+        result = _TERM_STAMPS.get(201931)
+
+        # Assert
+        self.assertIs(result, stamp)
+
+    def test_warm_in_background_warms_new_stamps_until_done(self):
+        """ Tests that _warm_in_background warms the term again with the stamp it was
+            rescraped with while it was being warmed, and then stops
+        """
+        # Arrange
+        term = Term(code=201931, last_updated=timezone.now())
+        term.save()
+        stamps = []
+        def rescrape_once(_term, stamp):
+            stamps.append(stamp)
+            if len(stamps) == 1:
+                term.last_updated += timedelta(hours=1)
+                term.save()
+        _WARMING.add(201931)
+
+        # Act
+        with patch('scraper.section_json_cache._warm_term', rescrape_once), \
+                patch('scraper.section_json_cache.connections'):
+            _warm_in_background(201931)
+
+        # Assert
+        self.assertEqual(len(stamps), 2)
+        self.assertIsNot(stamps[0], stamps[1])
+        self.assertNotIn(201931, _WARMING)
@@ -5,7 +5,9 @@ from rest_framework.views import APIView
 from rest_framework.decorators import api_view
 from scraper.serializers import (
     TermSerializer, CourseSearchSerializer, CourseSerializer, SectionSerializer)
-from scraper.models import Course, Section, Grades, Term
+from scraper.course_search_index import fuzzy_search_courses, search_courses
+from scraper.models import Course, Section, GradeSummary, Term
+from scraper.section_json_cache import get_sections_json, json_array, json_response
 
 class RetrieveCourseView(generics.RetrieveAPIView):
     """ API endpoint for viewing course information, used by /api/course.
@@ -33,7 +35,14 @@ class ListSectionView(generics.ListAPIView):
         term = self.request.query_params.get('term')
         return Section.objects.filter(
             subject=dept, course_num=course_num, term_code=term
-        ).order_by('id').select_related('instructor').prefetch_related('meetings')
+        ).order_by('id').select_related('instructor')
+
+    def list(self, request): # pylint: disable=arguments-differ
+        """ Overrides default behavior of list method so sections are put together from
+            their cached JSON (see section_json_cache), rather than serialized every time
+        """
+        sections = list(self.get_queryset())
+        return json_response(json_array(get_sections_json(sections)))
 
 class RetrieveTermView(generics.ListAPIView):
     """ API endpoint for viewing terms, used by /api/terms.
@@ -65,7 +74,8 @@ class RetrieveTermView(generics.ListAPIView):
 
 class RetrieveCourseSearchView(generics.ListAPIView):
     """ API endpoint for viewing list of courses searched off of
-        searchText parameter
+        searchText parameter. With fuzzy=true, courses are ranked by how well they
+        match anywhere in their name instead of only matching prefixes
     """
     def get_queryset(self):
         """ Overrides default behavior of get_queryset() to work using
@@ -75,6 +85,14 @@ class RetrieveCourseSearchView(generics.ListAPIView):
         title_search = self.request.query_params.get('search').upper().replace("%20", " ")
         id_search = title_search.replace(" ", "")
         term = self.request.query_params.get('term')
+        # Search the term's in-memory index if it has one, so no courses are queried
+        if self.request.query_params.get('fuzzy') == 'true':
+            courses = fuzzy_search_courses(term, title_search, 25)
+        else:
+            courses = search_courses(term, id_search, title_search, 25)
+        if courses is not None:
+            return courses
+
         # Get all courses that match by id or title
         matching_id = Course.objects.filter(
             id__startswith=id_search, term=term).order_by('dept', 'course_num')
@@ -110,13 +128,13 @@ class RetrieveGradesView(APIView):
         subject = self.request.query_params.get('subject').upper()
         course_num = self.request.query_params.get('course_num')
         honors = self.request.query_params.get('honors')
-        data = Grades.objects.instructor_performance(subject, course_num,
-                                                     instructor, honors)
+        data = GradeSummary.objects.performance(subject, course_num, instructor, honors)
         return Response(data)
 
 @api_view(['GET'])
 def get_last_updated(request):
-    """ Takes in a term and attempts to retrieve when that term was last updated.
+    """ Takes in a term and attempts to retrieve when that term was last updated,
+        including refreshes of just its enrollment.
         Returns undefined (empty string) if it does not find one.
     """
     term = request.query_params.get('term')
@@ -125,6 +143,10 @@ def get_last_updated(request):
         return Response(status=400)
 
     try:
-        return Response(Term.objects.get(code=term).last_updated)
+        term = Term.objects.get(code=term)
     except Term.DoesNotExist:
         return Response()
+
+    if term.enrollment_updated and term.enrollment_updated > term.last_updated:
+        return Response(term.enrollment_updated)
+    return Response(term.last_updated)
@@ -159,3 +159,36 @@ class SchedulesAPITests(APITestCase):
         # Assert
         self.assertEqual(response.json(), expected)
         self.assertEqual(response.status_code, 200)
+
+    def test_get_saved_schedules_gives_normalized_schedules(self):
+        """ Tests that /sessions/get_saved_schedules gives each section once, and the
+            ids of each schedule's sections, when asked for with X-Schedule-Format
+        """
+        # Arrange
+        term = '202031'
+        create_models(term)
+
+        session = self.client.session
+        session_input = [
+            {'name': 'Schedule 1', 'sections': [1], 'locked': False},
+            {'name': 'Schedule 2', 'sections': [1], 'locked': True},
+        ]
+        session[term] = {'schedules': session_input, 'selected_schedule': 1}
+        session.save()
+
+        expected_schedules = [
+            {'name': 'Schedule 1', 'sections': [1], 'locked': False},
+            {'name': 'Schedule 2', 'sections': [1], 'locked': True},
+        ]
+
+        # Act
+        response = self.client.get(f'/sessions/get_saved_schedules?term={term}',
+                                   HTTP_X_SCHEDULE_FORMAT='normalized')
+
+        # Assert
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()['sections']), ['1'])
+        self.assertEqual(response.json()['sections']['1']['instructor_name'],
+                         'fake name')
+        self.assertEqual(response.json()['schedules'], expected_schedules)
+        self.assertEqual(response.json()['selectedSchedule'], 1)
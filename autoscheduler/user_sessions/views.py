@@ -4,7 +4,10 @@ from rest_framework.parsers import JSONParser
 from django.contrib.auth.models import User # pylint: disable=imported-auth-user
 from django.contrib import auth
 from user_sessions.utils.retrieve_data_session import retrieve_data_session
-from scheduler.views import _serialize_schedules
+from scheduler.views import (
+    _serialize_schedules, _serialize_normalized_schedules, _wants_normalized_schedules,
+)
+from scraper.section_json_cache import dumps, json_array, json_object, json_response
 
 def _set_state_in_session(request, key: str):
     """ Function that sets the given key in our session to the value of the key in the
@@ -121,21 +124,26 @@ def get_saved_schedules(request):
         return Response(status=400)
 
     section_tuples = [schedule['sections'] for schedule in schedules]
-    serialized = _serialize_schedules(section_tuples)
-
-    ret = {
-        'selectedSchedule': selected_schedule,
-        'schedules': [{
-            'name': schedule.get('name'),
-            'sections': sections,
+    fields = {}
+    if _wants_normalized_schedules(request):
+        fields['sections'], serialized = _serialize_normalized_schedules(section_tuples)
+    else:
+        serialized = _serialize_schedules(section_tuples)
+
+    ret = json_object(
+        selectedSchedule=dumps(selected_schedule),
+        **fields,
+        schedules=json_array(json_object(
+            name=dumps(schedule.get('name')),
+            sections=sections,
             # If locked (aka "saved") is not available, then this is probably an old
             # version of get_saved_schedule session. As such, assume that it was locked.
-            'locked': (schedule.get('locked')
-                        if schedule.get('locked') is not None else True),
-        } for schedule, sections in zip(schedules, serialized)],
-    }
+            locked=dumps(schedule.get('locked')
+                         if schedule.get('locked') is not None else True),
+        ) for schedule, sections in zip(schedules, serialized)),
+    )
 
-    return Response(ret)
+    return json_response(ret)
 
 @api_view(['PUT'])
 @parser_classes([JSONParser])